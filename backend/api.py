@@ -29,6 +29,7 @@ from task_utils import (
     get_running_extended_analysis_task,
     complete_extended_analysis_task,
     TASK_STOP_EVENTS,
+    TASK_FUTURES,
 )
 from data_management.services import create_analysis_task
 
@@ -152,9 +153,20 @@ def stop_analysis(task_id: str) -> TaskResult:
     # Signal cancellation
     stop_event.set()
 
-    # Reflect status change immediately; the worker will mark completed/cancelled later.
-    task.status = TaskStatus.RUNNING  # keep running until worker finalizes
-    task.message = "已请求停止，正在清理..."
+    future = TASK_FUTURES.get(task_id)
+    if future is not None and future.cancel():
+        # Still queued in the executor: it will never run, so finalize here
+        from datetime import datetime
+
+        TASK_FUTURES.pop(task_id, None)
+        TASK_STOP_EVENTS.pop(task_id, None)
+        task.status = TaskStatus.CANCELLED
+        task.message = "任务已取消"
+        task.completed_at = datetime.now().isoformat()
+    else:
+        # Reflect status change immediately; the worker will mark completed/cancelled later.
+        task.status = TaskStatus.RUNNING  # keep running until worker finalizes
+        task.message = "已请求停止，正在清理..."
     return TaskResult(
         task_id=task.task_id,
         status=task.status,
@@ -176,6 +188,8 @@ def get_task_status(task_id: str) -> TaskResult:
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
+    from data_management.dashboard_service import _refresh_sector_info, _replace_factors_with_price_changes
+
     # Process data if task is completed and has result data
     data = task.result["data"] if task.result else None
     if data and task.status == "completed":
@@ -204,6 +218,7 @@ def get_latest_results() -> TaskResult | Message:
     """Get the latest completed task results"""
     import os
     import json
+    from data_management.dashboard_service import _refresh_sector_info, _replace_factors_with_price_changes
 
     last_task = get_last_completed_task()
     if last_task:
@@ -266,158 +281,6 @@ def get_latest_results() -> TaskResult | Message:
     return Message(message="No results yet. POST /run to start a calculation.")
 
 
-def _refresh_sector_info(data: List[Dict]) -> List[Dict]:
-    """Refresh sector information for stock data from latest extended_analysis_results.json
-    
-    Args:
-        data: List of stock records with potential outdated sector info
-        
-    Returns:
-        Updated list with refreshed sector information
-    """
-    if not data:
-        return data
-    
-    from data_management.concept_service import get_stocks_sectors_from_extended_analysis
-    
-    # Extract stock codes from data
-    stock_codes = [record.get('代码') for record in data if '代码' in record]
-    
-    # Get fresh sector mapping from extended_analysis_results.json
-    sectors_map = get_stocks_sectors_from_extended_analysis(stock_codes)
-    
-    # Clear old sector info and update with fresh data
-    for record in data:
-        stock_code = record.get('代码')
-        if stock_code:
-            if stock_code in sectors_map:
-                sector_name, rank = sectors_map[stock_code]
-                # Update with ranking prefix (e.g., #01-中国AI 50)
-                record['所属板块'] = f"{rank:02d}-{sector_name}"
-            else:
-                # Clear old sector info if stock is not in new mapping
-                record['所属板块'] = ""
-    
-    return data
-
-
-def _calculate_price_changes(stock_code: str) -> Dict[str, float]:
-    """Calculate price changes for different time periods
-    
-    Uses MonthlyMarketData for 12-month calculation, WeeklyMarketData for 1-week,
-    and DailyMarketData for 1-month calculation.
-    
-    Args:
-        stock_code: Stock code to calculate price changes for
-        
-    Returns:
-        Dictionary with price change percentages for different periods
-    """
-    from models import DailyMarketData, WeeklyMarketData, MonthlyMarketData, get_session
-    from sqlmodel import select
-    
-    result = {
-        "近12个月涨跌幅": None,
-        "近1个月涨跌幅": None,
-        "近1周涨跌幅": None,
-    }
-    
-    try:
-        with get_session() as session:
-            # Get the most recent trading day for latest price
-            stmt = select(DailyMarketData).where(
-                DailyMarketData.code == stock_code
-            ).order_by(DailyMarketData.date.desc()).limit(1)
-            
-            latest_record = session.exec(stmt).first()
-            if not latest_record:
-                return result
-            
-            latest_price = latest_record.close_price
-            
-            # Calculate 12-month change using MonthlyMarketData
-            # Get last 13 months to ensure we have 12 months of data
-            stmt_monthly = select(MonthlyMarketData).where(
-                MonthlyMarketData.code == stock_code
-            ).order_by(MonthlyMarketData.date.desc()).limit(13)
-            
-            monthly_records = list(session.exec(stmt_monthly).all())
-            if len(monthly_records) >= 12:
-                # Use the latest daily close price and 12 months ago monthly close price
-                price_12m_ago = monthly_records[11].close_price
-                if price_12m_ago and price_12m_ago > 0:
-                    result["近12个月涨跌幅"] = round(((latest_price - price_12m_ago) / price_12m_ago) * 100, 2)
-            
-            # Calculate 1-month change using DailyMarketData (approximately 21 trading days)
-            stmt_daily = select(DailyMarketData).where(
-                DailyMarketData.code == stock_code
-            ).order_by(DailyMarketData.date.desc()).limit(21)
-            
-            daily_records = list(session.exec(stmt_daily).all())
-            if len(daily_records) >= 21:
-                price_1m_ago = daily_records[20].close_price
-                if price_1m_ago and price_1m_ago > 0:
-                    result["近1个月涨跌幅"] = round(((latest_price - price_1m_ago) / price_1m_ago) * 100, 2)
-            
-            # Calculate 1-week change using WeeklyMarketData
-            stmt_weekly = select(WeeklyMarketData).where(
-                WeeklyMarketData.code == stock_code
-            ).order_by(WeeklyMarketData.date.desc()).limit(2)
-            
-            weekly_records = list(session.exec(stmt_weekly).all())
-            if len(weekly_records) >= 2:
-                # Use the latest daily close price and 1 week ago weekly close price
-                price_1w_ago = weekly_records[1].close_price
-                if price_1w_ago and price_1w_ago > 0:
-                    result["近1周涨跌幅"] = round(((latest_price - price_1w_ago) / price_1w_ago) * 100, 2)
-            elif len(weekly_records) == 1:
-                # Fallback: if only one week of data, use daily data for 1 week
-                if len(daily_records) >= 5:
-                    price_1w_ago = daily_records[min(4, len(daily_records) - 1)].close_price
-                    if price_1w_ago and price_1w_ago > 0:
-                        result["近1周涨跌幅"] = round(((latest_price - price_1w_ago) / price_1w_ago) * 100, 2)
-                    
-    except Exception as e:
-        logger.warning(f"Failed to calculate price changes for {stock_code}: {e}")
-    
-    return result
-
-
-def _replace_factors_with_price_changes(data: List[Dict]) -> List[Dict]:
-    """Add price change percentages and remove raw factor values (keep scores)
-    
-    Args:
-        data: List of stock records with factor values
-        
-    Returns:
-        Updated list with price changes added and raw factor values removed
-    """
-    if not data:
-        return data
-    
-    # Define RAW factor value fields to remove (keep 评分 fields!)
-    raw_factor_fields = [
-        "动量因子", "支撑因子", "MACD绝对值和", "最新MACD"
-    ]
-    
-    for record in data:
-        stock_code = record.get('代码')
-        if not stock_code:
-            continue
-        
-        # Calculate price changes
-        price_changes = _calculate_price_changes(stock_code)
-        
-        # Remove ONLY raw factor value fields, NOT the scores
-        for field in raw_factor_fields:
-            record.pop(field, None)
-        
-        # Add price change fields
-        record.update(price_changes)
-    
-    return data
-
-
 def list_all_tasks() -> List[TaskResult]:
     """List all tasks"""
     all_tasks = get_all_tasks()
@@ -551,18 +414,34 @@ def generate_market_analysis_dashboard():
     return generate_market_cycle_analysis()
 
 
-def run_extended_analysis():
+def run_extended_analysis(batch_evaluation: bool = False):
     """Run standalone extended analysis focusing on sector analysis.
     Behavior: always compute a fresh result on manual trigger, cache it, and return it.
     Cache is for other consumers or future reads, and will be cleared when a new main analysis task completes.
+
+    batch_evaluation: score sectors through the OpenAI Batch API (non-interactive runs such as the
+    daily scheduler); the wait can be long, so the run registers a stop event that shutdown can set.
     """
     from data_management.services import (
         cache_extended_analysis,
     )
     from extended_analysis import run_standalone_extended_analysis
+    from uuid import uuid4
+
+    task_id = str(uuid4())
+    stop_event = threading.Event()
+    EXTENDED_ANALYSIS_STOP_EVENTS[task_id] = stop_event
+
+    def _on_progress(msg: str):
+        logger.info(f"Extended analysis {task_id}: {msg}")
 
     # Always compute fresh on manual trigger
-    result = run_standalone_extended_analysis()
+    try:
+        result = run_standalone_extended_analysis(
+            on_progress=_on_progress, stop_event=stop_event, batch_evaluation=batch_evaluation
+        )
+    finally:
+        EXTENDED_ANALYSIS_STOP_EVENTS.pop(task_id, None)
     if result and "error" not in result:
         result["from_cache"] = False
         cache_extended_analysis(result)
@@ -858,6 +737,10 @@ def update_zai_config(config_data: dict) -> dict:
 
         refresh_zai_client_config()
 
+        from data_management.llm_client import refresh_llm_config
+
+        refresh_llm_config()
+
         logger.info("Config update completed successfully")
         return {"success": True, "message": "系统配置已保存"}
     except Exception as e:
@@ -4,7 +4,9 @@ Configuration module for loading environment variables
 import os
 from pathlib import Path
 import json
-from typing import Tuple, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Tuple, Dict, Any, Mapping
 
 # Load environment variables from .env file
 # Look for .env file in the project root (parent of backend directory)
@@ -74,6 +76,39 @@ def get_openai_config() -> Tuple[str, str, str]:
     
     return api_key, base_url, model
 
+def get_openai_rate_limits() -> Tuple[int, int]:
+    """Get client-side OpenAI rate limits (requests per minute, tokens per minute). 0 disables a limit."""
+    cfg = load_config_json()
+    try:
+        rpm = int(cfg.get('OPENAI_RPM', 60))
+        tpm = int(cfg.get('OPENAI_TPM', 100000))
+    except (TypeError, ValueError):
+        rpm, tpm = 60, 100000
+    return max(rpm, 0), max(tpm, 0)
+
+def get_llm_min_content_length() -> int:
+    """Minimum stripped content length worth sending to the LLM for evaluation."""
+    cfg = load_config_json()
+    try:
+        return max(int(cfg.get('LLM_MIN_CONTENT_LENGTH', 32)), 0)
+    except (TypeError, ValueError):
+        return 32
+
+def _config_flag(key: str) -> bool:
+    """Read a boolean flag from config.json; strings like '1'/'true'/'yes'/'on' count as enabled."""
+    value = load_config_json().get(key, False)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def is_openai_prefix_cache_enabled() -> bool:
+    """Whether to send the static evaluation rubric as a shared system-prompt prefix (for servers with prefix caching)."""
+    return _config_flag('OPENAI_PREFIX_CACHE')
+
+def is_openai_batch_evaluation_enabled() -> bool:
+    """Whether the scheduled extended analysis submits its LLM evaluations through the OpenAI Batch API."""
+    return _config_flag('OPENAI_BATCH_EVALUATION')
+
 def is_openai_configured() -> bool:
     """Check if OpenAI API is properly configured."""
     api_key, _, _ = get_openai_config()
@@ -337,11 +372,14 @@ def filter_deepest_nodes(mapping: Dict[str, str]) -> Dict[str, str]:
     return filtered
 
 
-def parse_category_hierarchy() -> Dict[str, str]:
+@lru_cache(maxsize=None)
+def parse_category_hierarchy() -> Mapping[str, str]:
     """直接解析CATEGORY为分类路径映射
+
+    CATEGORY 是常量，只解析一次，返回只读映射供所有调用方共享
     
     Returns:
-        分类名称到完整路径的映射字典
+        分类名称到完整路径的只读映射
     """
     mapping = {}
     lines = CATEGORY.split('\n')
@@ -385,6 +423,6 @@ def parse_category_hierarchy() -> Dict[str, str]:
                 full_path = "/".join(path_stack)
                 mapping[cleaned] = full_path
     
-    return mapping
+    return MappingProxyType(mapping)
 
 
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import logging
 import threading
+import time
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 
@@ -19,7 +20,9 @@ from .stock_data_manager import (
     save_stock_basic_info,
     load_daily_data_for_analysis,
     save_spot_as_daily_data,
-    backfill_limit_up_texts_using_ths
+    backfill_limit_up_texts_using_ths,
+    get_stock_name_map,
+    get_latest_close_and_amount
 )
 from .concept_service import get_stocks_sectors_from_extended_analysis
 from market_data import (
@@ -29,6 +32,9 @@ from market_data import (
 
 logger = logging.getLogger(__name__)
 
+# 每批并发获取的股票数量：足以让 fetch_history 的线程池重叠HTTP请求，又能及时响应取消
+HISTORY_BATCH_SIZE = 80
+
 
 def get_latest_trade_date_and_setup(task_id: str) -> tuple[Any, bool]:
     """获取最新交易日期并设置任务状态"""
@@ -80,20 +86,19 @@ def check_and_upsert_spot_data(task_id: str,stock_codes: List[str], spot: pd.Dat
     
     should_upsert_spot = False
     with Session(engine) as session:
-        # 检查是否有最新交易日的数据
-        latest_data_count = session.exec(
-            select(func.count(DailyMarketData.id))
-            .where(DailyMarketData.date == latest_trade_date)
-        ).first()
-        # logger.info(f"Found {latest_data_count} records for latest_trade_date: {latest_trade_date}")
-        
-        # 获取前一个交易日并检查是否有数据
+        # 获取前一个交易日
         previous_trade_date = latest_trade_date - timedelta(days=3 if latest_trade_date.weekday() == 0 else 1)
         # logger.info(f"latest_trade_date: {latest_trade_date} (weekday: {latest_trade_date.weekday()}), calculated previous_trade_date: {previous_trade_date}")
-        previous_data_count = session.exec(
-            select(func.count(DailyMarketData.id))
-            .where(DailyMarketData.date == previous_trade_date)
-        ).first()
+        
+        # 按日期分组一次统计最新交易日和前一个交易日的数据量，代替分别查询
+        date_counts = dict(session.exec(
+            select(DailyMarketData.date, func.count(DailyMarketData.id))
+            .where(DailyMarketData.date.in_([latest_trade_date, previous_trade_date]))
+            .group_by(DailyMarketData.date)
+        ).all())
+        latest_data_count = date_counts.get(latest_trade_date, 0)
+        previous_data_count = date_counts.get(previous_trade_date, 0)
+        # logger.info(f"Found {latest_data_count} records for latest_trade_date: {latest_trade_date}")
 
         # 只有当今天有数据且前一个交易日也有数据时，才进行upsert
         if latest_data_count == 0:
@@ -198,38 +203,43 @@ def fetch_and_save_historical_data(task_id: str, stock_codes: List[str], should_
             end_date_str = latest_trade_date.strftime("%Y%m%d")
             total_stocks = len(stock_codes)
             
-            logger.info(f"开始逐个获取历史数据，总共 {total_stocks} 个股票")
+            logger.info(f"开始分批获取历史数据，总共 {total_stocks} 个股票，每批 {HISTORY_BATCH_SIZE} 个")
             
             successful_count = 0
             failed_count = 0
             
-            for i, stock_code in enumerate(stock_codes):
-                # 检查任务是否被取消
+            for start in range(0, total_stocks, HISTORY_BATCH_SIZE):
+                # 检查任务是否被取消（批次之间）
                 if stop_event and stop_event.is_set():
                     logger.info(f"任务被取消，已处理 {successful_count} 个股票")
                     return True
                 
-                # 更新进度
-                progress = 0.25 + (0.1 * i / total_stocks)  # 从0.25到0.35
-                update_task_progress(task_id, progress, f"获取第 {i+1}/{total_stocks} 个股票历史数据: {stock_code}")
+                batch_codes = stock_codes[start:start + HISTORY_BATCH_SIZE]
+                
+                def report_progress(done: int, stock_code: str, start: int = start) -> None:
+                    # 更新进度（逐个股票）
+                    index = start + done
+                    progress = 0.25 + (0.1 * index / total_stocks)  # 从0.25到0.35
+                    update_task_progress(task_id, progress, f"获取第 {index}/{total_stocks} 个股票历史数据: {stock_code}")
                 
                 try:
-                    # 获取单个股票的历史数据（不传递task_id避免内部进度显示干扰）
-                    stock_history = fetch_history([stock_code], end_date=end_date_str, days=365, task_id=None)
+                    # 一批股票并发获取（不传递task_id避免内部进度显示干扰），获取一批存一批
+                    batch_history = fetch_history(batch_codes, end_date=end_date_str, days=365, task_id=None, on_progress=report_progress)
                     
-                    if stock_history:
-                        # 立即保存单个股票的数据
-                        save_daily_data(stock_history)
-                        logger.info(f"第 {i+1}/{total_stocks} 个股票 {stock_code} 历史数据保存完成，包含 {len(stock_history)} 条记录")
-                        successful_count += 1
-                    else:
-                        logger.warning(f"第 {i+1}/{total_stocks} 个股票 {stock_code} 未获取到历史数据")
-                        failed_count += 1
+                    if batch_history:
+                        save_daily_data(batch_history)
+                    successful_count += len(batch_history)
+                    failed_count += len(batch_codes) - len(batch_history)
+                    logger.info(f"第 {start + 1}-{start + len(batch_codes)}/{total_stocks} 个股票历史数据保存完成，成功 {len(batch_history)} 个")
+                    
+                    missing = [code for code in batch_codes if code not in batch_history]
+                    if missing:
+                        logger.warning(f"{len(missing)} 个股票未获取到历史数据: {missing[:10]}{'...' if len(missing) > 10 else ''}")
                         
                 except Exception as e:
-                    logger.error(f"第 {i+1}/{total_stocks} 个股票 {stock_code} 历史数据获取/保存失败: {e}")
-                    failed_count += 1
-                    # 继续处理下一个股票，不中断整个流程
+                    logger.error(f"第 {start + 1}-{start + len(batch_codes)}/{total_stocks} 个股票历史数据获取/保存失败: {e}")
+                    failed_count += len(batch_codes)
+                    # 继续处理下一批股票，不中断整个流程
                     continue
             
             update_task_progress(task_id, 0.35, f"历史数据获取完成，成功 {successful_count} 个，失败 {failed_count} 个")
@@ -305,33 +315,19 @@ def compute_factors_and_analysis(task_id: str, stock_codes: List[str],
     # 直接从数据库构建所有股票的spot数据
     print(f"🔧 从数据库构建 {len(stock_codes)} 个股票的spot数据...")
     
-    from models import StockBasicInfo
-    from sqlmodel import Session, select
+    # 名称取自缓存的代码->名称映射，最新价格和成交额按代码分批一次查询
+    stock_name_map = get_stock_name_map()
+    latest_map = get_latest_close_and_amount(stock_codes)
     
     complete_spot_data = []
-    
-    # 从数据库获取所有股票的基本信息和最新价格
-    with Session(engine) as session:
-        for code in stock_codes:
-            # 获取股票名称
-            stock_info = session.exec(
-                select(StockBasicInfo.name).where(StockBasicInfo.code == code)
-            ).first()
-            
-            # 获取最新价格和成交额
-            latest_data = session.exec(
-                select(DailyMarketData.close_price, DailyMarketData.amount)
-                .where(DailyMarketData.code == code)
-                .order_by(DailyMarketData.date.desc())
-                .limit(1)
-            ).first()
-            
-            complete_spot_data.append({
-                "代码": code,
-                "名称": stock_info or code,
-                "最新价": latest_data[0] if latest_data else 0,
-                "成交额": latest_data[1] if latest_data else 0
-            })
+    for code in stock_codes:
+        latest_data = latest_map.get(code)
+        complete_spot_data.append({
+            "代码": code,
+            "名称": stock_name_map.get(code) or code,
+            "最新价": latest_data[0] if latest_data else 0,
+            "成交额": latest_data[1] if latest_data else 0
+        })
     
     # 创建完整的DataFrame
     complete_spot = pd.DataFrame(complete_spot_data)
@@ -380,7 +376,7 @@ def complete_analysis_task(task_id: str, result: Dict[str, Any]) -> None:
     import json
     import os
     from task_utils import set_last_completed_task
-    from .services import ANALYSIS_RESULTS_CACHE, CACHE_LOCK
+    from .services import cache_analysis_results
     
     task = get_task(task_id)
     if not task:
@@ -390,7 +386,8 @@ def complete_analysis_task(task_id: str, result: Dict[str, Any]) -> None:
     task.status = TaskStatus.COMPLETED
     task.progress = 1.0
     task.message = f"分析完成，数据已保存到数据库，共 {result['count']} 条结果"
-    task.completed_at = datetime.now().isoformat()
+    completed_at_ns = time.time_ns()
+    task.completed_at = datetime.fromtimestamp(completed_at_ns / 1e9).isoformat()
     task.result = result
 
     # Prepare full result data for JSON and cache
@@ -400,6 +397,7 @@ def complete_analysis_task(task_id: str, result: Dict[str, Any]) -> None:
         "progress": task.progress,
         "message": task.message,
         "completed_at": task.completed_at,
+        "completed_at_ns": completed_at_ns,
         "created_at": task.created_at,
         "top_n": task.top_n,
         "selected_factors": task.selected_factors,
@@ -409,14 +407,16 @@ def complete_analysis_task(task_id: str, result: Dict[str, Any]) -> None:
     }
 
     # Store results in memory cache for frontend access
-    with CACHE_LOCK:
-        ANALYSIS_RESULTS_CACHE[task_id] = full_result.copy()
+    cache_analysis_results(task_id, full_result.copy())
 
     # Save results to JSON file for persistence across server restarts
     try:
         json_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ranking.json")
-        with open(json_file_path, 'w', encoding='utf-8') as f:
+        # 先写临时文件再原子替换，避免读取方读到写了一半的文件
+        tmp_path = f"{json_file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(full_result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, json_file_path)
         logger.info(f"Analysis results saved to {json_file_path}")
     except Exception as e:
         logger.warning(f"Failed to save analysis results to JSON file: {e}")
@@ -29,6 +29,9 @@ from market_data.concept10jqka import collect_concept_data
 
 logger = logging.getLogger(__name__)
 
+# 全表读取概念时每批拉取的行数
+_CONCEPT_YIELD_PER = 1000
+
 
 def clear_concept_tables_for_testing():
     """清空概念相关表（仅用于测试），用于验证新数据源"""
@@ -123,6 +126,19 @@ def collect_concepts_task(task_id: str, clear_db: bool = False):
                         )
                     )
 
+                    # 一次性查出本板块已存在的股票基本信息，避免每只成分股单独查询
+                    entry_codes = list(
+                        {stock_data["stock_code"] for stock_data in concept_stock_entries}
+                    )
+                    basic_info_map = {
+                        info.code: info
+                        for info in session.exec(
+                            select(StockBasicInfo).where(
+                                StockBasicInfo.code.in_(entry_codes)
+                            )
+                        )
+                    } if entry_codes else {}
+
                     for stock_data in concept_stock_entries:
                         stock_entry = stock_data.copy()
                         stock_code = stock_entry["stock_code"]
@@ -132,11 +148,7 @@ def collect_concepts_task(task_id: str, clear_db: bool = False):
                         concept_stock = ConceptStock(**stock_entry)
                         session.add(concept_stock)
 
-                        stock_basic_info = session.exec(
-                            select(StockBasicInfo).where(
-                                StockBasicInfo.code == stock_code
-                            )
-                        ).first()
+                        stock_basic_info = basic_info_map.get(stock_code)
 
                         if not stock_basic_info:
                             stock_basic_info = StockBasicInfo(
@@ -148,6 +160,7 @@ def collect_concepts_task(task_id: str, clear_db: bool = False):
                                 updated_at=datetime.now(),
                             )
                             session.add(stock_basic_info)
+                            basic_info_map[stock_code] = stock_basic_info
                         else:
                             if market_cap is not None:
                                 stock_basic_info.circulating_market_cap = market_cap
@@ -260,7 +273,10 @@ def create_concept_collection_task(clear_db: bool = False) -> str:
 def get_concepts_from_db() -> List[Dict]:
     """Get all concepts from database"""
     with Session(engine) as session:
-        concepts = session.exec(select(ConceptInfo)).all()
+        # 分批拉取，避免一次性物化整张表
+        concepts = session.exec(
+            select(ConceptInfo).execution_options(yield_per=_CONCEPT_YIELD_PER)
+        )
         return [
             {
                 "code": concept.code,
@@ -300,7 +316,8 @@ def get_stocks_sectors_from_extended_analysis(
         # 获取所有板块
         sectors = extended_data.get("sectors", [])
 
-        # 构建股票到板块的映射
+        # 构建股票到板块的映射；待查代码转为集合，避免每次成员判断都扫描列表
+        wanted_codes = set(stock_codes)
         stock_to_sector_map = {}
 
         # 按评分顺序处理每个板块（排名从1开始）
@@ -315,7 +332,7 @@ def get_stocks_sectors_from_extended_analysis(
                     if len(stock_code) == 8 and stock_code[:2] in ["sz", "sh"]
                     else stock_code
                 )
-                if clean_code in stock_codes:
+                if clean_code in wanted_codes:
                     # 如果股票已经在更高排名的板块中，跳过（只保留最高排名板块）
                     if clean_code not in stock_to_sector_map:
                         stock_to_sector_map[clean_code] = (sector_name, rank)
@@ -2,16 +2,42 @@ from __future__ import annotations
 import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
+import heapq
 import random
+import pandas as pd
+from sqlalchemy import bindparam
 from sqlmodel import Session, select
-from models import engine, DailyMarketData, WeeklyMarketData, MonthlyMarketData, StockBasicInfo, get_session
+from models import engine, DailyMarketData, WeeklyMarketData, MonthlyMarketData
 from config import CATEGORY
+from .stock_data_manager import get_stock_name_map
 import os
 import json
 
 logger = logging.getLogger(__name__)
 
 
+def _recent_trend_frame(rows, columns: List[str], n_days: int) -> pd.DataFrame:
+    """Build a frame of each stock's last N trading days with trend (and amplitude) columns.
+
+    ``rows`` must be ordered by (code, date); the per-stock work is done with groupby
+    instead of Python loops over every record.
+    """
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    df = df.groupby("code", sort=False).tail(n_days)
+
+    # Percentage change relative to each stock's first close in the window
+    first_close = df.groupby("code", sort=False)["close"].transform("first")
+    df["trend"] = ((df["close"] - first_close) / first_close * 100).where(first_close > 0, 0.0)
+
+    if "open" in df.columns:
+        # K-line body amplitude (close - open) / open * 100
+        open_price = df["open"].astype("float64")
+        df["amplitude"] = ((df["close"] - open_price) / open_price * 100).where(open_price > 0, 0.0)
+
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    return df
+
+
 def get_kline_amplitude_analysis(n_days: int = 30) -> Dict[str, Any]:
     """Calculate K-line body amplitude for hot spot stocks over past N days"""
     
@@ -40,7 +66,7 @@ def get_kline_amplitude_analysis(n_days: int = 30) -> Dict[str, Any]:
             
             # Get top stocks by trading amount on latest date
             hot_stocks = session.exec(
-                select(DailyMarketData)
+                select(DailyMarketData.code, DailyMarketData.amount)
                 .where(DailyMarketData.date == latest_date)
                 .where(DailyMarketData.volume > 0)
                 .order_by(DailyMarketData.amount.desc())
@@ -64,19 +90,25 @@ def get_kline_amplitude_analysis(n_days: int = 30) -> Dict[str, Any]:
             
             # Get historical data for these stocks
             historical_data = session.exec(
-                select(DailyMarketData)
+                select(DailyMarketData.code, DailyMarketData.date, DailyMarketData.open_price, DailyMarketData.close_price)
                 .where(DailyMarketData.code.in_(hot_stock_codes))
                 .where(DailyMarketData.date >= start_date)
                 .where(DailyMarketData.date <= end_date)
                 .order_by(DailyMarketData.code, DailyMarketData.date)
-            ).all()
+                .execution_options(yield_per=1000)
+            )
+            
+            # Keep the recent N trading days per stock and compute trend/amplitude with groupby
+            trend_df = _recent_trend_frame(historical_data, ["code", "date", "open", "close"], n_days)
+            stock_groups = {code: group for code, group in trend_df.groupby("code", sort=False)}
+
+            # Largest absolute body amplitude per stock (first occurrence wins on ties)
+            amplitude = trend_df["amplitude"]
+            max_amplitude_map = amplitude.loc[amplitude.abs().groupby(trend_df["code"], sort=False).idxmax()]
+            max_amplitude_map.index = trend_df.loc[max_amplitude_map.index, "code"]
             
-            # Group by stock code
-            stock_data_map = {}
-            for record in historical_data:
-                if record.code not in stock_data_map:
-                    stock_data_map[record.code] = []
-                stock_data_map[record.code].append(record)
+            # Resolve stock names from the cached code -> name map instead of one lookup per stock
+            stock_name_map = get_stock_name_map()
             
             # Calculate amplitude for each stock
             amplitude_results = []
@@ -85,61 +117,23 @@ def get_kline_amplitude_analysis(n_days: int = 30) -> Dict[str, Any]:
             logger.info(f"开始处理 {len(hot_stock_codes)} 只热门股票")
             
             for stock_code in hot_stock_codes:
-                stock_records = stock_data_map.get(stock_code, [])
-                if len(stock_records) < n_days // 2:  # Need minimum data
+                group = stock_groups.get(stock_code)
+                record_count = 0 if group is None else len(group)
+                if record_count < n_days // 2:  # Need minimum data (the frame holds at most n_days per stock)
                     filtered_count += 1
-                    logger.debug(f"股票 {stock_code} 历史数据不足，跳过 (需要至少 {n_days // 2} 天，实际 {len(stock_records)} 天)")
+                    logger.debug(f"股票 {stock_code} 历史数据不足，跳过 (需要至少 {n_days // 2} 天，实际 {record_count} 天)")
                     continue
                 
-                # Sort by date
-                stock_records.sort(key=lambda x: x.date)
+                stock_name = stock_name_map.get(stock_code, stock_code)
                 
-                # Take only recent N trading days
-                recent_records = stock_records[-n_days:] if len(stock_records) >= n_days else stock_records
-                
-                if not recent_records:
-                    continue
-                
-                # Calculate K-line body amplitudes (close - open) / open * 100
-                max_amplitude = 0
-                trend_data = []
-                dates = []
-                
-                first_close_price = None
-                for i, record in enumerate(recent_records):
-                    if record.open_price and record.open_price > 0:
-                        amplitude = (record.close_price - record.open_price) / record.open_price * 100
-                        if abs(amplitude) > abs(max_amplitude):
-                            max_amplitude = amplitude
-                    
-                    # Set first close price as baseline
-                    if i == 0:
-                        first_close_price = record.close_price
-                    
-                    # Calculate percentage change relative to first close price
-                    if first_close_price and first_close_price > 0:
-                        percentage_change = ((record.close_price - first_close_price) / first_close_price) * 100
-                        trend_data.append(percentage_change)
-                    else:
-                        trend_data.append(0)
-                    
-                    dates.append(record.date.strftime('%Y-%m-%d'))
-                
-                if trend_data:
-                    # Get stock name from stock info table
-                    stock_info = session.exec(
-                        select(StockBasicInfo).where(StockBasicInfo.code == stock_code)
-                    ).first()
-                    stock_name = stock_info.name if stock_info else stock_code
-                    
-                    amplitude_results.append({
-                        "code": stock_code,
-                        "name": stock_name,
-                        "amplitude": max_amplitude,
-                        "trend_data": trend_data,
-                        "dates": dates,
-                        "amount": stock_amount_map.get(stock_code, 0)
-                    })
+                amplitude_results.append({
+                    "code": stock_code,
+                    "name": stock_name,
+                    "amplitude": float(max_amplitude_map[stock_code]),
+                    "trend_data": group["trend"].tolist(),
+                    "dates": group["date"].tolist(),
+                    "amount": stock_amount_map.get(stock_code, 0)
+                })
             
             # Sort by amplitude (ascending - from negative to positive)
             amplitude_results.sort(key=lambda x: x["amplitude"])
@@ -153,7 +147,7 @@ def get_kline_amplitude_analysis(n_days: int = 30) -> Dict[str, Any]:
             top_5 = hot_stocks_by_amount[:5]
 
             # Get last 5 by trading amount (lowest amount) from the hot stocks
-            last_5 = sorted(amplitude_results, key=lambda x: x.get("amount", 0))[:5]
+            last_5 = heapq.nsmallest(5, amplitude_results, key=lambda x: x.get("amount", 0))
 
             return {
                 "stocks": amplitude_results,  # Sorted by amplitude for bar chart
@@ -203,7 +197,7 @@ def get_random_stocks_analysis(n_days: int = 30) -> Dict[str, Any]:
 
             # Get all stocks with volume > 0 on latest date
             all_stocks = session.exec(
-                select(DailyMarketData)
+                select(DailyMarketData.code)
                 .where(DailyMarketData.date == latest_date)
                 .where(DailyMarketData.volume > 0)
             ).all()
@@ -214,8 +208,7 @@ def get_random_stocks_analysis(n_days: int = 30) -> Dict[str, Any]:
 
             # Extract clean stock codes (remove exchange prefix if exists)
             stock_codes = []
-            for stock in all_stocks:
-                code = stock.code
+            for code in all_stocks:
                 # Remove exchange prefix (sh/sz) if it exists
                 if code.startswith(('sh', 'sz')):
                     code = code[2:]
@@ -226,68 +219,37 @@ def get_random_stocks_analysis(n_days: int = 30) -> Dict[str, Any]:
 
             # Get historical data for these stocks
             historical_data = session.exec(
-                select(DailyMarketData)
+                select(DailyMarketData.code, DailyMarketData.date, DailyMarketData.close_price)
                 .where(DailyMarketData.code.in_(random_codes))
                 .where(DailyMarketData.date >= start_date)
                 .where(DailyMarketData.date <= end_date)
                 .order_by(DailyMarketData.code, DailyMarketData.date)
-            ).all()
+                .execution_options(yield_per=1000)
+            )
+
+            # Keep the recent N trading days per stock and compute trend data with groupby
+            trend_df = _recent_trend_frame(historical_data, ["code", "date", "close"], n_days)
+            stock_groups = {code: group for code, group in trend_df.groupby("code", sort=False)}
 
-            # Group by stock code
-            stock_data_map = {}
-            for record in historical_data:
-                if record.code not in stock_data_map:
-                    stock_data_map[record.code] = []
-                stock_data_map[record.code].append(record)
+            # Resolve stock names from the cached code -> name map instead of one lookup per stock
+            stock_name_map = get_stock_name_map()
 
-            # Calculate trend data for each stock
+            # Collect trend data for each stock
             random_stocks = []
 
             for stock_code in random_codes:
-                stock_records = stock_data_map.get(stock_code, [])
-                if len(stock_records) < n_days // 2:  # Need minimum data
+                group = stock_groups.get(stock_code)
+                if group is None or len(group) < n_days // 2:  # Need minimum data (the frame holds at most n_days per stock)
                     continue
 
-                # Sort by date
-                stock_records.sort(key=lambda x: x.date)
+                stock_name = stock_name_map.get(stock_code, stock_code)
 
-                # Take only recent N trading days
-                recent_records = stock_records[-n_days:] if len(stock_records) >= n_days else stock_records
-
-                if not recent_records:
-                    continue
-
-                trend_data = []
-                dates = []
-                first_close_price = None
-
-                for i, record in enumerate(recent_records):
-                    # Set first close price as baseline
-                    if i == 0:
-                        first_close_price = record.close_price
-
-                    # Calculate percentage change relative to first close price
-                    if first_close_price and first_close_price > 0:
-                        percentage_change = ((record.close_price - first_close_price) / first_close_price) * 100
-                        trend_data.append(percentage_change)
-                    else:
-                        trend_data.append(0)
-
-                    dates.append(record.date.strftime('%Y-%m-%d'))
-
-                if trend_data:
-                    # Get stock name from stock info table
-                    stock_info = session.exec(
-                        select(StockBasicInfo).where(StockBasicInfo.code == stock_code)
-                    ).first()
-                    stock_name = stock_info.name if stock_info else stock_code
-
-                    random_stocks.append({
-                        "code": stock_code,
-                        "name": stock_name,
-                        "trend_data": trend_data,
-                        "dates": dates
-                    })
+                random_stocks.append({
+                    "code": stock_code,
+                    "name": stock_name,
+                    "trend_data": group["trend"].tolist(),
+                    "dates": group["date"].tolist()
+                })
 
             return {
                 "random_5": random_stocks[:5],  # Ensure we only return 5
@@ -325,16 +287,12 @@ def get_top_30_stocks_for_analysis() -> List[Dict[str, Any]]:
             logger.warning("No data in ranking.json")
             return []
 
+        # Pick the top 30 by composite score first, so price changes are only computed for those
+        sorted_stocks = heapq.nlargest(30, stocks_data, key=lambda x: x.get('综合评分', 0))
+
         # Refresh sector info and price change data to match API behavior
-        stocks_data = _refresh_sector_info(stocks_data)
-        stocks_data = _replace_factors_with_price_changes(stocks_data)
-        
-        # Sort by composite score and get top 30
-        sorted_stocks = sorted(
-            stocks_data, 
-            key=lambda x: x.get('综合评分', 0), 
-            reverse=True
-        )[:30]
+        sorted_stocks = _refresh_sector_info(sorted_stocks)
+        sorted_stocks = _replace_factors_with_price_changes(sorted_stocks, include_latest_price=True)
         
         # Extract required fields
         result = []
@@ -385,6 +343,23 @@ def _refresh_sector_info(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return data
 
 
+def _recent_closes_statement(model, limit: int):
+    """Build a parameterized "latest N close prices for a stock" query."""
+    return (
+        select(model.close_price)
+        .where(model.code == bindparam("code"))
+        .order_by(model.date.desc())
+        .limit(limit)
+    )
+
+
+# Built once and bound per stock, so repeated price-change lookups reuse the
+# same statement objects and their compiled-SQL cache entries
+_DAILY_CLOSES_STMT = _recent_closes_statement(DailyMarketData, 21)
+_MONTHLY_CLOSES_STMT = _recent_closes_statement(MonthlyMarketData, 13)
+_WEEKLY_CLOSES_STMT = _recent_closes_statement(WeeklyMarketData, 2)
+
+
 def _calculate_price_changes(stock_code: str) -> Dict[str, float | None]:
     """Calculate price change percentages for multiple periods.
     
@@ -399,66 +374,42 @@ def _calculate_price_changes(stock_code: str) -> Dict[str, float | None]:
     }
 
     try:
-        with get_session() as session:
-            # Get the most recent trading day for latest price
-            stmt = (
-                select(DailyMarketData)
-                .where(DailyMarketData.code == stock_code)
-                .order_by(DailyMarketData.date.desc())
-                .limit(1)
-            )
-            latest_record = session.exec(stmt).first()
-            if not latest_record:
+        # Read-only scans: fetch close prices as plain values through a Core connection
+        with engine.connect() as conn:
+            # Latest ~21 trading days (approximately 1 month); the first one is the latest price
+            daily_closes = conn.execute(_DAILY_CLOSES_STMT, {"code": stock_code}).scalars().all()
+            if not daily_closes:
                 return result
 
-            latest_price = latest_record.close_price
+            latest_price = daily_closes[0]
             result["最新价"] = round(latest_price, 2) if latest_price is not None else None
 
             # Calculate 12-month change using MonthlyMarketData
             # Get last 13 months to ensure we have 12 months of data
-            stmt_monthly = (
-                select(MonthlyMarketData)
-                .where(MonthlyMarketData.code == stock_code)
-                .order_by(MonthlyMarketData.date.desc())
-                .limit(13)
-            )
-            monthly_records = list(session.exec(stmt_monthly).all())
-            if len(monthly_records) >= 12:
+            monthly_closes = conn.execute(_MONTHLY_CLOSES_STMT, {"code": stock_code}).scalars().all()
+            if len(monthly_closes) >= 12:
                 # Use the latest daily close price and 12 months ago monthly close price
-                price_12m_ago = monthly_records[11].close_price
+                price_12m_ago = monthly_closes[11]
                 if price_12m_ago and price_12m_ago > 0:
                     result["近12个月涨跌幅"] = round(((latest_price - price_12m_ago) / price_12m_ago) * 100, 2)
 
-            # Calculate 1-month change using DailyMarketData (approximately 21 trading days)
-            stmt_daily = (
-                select(DailyMarketData)
-                .where(DailyMarketData.code == stock_code)
-                .order_by(DailyMarketData.date.desc())
-                .limit(21)
-            )
-            daily_records = list(session.exec(stmt_daily).all())
-            if len(daily_records) >= 21:
-                price_1m_ago = daily_records[20].close_price
+            # Calculate 1-month change using DailyMarketData
+            if len(daily_closes) >= 21:
+                price_1m_ago = daily_closes[20]
                 if price_1m_ago and price_1m_ago > 0:
                     result["近1个月涨跌幅"] = round(((latest_price - price_1m_ago) / price_1m_ago) * 100, 2)
 
             # Calculate 1-week change using WeeklyMarketData
-            stmt_weekly = (
-                select(WeeklyMarketData)
-                .where(WeeklyMarketData.code == stock_code)
-                .order_by(WeeklyMarketData.date.desc())
-                .limit(2)
-            )
-            weekly_records = list(session.exec(stmt_weekly).all())
-            if len(weekly_records) >= 2:
+            weekly_closes = conn.execute(_WEEKLY_CLOSES_STMT, {"code": stock_code}).scalars().all()
+            if len(weekly_closes) >= 2:
                 # Use the latest daily close price and 1 week ago weekly close price
-                price_1w_ago = weekly_records[1].close_price
+                price_1w_ago = weekly_closes[1]
                 if price_1w_ago and price_1w_ago > 0:
                     result["近1周涨跌幅"] = round(((latest_price - price_1w_ago) / price_1w_ago) * 100, 2)
-            elif len(weekly_records) == 1:
+            elif len(weekly_closes) == 1:
                 # Fallback: if only one week of data, use daily data for 1 week
-                if len(daily_records) >= 5:
-                    price_1w_ago = daily_records[min(4, len(daily_records) - 1)].close_price
+                if len(daily_closes) >= 5:
+                    price_1w_ago = daily_closes[min(4, len(daily_closes) - 1)]
                     if price_1w_ago and price_1w_ago > 0:
                         result["近1周涨跌幅"] = round(((latest_price - price_1w_ago) / price_1w_ago) * 100, 2)
 
@@ -468,8 +419,11 @@ def _calculate_price_changes(stock_code: str) -> Dict[str, float | None]:
     return result
 
 
-def _replace_factors_with_price_changes(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Remove raw factor columns and add price change data."""
+def _replace_factors_with_price_changes(data: List[Dict[str, Any]], include_latest_price: bool = False) -> List[Dict[str, Any]]:
+    """Remove raw factor columns and add price change data.
+
+    The ranking API keeps its own 当前价格 column, so 最新价 is only added when requested.
+    """
     if not data:
         return data
 
@@ -483,7 +437,10 @@ def _replace_factors_with_price_changes(data: List[Dict[str, Any]]) -> List[Dict
         for field in raw_factor_fields:
             record.pop(field, None)
 
-        record.update(_calculate_price_changes(stock_code))
+        price_changes = _calculate_price_changes(stock_code)
+        if not include_latest_price:
+            price_changes.pop("最新价", None)
+        record.update(price_changes)
 
     return data
 
@@ -495,7 +452,7 @@ def generate_market_cycle_analysis() -> Dict[str, Any]:
         Dictionary containing analysis text and metadata
     """
     try:
-        from .llm_client import get_llm_client
+        from .llm_client import get_llm_client, create_with_retry
         from config import get_openai_config
         
         # Get top 30 stocks
@@ -537,7 +494,9 @@ def generate_market_cycle_analysis() -> Dict[str, Any]:
         
         logger.info("Calling LLM for market cycle analysis...")
         
-        response = client.chat.completions.create(
+        # Go through the shared retry/rate-limit path used by all LLM calls
+        response = create_with_retry(
+            client,
             model=model,
             messages=[
                 {"role": "user", "content": prompt}
@@ -1,13 +1,105 @@
 from __future__ import annotations
+import hashlib
 import json
 import logging
+import random
+import threading
 import time
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
 import openai
-from config import parse_category_hierarchy
+from config import parse_category_hierarchy, get_openai_config, get_llm_min_content_length, is_openai_prefix_cache_enabled
+
+# tiktoken is optional; fall back to a character-based estimate when unavailable
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+    tiktoken = None
+
+# orjson is optional; fall back to the stdlib json module when unavailable
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# 可重试的瞬时错误：限流、连接失败、超时、服务端5xx
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """序列化为JSON字符串（保留中文），优先使用 orjson"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def json_loads(text: str) -> Any:
+    """解析JSON字符串，优先使用 orjson（其 JSONDecodeError 是 json.JSONDecodeError 的子类）"""
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# 缓存的 (api_key, base_url)、评估最短内容长度与前缀缓存开关，配置保存后通过 refresh_llm_config() 失效
+_llm_credentials: Optional[Tuple[str, str]] = None
+_llm_min_content_length: Optional[int] = None
+_llm_prefix_cache_enabled: Optional[bool] = None
+_llm_credentials_lock = threading.Lock()
+
+
+def _get_llm_credentials() -> Tuple[str, str]:
+    """读取并缓存 API Key 与 Base URL，避免每次创建客户端都读取配置文件"""
+    global _llm_credentials
+    with _llm_credentials_lock:
+        if _llm_credentials is None:
+            api_key, base_url, _ = get_openai_config()
+            _llm_credentials = (api_key, base_url)
+        return _llm_credentials
+
+
+def _get_llm_min_content_length() -> int:
+    """读取并缓存评估所需的最短内容长度，避免每次评估都解析配置文件"""
+    global _llm_min_content_length
+    with _llm_credentials_lock:
+        if _llm_min_content_length is None:
+            _llm_min_content_length = get_llm_min_content_length()
+        return _llm_min_content_length
+
+
+def _is_prefix_cache_enabled() -> bool:
+    """读取并缓存前缀缓存开关，避免每次构建评估提示都解析配置文件"""
+    global _llm_prefix_cache_enabled
+    with _llm_credentials_lock:
+        if _llm_prefix_cache_enabled is None:
+            _llm_prefix_cache_enabled = is_openai_prefix_cache_enabled()
+        return _llm_prefix_cache_enabled
+
+
+def refresh_llm_config() -> None:
+    """清除缓存的LLM配置，下次使用时重新读取"""
+    global _llm_credentials, _llm_min_content_length, _llm_prefix_cache_enabled
+    with _llm_credentials_lock:
+        _llm_credentials = None
+        _llm_min_content_length = None
+        _llm_prefix_cache_enabled = None
+    # RPM/TPM 也可能已修改，下次请求时按新配置重建限流器
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = None
+
+
 def get_llm_client(scheme='openai'):
     """
     获取 OpenAI 或其他 LLM 服务的客户端
@@ -19,9 +111,8 @@ def get_llm_client(scheme='openai'):
         openai.Client: 配置好的客户端实例
     """
     try:
-        # 从配置文件获取API Key和Base URL
-        from config import get_openai_config
-        api_key, base_url, _ = get_openai_config()
+        # 获取API Key和Base URL，未配置时在构建客户端前直接失败
+        api_key, base_url = _get_llm_credentials()
         
         if not api_key:
             raise ValueError("OpenAI API Key 未配置，请在配置对话框中设置")
@@ -37,7 +128,179 @@ def get_llm_client(scheme='openai'):
         logger.error(f"初始化 {scheme} 客户端出错: {e}")
         raise
 
-def llm_gen_dict(client: openai.Client, model: str, query: str, format_example: Dict, stream: bool = False, max_retries: int = 3, retry_delay: int = 1) -> Dict:
+class _RateLimiter:
+    """进程内的客户端限流器：请求数(RPM)与Token数(TPM)两个令牌桶，调用前预留额度，不足时等待"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._request_budget = float(rpm)
+        self._token_budget = float(tpm)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm:
+            self._request_budget = min(self.rpm, self._request_budget + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._token_budget = min(self.tpm, self._token_budget + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens: int) -> None:
+        """预留一次请求及 tokens 个Token的额度，额度不足时阻塞等待"""
+        # 单次请求超过整桶容量时按整桶计，避免永远等待
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        while True:
+            with self._lock:
+                self._refill()
+                request_ok = not self.rpm or self._request_budget >= 1
+                token_ok = not self.tpm or self._token_budget >= tokens
+                if request_ok and token_ok:
+                    if self.rpm:
+                        self._request_budget -= 1
+                    if self.tpm:
+                        self._token_budget -= tokens
+                    return
+                wait = 0.0
+                if not request_ok:
+                    wait = max(wait, (1 - self._request_budget) * 60 / self.rpm)
+                if not token_ok:
+                    wait = max(wait, (tokens - self._token_budget) * 60 / self.tpm)
+            time.sleep(wait)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """用响应中的实际用量修正预留的Token额度"""
+        if not self.tpm:
+            return
+        with self._lock:
+            self._token_budget = min(self.tpm, self._token_budget + estimated_tokens - actual_tokens)
+
+
+_rate_limiter: Optional[_RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _get_rate_limiter() -> _RateLimiter:
+    """获取进程级单例限流器（首次使用时按配置创建）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            from config import get_openai_rate_limits
+            rpm, tpm = get_openai_rate_limits()
+            _rate_limiter = _RateLimiter(rpm=rpm, tpm=tpm)
+            logger.info(f"LLM客户端限流: RPM={rpm or '不限'}, TPM={tpm or '不限'}")
+        return _rate_limiter
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """模型对应的tiktoken编码，非OpenAI模型（如GLM）用通用编码近似；未安装或加载失败时返回None"""
+    if not HAS_TIKTOKEN:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # 编码文件首次使用需下载，离线环境下退回字符估算
+        logger.warning(f"加载tiktoken编码失败，改用字符估算: {e}")
+        return None
+
+
+@lru_cache(maxsize=256)
+def _count_tokens(text: str, model: str) -> int:
+    """单段文本的Token数，结果按文本缓存，固定的系统提示/评分标准只编码一次"""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 按字符估算：中文等非ASCII字符约1个Token/字，ASCII约4字符/Token
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+
+def _estimate_tokens(messages: list, model: str) -> int:
+    """估算请求消息的Token数：优先使用tiktoken，未安装时按字符类型近似"""
+    return sum(_count_tokens(m.get("content") or "", model) for m in messages)
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    """从错误响应头中读取服务端建议的等待秒数（retry-after-ms / retry-after）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get('retry-after')
+        if retry_after is not None:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def create_with_retry(client: openai.Client, max_attempts: int = 6, initial_wait: float = 1, max_wait: float = 30, **kwargs):
+    """
+    调用 chat.completions.create，对限流/连接/超时/5xx 等瞬时错误做指数退避重试
+
+    每次发送前先向进程级限流器预留请求和Token额度，响应返回后按实际用量修正。
+    限流时优先使用服务端返回的 Retry-After 等待时间，否则按指数退避加随机抖动等待。
+    SDK 自带的重试被关闭，避免与这里的重试叠加。
+
+    Args:
+        client: OpenAI客户端实例
+        max_attempts: 最大尝试次数，默认6次
+        initial_wait: 首次退避等待秒数
+        max_wait: 单次退避等待的上限秒数
+        **kwargs: 透传给 chat.completions.create 的参数
+
+    Returns:
+        ChatCompletion: 接口响应
+    """
+    limiter = _get_rate_limiter()
+    estimated_tokens = _estimate_tokens(kwargs.get('messages', []), kwargs.get('model', ''))
+
+    for attempt in range(max_attempts):
+        limiter.acquire(estimated_tokens)
+        try:
+            response = client.with_options(max_retries=0).chat.completions.create(**kwargs)
+            usage = getattr(response, 'usage', None)
+            if usage is not None and getattr(usage, 'total_tokens', None):
+                limiter.reconcile(estimated_tokens, usage.total_tokens)
+            return response
+        except _RETRYABLE_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+
+            wait = None
+            if isinstance(e, openai.RateLimitError):
+                wait = _get_retry_after(e)
+            if wait is None:
+                wait = min(max_wait, initial_wait * (2 ** attempt) + random.uniform(0, 1))
+
+            logger.warning(f"LLM接口瞬时错误 {type(e).__name__}，{wait:.1f} 秒后进行第 {attempt + 2}/{max_attempts} 次尝试: {e}")
+            time.sleep(wait)
+
+
+def _build_system_prompt(format_example: Dict) -> str:
+    """构建系统提示，强制输出为JSON格式"""
+    return f"""你是一个专业的加密货币分析师。请严格按照以下JSON格式输出结果，不要包含任何其他文字：
+
+输出格式示例：
+{json_dumps(format_example, indent=True)}
+
+重要要求：
+1. 输出必须是有效的JSON格式
+2. 不要包含任何解释或额外文字
+"""
+
+
+def llm_gen_dict(client: openai.Client, model: str, query: str, format_example: Dict, max_retries: int = 3, retry_delay: int = 1, system_prompt: Optional[str] = None) -> Dict:
     """
     使用LLM生成符合指定格式的字典结果，支持重试机制
     
@@ -46,24 +309,20 @@ def llm_gen_dict(client: openai.Client, model: str, query: str, format_example:
         model: 模型名称
         query: 查询内容
         format_example: 输出格式示例
-        stream: 是否使用流式输出
         max_retries: 最大重试次数，默认3次
         retry_delay: 重试间隔秒数，默认1秒
+        system_prompt: 自定义系统提示，默认根据 format_example 构建
         
     Returns:
         Dict: 解析后的字典结果
+
+    Raises:
+        _RETRYABLE_ERRORS: 限流/连接/超时/5xx 已在 create_with_retry 中退避重试，
+            耗尽后直接抛出，不再叠加本函数的重试
     """
     
-    # 构建系统提示，强制输出为JSON格式
-    system_prompt = f"""你是一个专业的加密货币分析师。请严格按照以下JSON格式输出结果，不要包含任何其他文字：
-
-输出格式示例：
-{json.dumps(format_example, ensure_ascii=False, indent=2)}
-
-重要要求：
-1. 输出必须是有效的JSON格式
-2. 不要包含任何解释或额外文字
-"""
+    if system_prompt is None:
+        system_prompt = _build_system_prompt(format_example)
 
     last_exception = None
     
@@ -71,27 +330,22 @@ def llm_gen_dict(client: openai.Client, model: str, query: str, format_example:
         try:
             logger.debug(f"llm_gen_dict 第 {attempt + 1}/{max_retries} 次尝试")
             
-            response = client.chat.completions.create(
+            response = create_with_retry(
+                client,
                 model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": query}
                 ],
                 temperature=0.3,
-                stream=stream
+                response_format={"type": "json_object"}
             )
             
-            if stream:
-                # 处理流式响应
-                content = ""
-                for chunk in response:
-                    if chunk.choices[0].delta.content:
-                        content += chunk.choices[0].delta.content
-            else:
-                content = response.choices[0].message.content
+            # 只消费最终JSON，非流式一次性返回即可
+            content = response.choices[0].message.content
             
             # 尝试解析JSON
-            result = json.loads(content)
+            result = json_loads(content)
             logger.debug(f"llm_gen_dict 第 {attempt + 1} 次尝试成功")
             return result
             
@@ -105,6 +359,9 @@ def llm_gen_dict(client: openai.Client, model: str, query: str, format_example:
             else:
                 time.sleep(retry_delay)
                 continue
+
+        except _RETRYABLE_ERRORS:
+            raise
                 
         except Exception as e:
             last_exception = e
@@ -121,35 +378,55 @@ def llm_gen_dict(client: openai.Client, model: str, query: str, format_example:
     return {}
 
 
-def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
-    """
-    使用OpenAI API评估内容
+def _evaluation_cache_key(model: str, system_prompt: str, content: str) -> str:
+    """评估缓存键：sha256(模型 + 系统提示 + 内容)"""
+    return hashlib.sha256((model + system_prompt + content).encode("utf-8")).hexdigest()
 
-    Args:
-        model: 模型名称
-        model: 模型名称
-        content: 待评估的内容
-        criteria_dict: 评估标准字典
 
-    Returns:
-        dict: 包含详细评估结果的字典，格式如下：
-        {
-            "overall_score": float,  # 总分
-            "detailed_scores": dict,  # 各项详细分数
-            "top_scoring_criterion": str,  # 最高分标准
-            "top_score": float,  # 最高分数
-        }
-    """
-    
-    # 构建输出格式示例
-    format_example = {
-        "category":"叶节点分类",
-        "criteria_name_1":{"score":"1-5", "explanation":"中文评分说明"},
-        "criteria_name_2":{"score":"1-5", "explanation":"中文评分说明"},
-        "criteria_name_...":{"score":"1-5", "explanation":"..."},
-    }
-    
-    query = content + """
+def _get_cached_evaluation(content_hash: str) -> Optional[Dict]:
+    """读取已缓存的评估结果，未命中或读取失败时返回 None"""
+    try:
+        from models import get_session, LLMEvaluationCache
+        with get_session() as session:
+            row = session.get(LLMEvaluationCache, content_hash)
+            if row is not None:
+                return json_loads(row.result_json)
+    except Exception as e:
+        logger.warning(f"读取LLM评估缓存失败: {e}")
+    return None
+
+
+def _save_cached_evaluation(content_hash: str, model: str, evaluation: Dict) -> None:
+    """写入评估结果缓存，失败不影响主流程"""
+    try:
+        from models import get_session, LLMEvaluationCache
+        with get_session() as session:
+            session.merge(LLMEvaluationCache(
+                content_hash=content_hash,
+                model=model,
+                result_json=json_dumps(evaluation),
+            ))
+            session.commit()
+    except Exception as e:
+        logger.warning(f"写入LLM评估缓存失败: {e}")
+
+
+# 评估输出格式示例
+_EVALUATION_FORMAT_EXAMPLE = {
+    "category":"叶节点分类",
+    "criteria_name_1":{"score":"1-5", "explanation":"中文评分说明"},
+    "criteria_name_2":{"score":"1-5", "explanation":"中文评分说明"},
+    "criteria_name_...":{"score":"1-5", "explanation":"..."},
+}
+
+# 分类叶节点列表在导入时拼好，避免每次评估重复解析与转换
+_CATEGORY_KEYS_STR = str(list(parse_category_hierarchy().keys()))
+
+# 评估使用的系统提示，格式示例固定，导入时构建一次
+_EVALUATION_SYSTEM_PROMPT = _build_system_prompt(_EVALUATION_FORMAT_EXAMPLE)
+
+# 评分标准与分类约束，拼接在待评估内容之后
+_EVALUATION_CRITERIA = """
 {
   "产业革命新旧替代": {
     "1分": "传统成熟行业，技术稳定无颠覆风险，但增长空间有限",
@@ -194,17 +471,69 @@ def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
     "5分": "全新题材，出现不足6个月，引发市场高度关注和资金追捧"
   }
 }
-"""+'并添加分类名称比如“激光设备(先进制造)”，必须来自以下分类：'+str(list(parse_category_hierarchy().keys()))
-    
-    # 如果没有指定模型，从配置中获取
-    if model is None:
-        from config import get_openai_config
-        _, _, model = get_openai_config()
-    
-    # 使用 llm_gen_dict 来强约束输出为 python 字典，支持重试3次
-    client = get_llm_client()
-    
-    # 重试配置
+"""+'并添加分类名称比如“激光设备(先进制造)”，必须来自以下分类：'+_CATEGORY_KEYS_STR
+
+# 开启前缀缓存时，评分标准并入系统提示，所有请求共享同一前缀，只有用户消息随内容变化，
+# 便于 vLLM/SGLang 等服务端复用前缀KV缓存
+_EVALUATION_PREFIX_PROMPT = _EVALUATION_SYSTEM_PROMPT + _EVALUATION_CRITERIA
+
+
+def _evaluation_prompts(content: str) -> Tuple[str, str]:
+    """返回评估请求的 (系统提示, 用户消息)"""
+    if _is_prefix_cache_enabled():
+        return _EVALUATION_PREFIX_PROMPT, content
+    return _EVALUATION_SYSTEM_PROMPT, content + _EVALUATION_CRITERIA
+
+
+def _empty_evaluation(result: Optional[Dict] = None) -> Dict:
+    """无有效评分时的默认评估结果"""
+    result = result or {}
+    return {
+        "criteria_result": result,
+        "overall_score": 0,
+        "detailed_scores": result,
+        "top_scoring_criterion": "无",
+        "top_score": 0,
+    }
+
+
+def _is_too_short(content: Optional[str], min_length: int) -> bool:
+    """内容为空或过短时评估结果没有意义，无需调用LLM"""
+    return not content or len(content.strip()) < min_length
+
+
+def _extract_scores(result: Dict) -> Dict[str, float]:
+    """过滤出有效的评分项（排除category等非评分字段），返回 标准名 -> 分数"""
+    scores = {}
+    for k, v in result.items():
+        if isinstance(v, dict) and 'score' in v:
+            try:
+                # 确保score是数字
+                score = float(v['score'])
+                if 1 <= score <= 5:  # 有效分数范围
+                    scores[k] = score
+            except (ValueError, TypeError):
+                logger.warning(f"无效的分数格式: {k} = {v}")
+                continue
+    return scores
+
+
+def _build_evaluation(result: Dict, top_criterion: str, overall_score: float, top_score: float) -> Dict:
+    return {
+        "criteria_result": result,
+        "overall_score": round(overall_score, 2),
+        "detailed_scores": result,  # Add this for compatibility
+        "top_scoring_criterion": top_criterion,
+        "top_score": round(top_score, 2),
+    }
+
+
+def _request_evaluation(client: openai.Client, model: str, system_prompt: str, query: str) -> Dict:
+    """调用LLM获取原始评分字典，空结果/格式无效时重试3次，最终失败返回空字典
+
+    限流/连接/超时/5xx 等瞬时错误已在 create_with_retry 中退避重试，这里不再重试
+    """
+    result = {}
     max_retries = 3
     retry_delay = 2  # 重试间隔（秒）
     last_exception = None
@@ -212,7 +541,7 @@ def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
     for attempt in range(max_retries):
         try:
             logger.info(f"LLM评估内容，第 {attempt + 1}/{max_retries} 次尝试")
-            result = llm_gen_dict(client, model, query, format_example, stream=False)
+            result = llm_gen_dict(client, model, query, _EVALUATION_FORMAT_EXAMPLE, system_prompt=system_prompt)
             
             # 如果成功获得有效结果，直接返回
             if result and isinstance(result, dict):
@@ -225,6 +554,11 @@ def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
                 else:
                     time.sleep(retry_delay)
                     continue
+
+        except _RETRYABLE_ERRORS as e:
+            logger.error(f"LLM接口瞬时错误重试耗尽，放弃本次评估: {e}")
+            result = {}
+            break
                     
         except Exception as e:
             last_exception = e
@@ -238,40 +572,260 @@ def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
                 time.sleep(retry_delay)
                 continue
 
-    # 检查结果是否为空或无效
     if not result or not isinstance(result, dict):
         logger.warning("LLM返回空结果或无效格式")
-        return {
-            "criteria_result": {},
-            "overall_score": 0,
-            "detailed_scores": {},
-            "top_scoring_criterion": "无",
-            "top_score": 0,
+        return {}
+    return result
+
+
+def evaluate_content_with_llm(content: str, model: str = None) -> Dict:
+    """
+    使用OpenAI API评估内容
+
+    Args:
+        model: 模型名称
+        model: 模型名称
+        content: 待评估的内容
+        criteria_dict: 评估标准字典
+
+    Returns:
+        dict: 包含详细评估结果的字典，格式如下：
+        {
+            "overall_score": float,  # 总分
+            "detailed_scores": dict,  # 各项详细分数
+            "top_scoring_criterion": str,  # 最高分标准
+            "top_score": float,  # 最高分数
         }
+    """
     
-    # 过滤出有效的评分项（排除category等非评分字段）
-    valid_criteria = {}
-    for k, v in result.items():
-        if isinstance(v, dict) and 'score' in v:
-            try:
-                # 确保score是数字
-                score = float(v['score'])
-                if 1 <= score <= 5:  # 有效分数范围
-                    valid_criteria[k] = v
-            except (ValueError, TypeError):
-                logger.warning(f"无效的分数格式: {k} = {v}")
-                continue
+    if _is_too_short(content, _get_llm_min_content_length()):
+        logger.info("评估内容为空或过短，跳过LLM调用")
+        return _empty_evaluation()
+
+    system_prompt, query = _evaluation_prompts(content)
     
-    # 计算总分和最高分
-    total_score = sum(float(v['score']) for v in valid_criteria.values()) / 5 * 100 / len(valid_criteria)
-    top_item = max(valid_criteria.items(), key=lambda x: float(x[1]['score']))
-    top_criterion = top_item[0]
-    top_score = float(top_item[1]['score']) / 5 * 100
+    # 如果没有指定模型，从配置中获取
+    if model is None:
+        _, _, model = get_openai_config()
+
+    # 相同模型、提示与内容的评估结果直接复用，命中时连客户端都不用初始化
+    content_hash = _evaluation_cache_key(model, system_prompt, query)
+    cached = _get_cached_evaluation(content_hash)
+    if cached is not None:
+        logger.info("LLM评估命中缓存，跳过调用")
+        return cached
     
-    return {
-        "criteria_result": result,
-        "overall_score": round(total_score, 2),
-        "detailed_scores": result,  # Add this for compatibility
-        "top_scoring_criterion": top_criterion,
-        "top_score": round(top_score, 2),
-    }
\ No newline at end of file
+    # 使用 llm_gen_dict 来强约束输出为 python 字典，支持重试3次
+    client = get_llm_client()
+    result = _request_evaluation(client, model, system_prompt, query)
+    if not result:
+        return _empty_evaluation()
+
+    scores = _extract_scores(result)
+    if not scores:
+        logger.warning("LLM返回结果中没有有效评分项")
+        return _empty_evaluation(result)
+
+    # 计算总分和最高分（分数1-5映射到0-100）
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+    top_idx = int(values.argmax())
+    evaluation = _build_evaluation(
+        result,
+        list(scores)[top_idx],
+        float(values.mean() * 20),
+        float(values[top_idx] * 20),
+    )
+    _save_cached_evaluation(content_hash, model, evaluation)
+    return evaluation
+
+
+# Batch API 终止状态
+_BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _submit_evaluation_batch(client: openai.Client, model: str, requests: List[Tuple[str, str, str]]) -> str:
+    """
+    通过 OpenAI Batch API 提交评估请求（费用减半，不占用同步RPM额度）
+
+    Args:
+        client: OpenAI客户端实例
+        model: 模型名称
+        requests: (custom_id, 系统提示, 用户消息) 列表
+
+    Returns:
+        str: batch_id
+    """
+    lines = []
+    for custom_id, system_prompt, query in requests:
+        lines.append(json_dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": query},
+                ],
+                "temperature": 0.3,
+                "response_format": {"type": "json_object"},
+            },
+        }))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    batch_file = client.files.create(file=("evaluation_batch.jsonl", payload), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info(f"已提交批量评估任务 {batch.id}，共 {len(requests)} 条请求")
+    return batch.id
+
+
+def _wait_evaluation_batch(client: openai.Client, batch_id: str, poll_interval: float = 30, stop_event: Optional[threading.Event] = None, on_progress: Optional[Callable[[str], None]] = None) -> Dict[str, Dict]:
+    """
+    轮询等待批量评估任务结束，返回 custom_id -> 原始评分字典（失败的条目不包含在内）
+
+    每次轮询通过 on_progress 报告进度；stop_event 置位后取消批量任务并返回空结果
+    """
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in _BATCH_TERMINAL_STATUSES:
+            break
+        if stop_event is not None and stop_event.is_set():
+            client.batches.cancel(batch_id)
+            logger.info(f"批量评估任务 {batch_id} 已取消")
+            return {}
+        counts = batch.request_counts
+        if counts is not None:
+            message = f"批量评估任务 {batch_id} 状态 {batch.status}：{counts.completed}/{counts.total}"
+            logger.info(message)
+            if on_progress:
+                on_progress(message)
+        if stop_event is not None:
+            stop_event.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error(f"批量评估任务 {batch_id} 未成功完成，状态: {batch.status}")
+        return {}
+
+    results = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json_loads(line)
+            body = (item.get("response") or {}).get("body") or {}
+            content = body["choices"][0]["message"]["content"]
+            result = json_loads(content)
+            if isinstance(result, dict):
+                results[item["custom_id"]] = result
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"批量评估结果解析失败: {e}")
+    logger.info(f"批量评估任务 {batch_id} 完成，成功解析 {len(results)} 条结果")
+    return results
+
+
+def evaluate_batch(contents: List[str], model: str = None, use_batch_api: bool = False, poll_interval: float = 30, stop_event: Optional[threading.Event] = None, on_progress: Optional[Callable[[str], None]] = None) -> List[Dict]:
+    """
+    批量评估内容，相同内容只请求一次，评分统一在一个二维数组中聚合
+
+    Args:
+        contents: 待评估的内容列表
+        model: 模型名称，默认从配置中获取
+        use_batch_api: 未命中缓存的条目是否通过 OpenAI Batch API 提交（适用于不要求时效的批量任务）
+        poll_interval: Batch API 轮询间隔秒数
+        stop_event: 可选的取消事件，Batch API 模式下用于中止等待
+        on_progress: 可选的进度回调，Batch API 模式下每次轮询报告完成数量
+
+    Returns:
+        List[Dict]: 与 contents 一一对应的评估结果，格式同 evaluate_content_with_llm
+    """
+    if model is None:
+        _, _, model = get_openai_config()
+
+    evaluations: List[Optional[Dict]] = [None] * len(contents)
+    groups: Dict[str, List[int]] = {}  # 缓存键 -> 内容相同的所有下标
+    todo = []  # (下标, 缓存键, 系统提示, 用户消息)
+    min_length = _get_llm_min_content_length()
+    skipped = 0
+    cache_hits = 0
+
+    for i, content in enumerate(contents):
+        if _is_too_short(content, min_length):
+            evaluations[i] = _empty_evaluation()
+            skipped += 1
+            continue
+
+        system_prompt, query = _evaluation_prompts(content)
+        content_hash = _evaluation_cache_key(model, system_prompt, query)
+        if content_hash in groups:
+            groups[content_hash].append(i)
+            continue
+        groups[content_hash] = [i]
+
+        cached = _get_cached_evaluation(content_hash)
+        if cached is not None:
+            evaluations[i] = cached
+            cache_hits += 1
+            continue
+        todo.append((i, content_hash, system_prompt, query))
+
+    # 获取未命中缓存条目的原始评分
+    raw_results: Dict[str, Dict] = {}
+    if todo:
+        client = get_llm_client()
+        if use_batch_api:
+            batch_id = _submit_evaluation_batch(
+                client, model, [(content_hash, system_prompt, query) for _, content_hash, system_prompt, query in todo]
+            )
+            raw_results = _wait_evaluation_batch(client, batch_id, poll_interval=poll_interval, stop_event=stop_event, on_progress=on_progress)
+        else:
+            for _, content_hash, system_prompt, query in todo:
+                raw_results[content_hash] = _request_evaluation(client, model, system_prompt, query)
+
+    pending = []  # (下标, 缓存键, 原始结果, 有效评分)
+    for i, content_hash, _, _ in todo:
+        result = raw_results.get(content_hash) or {}
+        scores = _extract_scores(result) if result else {}
+        if not scores:
+            evaluations[i] = _empty_evaluation(result)
+            continue
+        pending.append((i, content_hash, result, scores))
+
+    if pending:
+        # 各条目的评分项数量可能不同，不足处以NaN填充
+        width = max(len(scores) for _, _, _, scores in pending)
+        matrix = np.full((len(pending), width), np.nan, dtype=np.float64)
+        for row, (_, _, _, scores) in enumerate(pending):
+            matrix[row, :len(scores)] = list(scores.values())
+
+        overall = np.nanmean(matrix, axis=1) * 20
+        top_idx = np.nanargmax(matrix, axis=1)
+        top = matrix[np.arange(len(pending)), top_idx] * 20
+
+        for row, (i, content_hash, result, scores) in enumerate(pending):
+            evaluation = _build_evaluation(
+                result,
+                list(scores)[top_idx[row]],
+                float(overall[row]),
+                float(top[row]),
+            )
+            _save_cached_evaluation(content_hash, model, evaluation)
+            evaluations[i] = evaluation
+
+    # 重复内容直接复用首个条目的结果
+    duplicates = 0
+    for indices in groups.values():
+        for j in indices[1:]:
+            evaluations[j] = dict(evaluations[indices[0]])
+            duplicates += 1
+    if skipped:
+        logger.info(f"批量评估跳过 {skipped} 条空内容或过短内容")
+    if duplicates:
+        logger.info(f"批量评估去重：{len(contents)} 条内容中 {duplicates} 条重复")
+    logger.info(f"批量评估完成：命中缓存 {cache_hits} 条，实际请求LLM {len(todo)} 条")
+
+    return evaluations
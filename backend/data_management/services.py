@@ -1,6 +1,8 @@
 from __future__ import annotations
 import logging
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from uuid import uuid4
@@ -14,18 +16,26 @@ from task_utils import (
     handle_task_error, 
     update_task_progress,
     TASK_STOP_EVENTS,
-    TASK_THREADS
+    TASK_FUTURES,
+    EXTENDED_ANALYSIS_STOP_EVENTS,
 )
 from .analysis_task_runner import run_analysis_task
 from config import get_zai_credentials, is_zai_configured, get_zai_client_config as get_config_zai_client_config
 
 logger = logging.getLogger(__name__)
 
-# In-memory storage for calculation results
+# In-memory storage for calculation results.
+# Copy-on-write: writers build a new dict under CACHE_LOCK and rebind the name;
+# never mutate these dicts in place, and read them via the accessors below.
 ANALYSIS_RESULTS_CACHE: Dict[str, Dict[str, Any]] = {}
 EXTENDED_ANALYSIS_CACHE: Dict[str, Any] = {}  # 扩展分析缓存
+_latest_task_id: Optional[str] = None  # most recently cached task, maintained by writers
 CACHE_LOCK = threading.Lock()
 
+# Shared bounded pool for analysis tasks; excess submissions queue instead of spawning threads
+ANALYSIS_MAX_WORKERS = 8
+_EXECUTOR = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="analysis")
+
 # ZAI client configuration cache
 _zai_client_config = None
 _zai_config_lock = threading.Lock()
@@ -71,54 +81,94 @@ def refresh_zai_client_config() -> None:
 
 
 def get_cached_analysis_results(task_id: Optional[str] = None) -> Dict[str, Any]:
-    """Get cached analysis results. If task_id is provided, get specific task results."""
-    with CACHE_LOCK:
-        if task_id:
-            return ANALYSIS_RESULTS_CACHE.get(task_id, {})
-        return dict(ANALYSIS_RESULTS_CACHE)
+    """Get cached analysis results. If task_id is provided, get specific task results.
+
+    Lock-free: writers replace the cache dict wholesale, so reading the module
+    reference always yields a consistent snapshot.
+    """
+    cache = ANALYSIS_RESULTS_CACHE
+    if task_id:
+        return cache.get(task_id, {})
+    return dict(cache)
 
 
 def get_latest_analysis_results() -> Optional[Dict[str, Any]]:
     """Get the most recent analysis results based on completion timestamp."""
+    cache = ANALYSIS_RESULTS_CACHE
+    if not cache:
+        return None
+
+    latest = cache.get(_latest_task_id) if _latest_task_id else None
+    if latest is not None:
+        return latest
+    
+    # Fallback for caches populated without the pointer: scan by completion time
+    latest_task_id = max(
+        cache.keys(),
+        key=lambda tid: cache[tid].get('completed_at_ns', 0)
+    )
+    return cache[latest_task_id]
+
+
+def cache_analysis_results(task_id: str, results: Dict[str, Any]) -> None:
+    """Store results for a task, publishing a new cache dict (copy-on-write)."""
+    global ANALYSIS_RESULTS_CACHE, _latest_task_id
     with CACHE_LOCK:
-        if not ANALYSIS_RESULTS_CACHE:
-            return None
-        
-        # Find the task with the most recent completion time
-        latest_task_id = max(
-            ANALYSIS_RESULTS_CACHE.keys(),
-            key=lambda tid: ANALYSIS_RESULTS_CACHE[tid].get('completed_at', '')
-        )
-        return ANALYSIS_RESULTS_CACHE[latest_task_id]
+        new_cache = dict(ANALYSIS_RESULTS_CACHE)
+        new_cache[task_id] = results
+        ANALYSIS_RESULTS_CACHE = new_cache
+        _latest_task_id = task_id
 
 
 def clear_analysis_cache(task_id: Optional[str] = None) -> None:
     """Clear cached analysis results. If task_id is provided, clear specific task only."""
+    global ANALYSIS_RESULTS_CACHE, _latest_task_id
     with CACHE_LOCK:
         if task_id:
-            ANALYSIS_RESULTS_CACHE.pop(task_id, None)
+            new_cache = dict(ANALYSIS_RESULTS_CACHE)
+            new_cache.pop(task_id, None)
+            ANALYSIS_RESULTS_CACHE = new_cache
+            if _latest_task_id == task_id:
+                _latest_task_id = None
         else:
-            ANALYSIS_RESULTS_CACHE.clear()
+            ANALYSIS_RESULTS_CACHE = {}
+            _latest_task_id = None
+
+
+def _cache_timestamps() -> Dict[str, Any]:
+    """Epoch-ns timestamp for ordering, plus its ISO mirror for API consumers."""
+    now_ns = time.time_ns()
+    return {
+        'cached_at_ns': now_ns,
+        'cached_at': datetime.fromtimestamp(now_ns / 1e9).isoformat(),
+    }
 
 
 def get_cached_extended_analysis() -> Optional[Dict[str, Any]]:
     """Get cached extended analysis results."""
-    with CACHE_LOCK:
-        return EXTENDED_ANALYSIS_CACHE.copy() if EXTENDED_ANALYSIS_CACHE else None
+    cache = EXTENDED_ANALYSIS_CACHE
+    if not cache:
+        return None
+    return cache.copy()
 
 
 def cache_extended_analysis(results: Dict[str, Any]) -> None:
-    """Cache extended analysis results with timestamp."""
+    """Cache extended analysis results with timestamp.
+
+    The timestamps are written into ``results`` as well, so callers that return the
+    freshly cached dict expose the same cached_at as later cache reads.
+    """
+    global EXTENDED_ANALYSIS_CACHE
     with CACHE_LOCK:
-        results['cached_at'] = datetime.now().isoformat()
-        EXTENDED_ANALYSIS_CACHE.clear()
-        EXTENDED_ANALYSIS_CACHE.update(results)
+        results.update(_cache_timestamps())
+        EXTENDED_ANALYSIS_CACHE = dict(results)
 
 
 def clear_extended_analysis_cache() -> None:
     """Clear extended analysis cache."""
+    global EXTENDED_ANALYSIS_CACHE
     with CACHE_LOCK:
-        EXTENDED_ANALYSIS_CACHE.clear()
+        EXTENDED_ANALYSIS_CACHE = {}
 
 
 def run_analysis_wrapper(task_id: str, top_n: int, selected_factors: Optional[List[str]] = None, collect_latest_data: bool = True, stop_event: Optional[threading.Event] = None):
@@ -131,9 +181,8 @@ def run_analysis_wrapper(task_id: str, top_n: int, selected_factors: Optional[Li
         handle_task_error(task_id, e)
         error_occurred = True
     finally:
-        # Cleanup thread and stop event registries once task ends
+        # Cleanup stop event registry once task ends (the future entry is removed by its done callback)
         try:
-            TASK_THREADS.pop(task_id, None)
             TASK_STOP_EVENTS.pop(task_id, None)
         except Exception:
             pass
@@ -158,14 +207,21 @@ def create_analysis_task(top_n: int = 200, selected_factors: Optional[List[str]]
     
     add_task(task)
     
-    # Prepare a stop event and thread, and register them
+    # Prepare a stop event and register it before the task can start
     stop_event = threading.Event()
     TASK_STOP_EVENTS[task_id] = stop_event
     
-    # Start background thread with error wrapper
-    thread = threading.Thread(target=run_analysis_wrapper, args=(task_id, top_n, selected_factors, collect_latest_data, stop_event))
-    thread.daemon = True
-    TASK_THREADS[task_id] = thread
-    thread.start()
+    # Submit to the shared executor with error wrapper
+    future = _EXECUTOR.submit(run_analysis_wrapper, task_id, top_n, selected_factors, collect_latest_data, stop_event)
+    TASK_FUTURES[task_id] = future
+    # Registered after submit: if the task already finished, the callback runs immediately, so the entry never leaks
+    future.add_done_callback(lambda _f: TASK_FUTURES.pop(task_id, None))
     
-    return task_id
\ No newline at end of file
+    return task_id
+
+
+def shutdown_analysis_executor() -> None:
+    """Signal running analyses to stop and drop queued ones so interpreter exit is not blocked."""
+    for stop_event in list(TASK_STOP_EVENTS.values()) + list(EXTENDED_ANALYSIS_STOP_EVENTS.values()):
+        stop_event.set()
+    _EXECUTOR.shutdown(wait=False, cancel_futures=True)
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Optional
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
 
 import pandas as pd
-from sqlmodel import Session, select
+from sqlalchemy import case, insert, update
+from sqlmodel import Session, select, func
 from models import (
     engine, StockBasicInfo, DailyMarketData
 )
@@ -13,10 +18,87 @@ from market_data.ths_api import uplimit10jqka, build_limit_up_map
 
 logger = logging.getLogger(__name__)
 
+# SQLite 单条语句绑定参数有上限，IN 查询与批量插入按此分批
+_SQL_CHUNK_SIZE = 500
+_INSERT_CHUNK_SIZE = 1000
+# 涨停 UPDATE 每个代码绑定约3个参数（IN + CASE WHEN/THEN），按参数总数控制在上限以内
+_LIMIT_UPDATE_CHUNK_SIZE = 300
+
+
+# 日K原始列名 -> DailyMarketData 数值字段
+_DAILY_NUMERIC_COLUMNS = {
+    "开盘": "open_price",
+    "最高": "high_price",
+    "最低": "low_price",
+    "收盘": "close_price",
+    "成交量": "volume",
+    "成交额": "amount",
+    "涨跌幅": "change_pct",
+}
+
+
+def _chunked(items: list, size: int):
+    """按固定大小切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 # 缓存最新交易日和涨停数据，避免重复API调用
 _latest_trade_date_cache = None
 _limit_map_cache = None
 
+# 历史交易日的涨停映射缓存（YYYYMMDD -> 只读映射），历史数据不会变化，重复回填时免去HTTP请求
+_THS_DAY_CACHE_SIZE = 512
+_ths_day_limit_map_cache: Dict[str, Mapping[str, str]] = {}
+_ths_day_cache_lock = threading.Lock()
+
+# 股票代码 -> 名称映射的进程内缓存（名称极少变化），保存基本信息时失效
+_STOCK_NAME_CACHE_TTL = 300
+_stock_name_map_cache: Optional[Tuple[float, Mapping[str, str]]] = None
+_stock_name_cache_lock = threading.Lock()
+
+# 回填时并发请求同花顺历史涨停数据的线程数
+_THS_FETCH_WORKERS = 8
+
+
+def _fetch_ths_limit_map(ds: str) -> Mapping[str, str]:
+    """获取指定历史交易日的涨停映射，结果按日期缓存；空结果不缓存，以便下次重试"""
+    cached = _ths_day_limit_map_cache.get(ds)
+    if cached is not None:
+        return cached
+
+    limit_map = MappingProxyType(build_limit_up_map(uplimit10jqka(ds)))
+    if limit_map:
+        with _ths_day_cache_lock:
+            if len(_ths_day_limit_map_cache) >= _THS_DAY_CACHE_SIZE:
+                # 淘汰最早加入的日期
+                _ths_day_limit_map_cache.pop(next(iter(_ths_day_limit_map_cache)))
+            _ths_day_limit_map_cache[ds] = limit_map
+    return limit_map
+
+
+def get_stock_name_map() -> Mapping[str, str]:
+    """获取全部股票的 代码 -> 名称 只读映射，TTL 内复用缓存，不重复查询数据库"""
+    global _stock_name_map_cache
+    cached = _stock_name_map_cache
+    if cached is not None and time.monotonic() - cached[0] < _STOCK_NAME_CACHE_TTL:
+        return cached[1]
+
+    with Session(engine) as session:
+        name_map = MappingProxyType(dict(session.exec(
+            select(StockBasicInfo.code, StockBasicInfo.name)
+        ).all()))
+    with _stock_name_cache_lock:
+        _stock_name_map_cache = (time.monotonic(), name_map)
+    return name_map
+
+
+def clear_stock_name_cache():
+    """清除股票名称缓存，下次读取时重新查询"""
+    global _stock_name_map_cache
+    with _stock_name_cache_lock:
+        _stock_name_map_cache = None
+
 
 def get_latest_trade_date_and_limit_map(use_cache: bool = True):
     """统一获取最新交易日和涨停数据，并更新到数据库。
@@ -89,34 +171,51 @@ def get_latest_trade_date_and_limit_map(use_cache: bool = True):
     raise Exception("无法获取最新交易日期：THS API 失败且数据库无数据。请检查 THS API 连接或先导入基础数据。")
 
 
+def _apply_limit_map(session: Session, trade_date: date, limit_map: Mapping[str, str]) -> int:
+    """用集合式 UPDATE 将某日的涨停映射写入数据库：先清除该日已有的涨停标记，再写入涨停股票的状态与文本。
+
+    两步在调用方的同一事务中完成，清除时无需用 NOT IN 绑定全部涨停代码。
+    返回被标记为涨停的记录数（调用方负责提交）。
+    """
+    # 清除：只更新状态不为0或仍有文本的记录
+    session.execute(
+        update(DailyMarketData)
+        .where(
+            DailyMarketData.date == trade_date,
+            (DailyMarketData.limit_status != 0) | DailyMarketData.limit_up_text.is_not(None),
+        )
+        .values(limit_status=0, limit_up_text=None)
+    )
+
+    marked = 0
+    # 涨停股票：按代码分批，用 CASE 一次写入各自的涨停类型文本
+    for code_chunk in _chunked(list(limit_map), _LIMIT_UPDATE_CHUNK_SIZE):
+        result = session.execute(
+            update(DailyMarketData)
+            .where(DailyMarketData.date == trade_date, DailyMarketData.code.in_(code_chunk))
+            .values(
+                limit_status=1,
+                limit_up_text=case(
+                    {code: limit_map[code] for code in code_chunk},
+                    value=DailyMarketData.code,
+                ),
+            )
+        )
+        marked += result.rowcount or 0
+    return marked
+
+
 def _update_limit_data_to_db(trade_date: date, limit_map: dict):
     """将当日涨停数据更新到数据库"""
     if not limit_map:
         return
         
-    updated = 0
     with Session(engine) as session:
-        # 获取当日所有记录
-        day_records = session.exec(
-            select(DailyMarketData).where(DailyMarketData.date == trade_date)
-        ).all()
+        updated = _apply_limit_map(session, trade_date, limit_map)
+        session.commit()
         
-        for record in day_records:
-            if record.code in limit_map:
-                # 涨停股票
-                if record.limit_status != 1 or record.limit_up_text != limit_map[record.code]:
-                    record.limit_status = 1
-                    record.limit_up_text = limit_map[record.code]
-                    updated += 1
-            else:
-                # 非涨停股票
-                if record.limit_status != 0:
-                    record.limit_status = 0
-                    record.limit_up_text = None
-                    
-        if updated > 0:
-            session.commit()
-            logger.info(f"Updated {updated} limit-up records for {trade_date}")
+    if updated > 0:
+        logger.info(f"Updated {updated} limit-up records for {trade_date}")
 
 
 def clear_trade_date_cache():
@@ -124,6 +223,7 @@ def clear_trade_date_cache():
     global _latest_trade_date_cache, _limit_map_cache
     _latest_trade_date_cache = None
     _limit_map_cache = None
+    _ths_day_limit_map_cache.clear()
 
 
 def save_spot_as_daily_data(spot_data: pd.DataFrame) -> int:
@@ -141,54 +241,64 @@ def save_spot_as_daily_data(spot_data: pd.DataFrame) -> int:
     except Exception as e:
         logger.warning(f"Failed to fetch limit-up map for spot: {e}")
 
-    total_saved = 0
+    if "代码" not in spot_data.columns or "日期" not in spot_data.columns:
+        logger.warning("Spot data missing 代码/日期 columns, skipping")
+        return 0
+
+    # 一次性解析日期并过滤无效行
+    df = spot_data[spot_data["代码"].notna() & (spot_data["代码"] != "")].copy()
+    df["date"] = pd.to_datetime(df["日期"], errors="coerce").dt.date
+    missing_date = df["date"].isna()
+    if missing_date.any():
+        logger.warning(f"No date found for {int(missing_date.sum())} spot rows, skipping")
+        df = df[~missing_date]
+    df = df.drop_duplicates(subset=["代码", "date"])
+    if df.empty:
+        return 0
+
+    trade_dates = set(df["date"])
+    trade_date = max(trade_dates)
+
     with Session(engine) as session:
-        for _, row in spot_data.iterrows():
-            code = row["代码"] if "代码" in row else None
-            if not code:
-                continue
-
-            # 使用数据中的日期
-            if "日期" not in row or pd.isna(row["日期"]):
-                logger.warning(f"No date found for {code}, skipping")
-                continue
-            trade_date = pd.to_datetime(row["日期"]).date()
-
-            # 检查是否已存在当日记录
-            existing = session.exec(
-                select(DailyMarketData).where(
-                    DailyMarketData.code == code,
-                    DailyMarketData.date == trade_date
-                )
-            ).first()
-
-            if existing is not None:
-                # 已存在则跳过（可考虑更新）
-                continue
-
-            change_pct = round(float(row["涨跌幅"]), 2) if "涨跌幅" in row and pd.notna(row["涨跌幅"]) else 0
-            # 直接使用同花顺涨停池数据判断涨停状态
-            limit_status = 1 if code in limit_map else 0
-            limit_text = limit_map.get(code) if limit_status == 1 else None
-
-            daily = DailyMarketData(
-                code=code,
-                date=trade_date,
-                open_price=float(row["今开"] if "今开" in row else 0),
-                high_price=float(row["最高"] if "最高" in row else 0),
-                low_price=float(row["最低"] if "最低" in row else 0),
-                close_price=float(row["最新价"] if "最新价" in row else 0),
-                volume=float(row["成交量"] if "成交量" in row else 0),
-                amount=float(row["成交额"] if "成交额" in row else 0),
-                change_pct=change_pct,
-                limit_status=limit_status,
-                limit_up_text=limit_text,
+        # 一次查询当日已存在的记录，已存在则跳过（可考虑更新）
+        existing = set(session.exec(
+            select(DailyMarketData.code, DailyMarketData.date).where(
+                DailyMarketData.date.in_(trade_dates)
             )
-            session.add(daily)
-            total_saved += 1
+        ).all())
+        if existing:
+            keys = pd.MultiIndex.from_arrays([df["代码"], df["date"]])
+            df = df[~keys.isin([tuple(row) for row in existing])]
+        if df.empty:
+            logger.info(f"Saved 0 spot rows as daily data for {trade_date}")
+            return 0
 
+        def numeric(col: str) -> pd.Series:
+            if col not in df.columns:
+                return pd.Series(0.0, index=df.index)
+            return pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+
+        # 直接使用同花顺涨停池数据判断涨停状态
+        is_limit_up = df["代码"].isin(list(limit_map))
+        limit_text = df["代码"].map(limit_map).astype(object)
+        records = pd.DataFrame({
+            "code": df["代码"],
+            "date": df["date"],
+            "open_price": numeric("今开"),
+            "high_price": numeric("最高"),
+            "low_price": numeric("最低"),
+            "close_price": numeric("最新价"),
+            "volume": numeric("成交量"),
+            "amount": numeric("成交额"),
+            "change_pct": numeric("涨跌幅").round(2),
+            "limit_status": is_limit_up.astype(int),
+            "limit_up_text": limit_text.where(limit_text.notna(), None),
+        }).to_dict(orient="records")
+
+        session.execute(insert(DailyMarketData), records)
         session.commit()
 
+    total_saved = len(records)
     logger.info(f"Saved {total_saved} spot rows as daily data for {trade_date}")
     return total_saved
 
@@ -200,105 +310,149 @@ def get_missing_daily_data(stock_codes: List[str]) -> Dict[str, date]:
     # 获取最新交易日
     latest_trade_date, _ = get_latest_trade_date_and_limit_map()
     
+    # 按代码分组一次取出各股票最新日期，代替逐只股票查询
+    max_dates: Dict[str, date] = {}
     with Session(engine) as session:
-        for code in stock_codes:
-            # 查询该股票最新的日期
-            stmt = select(DailyMarketData.date).where(
-                DailyMarketData.code == code
-            ).order_by(DailyMarketData.date.desc()).limit(1)
-            
-            result = session.exec(stmt).first()
-            
-            if result is None:
-                # 该股票没有任何数据，从60天前开始获取
-                missing_data[code] = latest_trade_date - timedelta(days=60)
-            else:
-                # 检查最新日期是否是最新交易日
-                latest_date = result
-                if latest_date < latest_trade_date:
-                    # 数据不是最新的，从最新日期的下一天开始补充
-                    missing_data[code] = latest_date + timedelta(days=1)
+        for code_chunk in _chunked(list(dict.fromkeys(stock_codes)), _SQL_CHUNK_SIZE):
+            max_dates.update(session.exec(
+                select(DailyMarketData.code, func.max(DailyMarketData.date))
+                .where(DailyMarketData.code.in_(code_chunk))
+                .group_by(DailyMarketData.code)
+            ).all())
+    
+    for code in stock_codes:
+        latest_date = max_dates.get(code)
+        if latest_date is None:
+            # 该股票没有任何数据，从60天前开始获取
+            missing_data[code] = latest_trade_date - timedelta(days=60)
+        elif latest_date < latest_trade_date:
+            # 数据不是最新的，从最新日期的下一天开始补充
+            missing_data[code] = latest_date + timedelta(days=1)
     
     return missing_data
 
 
+def get_latest_close_and_amount(stock_codes: List[str]) -> Dict[str, Tuple[float, float]]:
+    """按代码分批查询各股票最新一个交易日的收盘价和成交额，代替逐只股票查询"""
+    latest: Dict[str, Tuple[float, float]] = {}
+    with Session(engine) as session:
+        for code_chunk in _chunked(list(dict.fromkeys(stock_codes)), _SQL_CHUNK_SIZE):
+            latest_dates = (
+                select(DailyMarketData.code, func.max(DailyMarketData.date).label("max_date"))
+                .where(DailyMarketData.code.in_(code_chunk))
+                .group_by(DailyMarketData.code)
+                .subquery()
+            )
+            for code, close_price, amount in session.exec(
+                select(DailyMarketData.code, DailyMarketData.close_price, DailyMarketData.amount)
+                .join(
+                    latest_dates,
+                    (DailyMarketData.code == latest_dates.c.code)
+                    & (DailyMarketData.date == latest_dates.c.max_date),
+                )
+            ):
+                latest[code] = (close_price, amount)
+    return latest
+
+
 def save_daily_data(history_data: Dict[str, pd.DataFrame]):
-    """保存日K数据到数据库"""
-    total_saved = 0
+    """保存日K数据到数据库（已存在的 代码+日期 跳过），整批向量化转换后批量插入"""
+    frames = [
+        df.assign(代码=code)
+        for code, df in history_data.items()
+        if df is not None and not df.empty
+    ]
+    if not frames:
+        logger.info("Saved 0 daily market data records")
+        return 0
 
-    with Session(engine) as session:
-        for code, df in history_data.items():
-            if df is None or df.empty:
-                continue
-
-            for _, row in df.iterrows():
-                record_date = row["日期"].date()
-                # 检查是否已存在
-                existing = session.exec(
-                    select(DailyMarketData).where(
-                        DailyMarketData.code == code,
-                        DailyMarketData.date == record_date
-                    )
-                ).first()
-
-                if existing is None:
-                    # Handle NaN values properly - pandas NaN should be replaced with 0
-                    def safe_float(value, default=0.0):
-                        """Convert value to float, replacing NaN with default"""
-                        return default if pd.isna(value) else float(value)
-                    
-                    daily_data = DailyMarketData(
-                        code=code,
-                        date=record_date,
-                        open_price=safe_float(row["开盘"] if "开盘" in row else 0),
-                        high_price=safe_float(row["最高"] if "最高" in row else 0),
-                        low_price=safe_float(row["最低"] if "最低" in row else 0),
-                        close_price=safe_float(row["收盘"] if "收盘" in row else 0),
-                        volume=safe_float(row["成交量"] if "成交量" in row else 0),
-                        amount=safe_float(row["成交额"] if "成交额" in row and pd.notna(row["成交额"]) else None),
-                        change_pct=round(safe_float(row["涨跌幅"] if "涨跌幅" in row else 0), 2),
-                        limit_status=0,  # 默认非涨停，后续通过专门函数回填
-                        limit_up_text=None,
-                    )
-                    session.add(daily_data)
-                    total_saved += 1
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = pd.to_datetime(df["日期"]).dt.date
+    df = df.drop_duplicates(subset=["代码", "date"])
+
+    # 数值列一次性改名并整体转换，NaN 及缺失列统一按 0 处理
+    records = (
+        df.reindex(columns=list(_DAILY_NUMERIC_COLUMNS))
+        .rename(columns=_DAILY_NUMERIC_COLUMNS)
+        .apply(pd.to_numeric, errors="coerce")
+        .astype("float64")
+        .fillna(0.0)
+    )
+    records["change_pct"] = records["change_pct"].round(2)
+    records.insert(0, "code", df["代码"])
+    records.insert(1, "date", df["date"])
+    records["limit_status"] = 0  # 默认非涨停，后续通过专门函数回填
+    records["limit_up_text"] = None
 
+    with Session(engine) as session:
+        # 一次性预取时间窗口内已存在的 (代码, 日期)，按代码分批避免超出参数上限
+        codes = records["code"].unique().tolist()
+        min_date, max_date = records["date"].min(), records["date"].max()
+        existing: set = set()
+        for code_chunk in _chunked(codes, _SQL_CHUNK_SIZE):
+            existing.update(map(tuple, session.exec(
+                select(DailyMarketData.code, DailyMarketData.date).where(
+                    DailyMarketData.code.in_(code_chunk),
+                    DailyMarketData.date >= min_date,
+                    DailyMarketData.date <= max_date,
+                )
+            ).all()))
+        if existing:
+            keys = pd.MultiIndex.from_arrays([records["code"], records["date"]])
+            records = records[~keys.isin(list(existing))]
+
+        rows = records.to_dict(orient="records")
+        for row_chunk in _chunked(rows, _INSERT_CHUNK_SIZE):
+            session.execute(insert(DailyMarketData), row_chunk)
         session.commit()
 
+    total_saved = len(rows)
     logger.info(f"Saved {total_saved} daily market data records")
     return total_saved
 
 
 def save_stock_basic_info(spot_data: pd.DataFrame):
-    """保存股票基本信息"""
-    total_saved = 0
-    
+    """保存股票基本信息：新代码批量插入，名称变化的批量更新"""
+    if spot_data is None or spot_data.empty:
+        logger.info("Saved/updated 0 stock basic info records")
+        return 0
+
+    spot_data = spot_data.dropna(subset=["代码"])
+    names = spot_data["名称"] if "名称" in spot_data.columns else spot_data["代码"]
+    # 同一代码出现多次时以最后一次的名称为准
+    incoming = dict(zip(spot_data["代码"], names.fillna(spot_data["代码"])))
+
     with Session(engine) as session:
-        for _, row in spot_data.iterrows():
-            code = row["代码"]
-            name = row["名称"] if "名称" in row else code
-            
-            # 检查是否已存在
-            existing = session.exec(
-                select(StockBasicInfo).where(StockBasicInfo.code == code)
-            ).first()
-            
-            if existing is None:
-                stock_info = StockBasicInfo(
-                    code=code,
-                    name=name,
-                    description=None,
-                    tags=None
-                )
-                session.add(stock_info)
-                total_saved += 1
-            elif existing.name != name:
-                # 更新股票名称
-                existing.name = name
-                existing.updated_at = datetime.now()
-        
+        # 一次性取出已存在代码的当前名称
+        existing: Dict[str, str] = {}
+        for code_chunk in _chunked(list(incoming), _SQL_CHUNK_SIZE):
+            existing.update(session.exec(
+                select(StockBasicInfo.code, StockBasicInfo.name).where(StockBasicInfo.code.in_(code_chunk))
+            ).all())
+
+        now = datetime.now()
+        new_rows = [
+            {"code": code, "name": name, "description": None, "tags": None, "created_at": now, "updated_at": now}
+            for code, name in incoming.items()
+            if code not in existing
+        ]
+        renamed_rows = [
+            {"code": code, "name": name, "updated_at": now}
+            for code, name in incoming.items()
+            if code in existing and existing[code] != name
+        ]
+
+        if new_rows:
+            session.execute(insert(StockBasicInfo), new_rows)
+        if renamed_rows:
+            # 按主键批量更新股票名称
+            session.execute(update(StockBasicInfo), renamed_rows)
         session.commit()
+
+    if new_rows or renamed_rows:
+        clear_stock_name_cache()
     
+    total_saved = len(new_rows)
     logger.info(f"Saved/updated {total_saved} stock basic info records")
     return total_saved
 
@@ -350,80 +504,93 @@ def backfill_limit_up_texts_using_ths(lookback_days: int = 180) -> int:
 
         logger.info(f"Found {len(unprocessed_dates)} unprocessed trading date(s) for limit-up backfill")
 
-        # 逐日处理未处理的交易日
-        for d in unprocessed_dates:
-            ds = d.strftime("%Y%m%d")  # THS API需要YYYYMMDD格式
-            try:
-                ths_df = uplimit10jqka(ds)
-                limit_map = build_limit_up_map(ths_df)
-            except Exception as e:
-                logger.warning(f"Skip backfill for {ds} due to error: {e}")
-                continue
-
-            # 获取该日期的所有股票记录
-            day_records = session.exec(
-                select(DailyMarketData).where(DailyMarketData.date == d)
-            ).all()
-            
-            for record in day_records:
-                if record.code in limit_map:
-                    # 涨停股票
-                    record.limit_status = 1
-                    record.limit_up_text = limit_map[record.code]
-                    updated += 1
-                else:
-                    # 非涨停股票
-                    record.limit_status = 0
-                    record.limit_up_text = None
-                    
-            session.commit()
-            logger.info(f"Processed {len(day_records)} records for {ds}, found {len(limit_map)} limit-up stocks")
+        # 并发请求各日的同花顺涨停数据，结果到达后在当前会话中串行写库；
+        # 每日写完立即提交，避免在等待HTTP结果期间持有SQLite写锁而阻塞其他写入
+        with ThreadPoolExecutor(max_workers=_THS_FETCH_WORKERS, thread_name_prefix="ths-backfill") as pool:
+            futures = {
+                pool.submit(_fetch_ths_limit_map, d.strftime("%Y%m%d")): d  # THS API需要YYYYMMDD格式
+                for d in unprocessed_dates
+            }
+            for future in as_completed(futures):
+                d = futures[future]
+                ds = d.strftime("%Y%m%d")
+                try:
+                    limit_map = future.result()
+                except Exception as e:
+                    logger.warning(f"Skip backfill for {ds} due to error: {e}")
+                    continue
+
+                # 集合式更新该日的涨停状态，不在Python侧逐条遍历记录
+                day_updated = _apply_limit_map(session, d, limit_map)
+                session.commit()
+                updated += day_updated
+                logger.info(f"Processed {ds}: marked {day_updated} records, found {len(limit_map)} limit-up stocks")
 
     logger.info(f"Backfilled limit-up data for {updated} record(s) across {len(unprocessed_dates)} day(s)")
     return updated
 
 
 def load_daily_data_for_analysis(stock_codes: List[str], limit: int = 60) -> Dict[str, pd.DataFrame]:
-    """从数据库加载日K数据用于因子分析"""
-    history_data = {}
+    """从数据库加载日K数据用于因子分析（按代码分批 IN 查询，而非逐只股票查询）
+    返回 StackedHistory：按代码取单只股票数据的同时，自带已排序的合并数据供因子计算复用
+    """
+    from factors import StackedHistory
+
+    history_data: Dict[str, pd.DataFrame] = {}
     
     print(f"🔍 load_daily_data_for_analysis: 开始加载 {len(stock_codes)} 个股票的数据")
     logger.info(f"load_daily_data_for_analysis: 开始加载 {len(stock_codes)} 个股票的数据")
     
-    successful_count = 0
-    failed_count = 0
+    columns = [
+        DailyMarketData.code,
+        DailyMarketData.date,
+        DailyMarketData.open_price,
+        DailyMarketData.high_price,
+        DailyMarketData.low_price,
+        DailyMarketData.close_price,
+        DailyMarketData.volume,
+        DailyMarketData.amount,
+        DailyMarketData.change_pct,
+        DailyMarketData.limit_up_text,
+    ]
     
-    with Session(engine) as session:
-        for i, code in enumerate(stock_codes):
-            stmt = select(DailyMarketData).where(
-                DailyMarketData.code == code
-            ).order_by(DailyMarketData.date.desc()).limit(limit)
-            
-            daily_records = session.exec(stmt).all()
-            if daily_records:
-                df = pd.DataFrame([{
-                    "日期": pd.to_datetime(record.date),
-                    "开盘": record.open_price,
-                    "最高": record.high_price,
-                    "最低": record.low_price,
-                    "收盘": record.close_price,
-                    "成交量": record.volume,
-                    "成交额": record.amount,
-                    "涨跌幅": record.change_pct,
-                    "limit_up_text": record.limit_up_text
-                } for record in daily_records])
-                df = df.sort_values("日期")
-                history_data[code] = df
-                successful_count += 1
-            else:
-                failed_count += 1
-                if failed_count <= 5:  # 只打印前5个失败的
-                    print(f"❌ 股票 {code} 没有找到历史数据")
-            
-            # 每处理50个股票打印一次进度
-            if (i + 1) % 50 == 0:
-                print(f"📊 已处理 {i + 1}/{len(stock_codes)} 个股票，成功 {successful_count} 个")
+    frames = []
+    codes = list(dict.fromkeys(stock_codes))
+    with engine.connect() as conn:
+        for code_chunk in _chunked(codes, _SQL_CHUNK_SIZE):
+            # 每只股票只取最近 limit 条：在 SQL 中按代码编号截断，不把整段历史读到 pandas 再裁剪
+            ranked = select(
+                *columns,
+                func.row_number().over(
+                    partition_by=DailyMarketData.code,
+                    order_by=DailyMarketData.date.desc(),
+                ).label("rn"),
+            ).where(DailyMarketData.code.in_(code_chunk)).subquery()
+            stmt = select(*(ranked.c[col.name] for col in columns)).where(
+                ranked.c.rn <= limit
+            )
+            chunk_df = pd.read_sql_query(stmt, conn, parse_dates=["date"])
+            if not chunk_df.empty:
+                frames.append(chunk_df)
+    
+    if frames:
+        df = pd.concat(frames, ignore_index=True).rename(columns={
+            "code": "代码",
+            "date": "日期",
+            **{field: col for col, field in _DAILY_NUMERIC_COLUMNS.items()},
+        })
+        # 与逐行构造时一致，缺失的涨停文本保持为 None 而非 NaN
+        df["limit_up_text"] = df["limit_up_text"].astype(object).where(df["limit_up_text"].notna(), None)
+        # 整表排序一次，直接作为因子计算使用的合并数据，避免之后再拼接排序
+        df = df.sort_values(["代码", "日期"], kind="stable", ignore_index=True)
+        history_data = StackedHistory.from_stacked(df)
+    
+    successful_count = len(history_data)
+    failed_count = len(codes) - successful_count
+    if failed_count:
+        missing = [code for code in codes if code not in history_data][:5]  # 只打印前5个失败的
+        print(f"❌ {failed_count} 个股票没有找到历史数据，例如: {missing}")
     
     print(f"✅ load_daily_data_for_analysis 完成：成功加载 {successful_count} 个股票，失败 {failed_count} 个")
     logger.info(f"Loaded daily data for {len(history_data)} stocks from database (成功:{successful_count}, 失败:{failed_count})")
-    return history_data
\ No newline at end of file
+    return history_data
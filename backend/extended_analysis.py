@@ -1,15 +1,89 @@
 from __future__ import annotations
+import hashlib
 import logging
 import os
-import json
-from datetime import datetime
+import threading
+from datetime import date, datetime
 from typing import List, Dict, Optional, Callable
 from collections import defaultdict
-from data_management.llm_client import evaluate_content_with_llm
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
+from data_management.llm_client import evaluate_batch, evaluate_content_with_llm, json_dumps
 
 
 logger = logging.getLogger(__name__)
 
+# Per-sector analysis runs as a two-stage pipeline: deepsearch streams on one pool and hands
+# its text to the LLM evaluation pool, so the next sector's search starts while this one is
+# being scored. Both stages are network-bound; LLM calls are throttled by llm_client's rate limiter
+DEEPSEARCH_MAX_WORKERS = 8
+EVALUATION_MAX_WORKERS = 8
+_DEEPSEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=DEEPSEARCH_MAX_WORKERS, thread_name_prefix="deepsearch")
+_EVALUATION_EXECUTOR = ThreadPoolExecutor(max_workers=EVALUATION_MAX_WORKERS, thread_name_prefix="evaluation")
+
+
+def shutdown_executors() -> None:
+    """Drop queued sector work on app shutdown; running sectors finish at their next stop_event check."""
+    _DEEPSEARCH_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    _EVALUATION_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+DEEPSEARCH_MODEL = "GLM-4-6-API-V1"
+
+# One ZAIChatClient per deepsearch worker thread, so its HTTP session (and TLS connections)
+# are reused across sectors; requests sessions are not shared between threads
+_zai_client_local = threading.local()
+
+
+def _get_zai_client(bearer_token: str, user_id: str):
+    """Return this thread's cached ZAIChatClient, rebuilding it only when the credentials change"""
+    from data_management.deepsearch import ZAIChatClient
+
+    credentials = (bearer_token, user_id)
+    cached = getattr(_zai_client_local, "client", None)
+    if cached is None or cached[0] != credentials:
+        # Create config dictionary for ZAIChatClient
+        config = {
+            'bearer_token': bearer_token,
+            'user_id': user_id
+        }
+        cached = (credentials, ZAIChatClient(config=config))
+        _zai_client_local.client = cached
+    return cached[1]
+
+
+def _deepsearch_cache_key(concept_code: str, search_query: str) -> str:
+    """Cache key for a deepsearch run; includes today's date so results are refreshed daily"""
+    raw = f"{DEEPSEARCH_MODEL}|{concept_code}|{search_query}|{date.today().isoformat()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_cached_deepsearch(cache_key: str) -> Optional[str]:
+    """Return a cached deepsearch result, or None on a miss or read failure"""
+    try:
+        from models import get_session, DeepsearchCache
+        with get_session() as session:
+            row = session.get(DeepsearchCache, cache_key)
+            if row is not None:
+                return row.analysis_text
+    except Exception as e:
+        logger.warning(f"Failed to read deepsearch cache: {e}")
+    return None
+
+
+def _save_cached_deepsearch(cache_key: str, concept_code: str, analysis_text: str) -> None:
+    """Store a deepsearch result; failures never affect the analysis itself"""
+    try:
+        from models import get_session, DeepsearchCache
+        with get_session() as session:
+            session.merge(DeepsearchCache(
+                cache_key=cache_key,
+                concept_code=concept_code,
+                analysis_text=analysis_text,
+            ))
+            session.commit()
+    except Exception as e:
+        logger.warning(f"Failed to write deepsearch cache: {e}")
+
 
 def get_concept_analysis_with_deepsearch(concept_code: str, concept_name: str, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None) -> Optional[Dict]:
     """Use deepsearch to analyze a specific concept and evaluate it with LLM in one atomic operation
@@ -17,61 +91,89 @@ def get_concept_analysis_with_deepsearch(concept_code: str, concept_name: str, o
     Returns:
         Dict with 'concept_analysis' and 'llm_evaluation' keys, or None if failed
     """
-    from data_management.deepsearch import ZAIChatClient
+    concept_analysis = _deepsearch_concept(concept_code, concept_name, on_progress=on_progress, stop_event=stop_event)
+    if concept_analysis is None:
+        return None
+    return _evaluate_concept_analysis(concept_name, concept_analysis, on_progress=on_progress, stop_event=stop_event)
+
+
+def _deepsearch_concept(concept_code: str, concept_name: str, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None) -> Optional[str]:
+    """Deepsearch stage: return the collected analysis text for a concept
+    
+    Returns:
+        The analysis text ('' when the search returned nothing), or None if unavailable or cancelled
+    """
     from config import is_zai_configured, get_zai_credentials
     
+    # Sectors still queued in the deepsearch pool when cancellation arrives return right away
+    if stop_event and stop_event.is_set():
+        return None
+    
     # Check if credentials are properly configured
     if not is_zai_configured():
         logger.warning("ZAI credentials not properly configured, skipping deepsearch analysis")
         return None
         
-    # Get credentials from config
-    bearer_token, cookie_str, user_id = get_zai_credentials()
-        
-    # Create config dictionary for ZAIChatClient
-    config = {
-        'bearer_token': bearer_token,
-        'user_id': user_id
-    }
-    client = ZAIChatClient(config=config)
-    
     # Create search query for the concept
     search_query = f"{datetime.now().year}A股{concept_name}概念投资机会分析，搜集的材料要涵盖{concept_name}概念的起源到最新消息"
     
-    messages = [
-        {
-            'role': 'user',
-            'content': search_query
-        }
-    ]
-    
-    # Stream the response and collect it
-    full_response = ""
-    if on_progress:
-        on_progress(f"开始深度搜索板块 {concept_name}")
-    
-    chunk_count = 0
-    for chunk in client.stream_chat_completion(messages, model="GLM-4-6-API-V1"):
-        # Check if cancellation was requested
-        if stop_event and stop_event.is_set():
-            if on_progress:
-                on_progress(f"深度搜索已被取消：{concept_name}")
-            return None
+    # Reuse today's result for this concept if a previous run already searched it;
+    # the LLM evaluation has its own content-hash cache
+    cache_key = _deepsearch_cache_key(concept_code, search_query)
+    concept_analysis = _get_cached_deepsearch(cache_key)
+    if concept_analysis:
+        if on_progress:
+            on_progress(f"使用缓存的深度搜索结果：{concept_name} (共 {len(concept_analysis)} 字符)")
+    else:
+        # Get credentials from config
+        bearer_token, cookie_str, user_id = get_zai_credentials()
+        client = _get_zai_client(bearer_token, user_id)
+        
+        messages = [
+            {
+                'role': 'user',
+                'content': search_query
+            }
+        ]
+        
+        # Stream the response and collect it
+        full_response = ""
+        if on_progress:
+            on_progress(f"开始深度搜索板块 {concept_name}")
+        
+        chunk_count = 0
+        for chunk in client.stream_chat_completion(messages, model=DEEPSEARCH_MODEL):
+            # Check if cancellation was requested
+            if stop_event and stop_event.is_set():
+                if on_progress:
+                    on_progress(f"深度搜索已被取消：{concept_name}")
+                return None
+                
+            full_response += chunk
+            chunk_count += 1
             
-        full_response += chunk
-        chunk_count += 1
+            # Send progress updates periodically (every 50 chunks) to avoid overwhelming
+            # the progress callback while still providing feedback
+            if on_progress and chunk_count % 50 == 0:
+                on_progress(f"深度搜索进行中：{concept_name} (已接收 {len(full_response)} 字符)")
         
-        # Send progress updates periodically (every 50 chunks) to avoid overwhelming
-        # the progress callback while still providing feedback
-        if on_progress and chunk_count % 50 == 0:
-            on_progress(f"深度搜索进行中：{concept_name} (已接收 {len(full_response)} 字符)")
+        # Send final update with complete content length
+        if on_progress:
+            on_progress(f"深度搜索完成：{concept_name} (共 {len(full_response)} 字符)")
+            
+        concept_analysis = full_response.strip()
+        if concept_analysis:
+            _save_cached_deepsearch(cache_key, concept_code, concept_analysis)
     
-    # Send final update with complete content length
-    if on_progress:
-        on_progress(f"深度搜索完成：{concept_name} (共 {len(full_response)} 字符)")
-        
-    concept_analysis = full_response.strip() if full_response else None
+    return concept_analysis
+
+
+def _evaluate_concept_analysis(concept_name: str, concept_analysis: Optional[str], on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None) -> Optional[Dict]:
+    """Evaluation stage: score the deepsearch text with the LLM
     
+    Returns:
+        Dict with 'concept_analysis' and 'llm_evaluation' keys, or None if there is nothing to evaluate
+    """
     # If we got search results, immediately evaluate them with LLM
     if concept_analysis:
         if on_progress:
@@ -94,10 +196,78 @@ def get_concept_analysis_with_deepsearch(concept_code: str, concept_name: str, o
     else:
         if on_progress:
             on_progress(f"深度搜索未获得有效结果：{concept_name}")
-        return None                         
+        return None
+
+
+class _SharedEvaluations:
+    """Per-run map of deepsearch text hash -> evaluation future, so identical texts are scored once"""
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, concept_name: str, concept_analysis: str, **kwargs) -> Future:
+        content_hash = hashlib.sha256(concept_analysis.encode("utf-8")).hexdigest()
+        with self._lock:
+            future = self._futures.get(content_hash)
+            if future is None:
+                future = _EVALUATION_EXECUTOR.submit(_evaluate_concept_analysis, concept_name, concept_analysis, **kwargs)
+                self._futures[content_hash] = future
+            else:
+                logger.info(f"板块 {concept_name} 的深度搜索内容与已提交的板块相同，复用其LLM评估")
+        return future
+
+
+def _start_concept_analysis(concept_code: str, concept_name: str, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None, evaluations: Optional[_SharedEvaluations] = None) -> Optional[Future]:
+    """Run the deepsearch stage, then hand the text to the evaluation pool and return its future
+    
+    With `evaluations`, sectors whose deepsearch text is identical share one evaluation future
+    """
+    concept_analysis = _deepsearch_concept(concept_code, concept_name, on_progress=on_progress, stop_event=stop_event)
+    if concept_analysis is None:
+        return None
+    if evaluations is not None and concept_analysis:
+        return evaluations.submit(concept_name, concept_analysis, on_progress=on_progress, stop_event=stop_event)
+    return _EVALUATION_EXECUTOR.submit(
+        _evaluate_concept_analysis, concept_name, concept_analysis, on_progress=on_progress, stop_event=stop_event
+    )
         
 
-def get_sector_analysis_with_hotspot_stocks(session, top_n: int = 5, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None) -> dict:
+def _evaluate_sectors_in_batch(submitted: list, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None) -> Dict[str, Optional[Dict]]:
+    """Batch mode: wait for every sector's deepsearch text, then score them all with one Batch API job
+    
+    Returns:
+        sector_code -> combined analysis result (same shape as _evaluate_concept_analysis); sectors
+        whose deepsearch raised are left out, like failed sectors in pipeline mode
+    """
+    texts = {}
+    for sector_code, _, _, _, future in submitted:
+        try:
+            texts[sector_code] = future.result()
+        except Exception as e:
+            logger.error(f"分析板块 {sector_code} 时出错: {str(e)}", exc_info=True)
+    
+    analysis_results: Dict[str, Optional[Dict]] = {sector_code: None for sector_code in texts}
+    pending = [(sector_code, text) for sector_code, text in texts.items() if text]
+    if not pending or (stop_event and stop_event.is_set()):
+        return analysis_results
+    
+    if on_progress:
+        on_progress(f"深度搜索完成，提交 {len(pending)} 个板块进行批量LLM评估")
+    evaluations = evaluate_batch(
+        [text for _, text in pending], use_batch_api=True, stop_event=stop_event, on_progress=on_progress
+    )
+    for (sector_code, text), llm_evaluation in zip(pending, evaluations):
+        analysis_results[sector_code] = {
+            'concept_analysis': text,
+            'llm_evaluation': llm_evaluation
+        }
+    if on_progress:
+        on_progress(f"批量LLM评估完成：{len(pending)} 个板块")
+    return analysis_results
+
+
+def get_sector_analysis_with_hotspot_stocks(session, top_n: int = 5, on_progress: Optional[Callable[[str], None]] = None, stop_event: Optional[object] = None, batch_evaluation: bool = False) -> dict:
     """Get sector-based analysis using real-time hotspot stocks from fetch_hot_spot
     
     Args:
@@ -105,6 +275,8 @@ def get_sector_analysis_with_hotspot_stocks(session, top_n: int = 5, on_progress
         top_n: Number of top concepts by stock count to analyze
         on_progress: Progress callback function
         stop_event: Optional threading.Event to signal cancellation
+        batch_evaluation: Score all sectors with one OpenAI Batch API job after the deepsearches finish,
+            instead of evaluating each sector as soon as its search completes (for non-interactive runs)
     
     Returns:
         Dict with sector codes as keys and their stock analysis as values
@@ -129,99 +301,130 @@ def get_sector_analysis_with_hotspot_stocks(session, top_n: int = 5, on_progress
     if on_progress:
         on_progress(f"获取到 {len(codes)} 只热点股票")
     
-    # Query database to get concept-stock relationships for hotspot stocks
-    # This efficiently gets all concepts that contain hotspot stocks
-    concept_stock_query = select(
-        ConceptStock.concept_code,
-        ConceptStock.stock_code
-    ).where(ConceptStock.stock_code.in_(codes))
-    
-    concept_stocks = session.exec(concept_stock_query).all() or []
-    
-    # Build concept -> stocks mapping
-    concept_stocks_dict = defaultdict(set)
-    for cs in concept_stocks:
-        concept_stocks_dict[cs.concept_code].add(cs.stock_code)
+    # Rank concepts by number of hotspot stocks in SQL and return only the top_n rows; concepts
+    # without hotspot stocks never leave the database. count() over () carries the number of
+    # matching concepts on every row, so the total is known without transferring them all
+    hotspot_count_col = func.count(func.distinct(ConceptStock.stock_code))
+    ranked_concepts = session.exec(
+        select(ConceptStock.concept_code, ConceptInfo.name, hotspot_count_col, func.count().over())
+        .join(ConceptInfo, ConceptInfo.code == ConceptStock.concept_code, isouter=True)
+        .where(ConceptStock.stock_code.in_(codes))
+        .group_by(ConceptStock.concept_code, ConceptInfo.name)
+        .order_by(hotspot_count_col.desc(), ConceptStock.concept_code)
+        .limit(top_n)
+    ).all()
     
     if on_progress:
-        on_progress(f"找到 {len(concept_stocks_dict)} 个包含热点股票的板块")
+        on_progress(f"找到 {ranked_concepts[0][3] if ranked_concepts else 0} 个包含热点股票的板块")
     
-    # Get concept info for all concepts that have hotspot stocks
-    concept_codes = list(concept_stocks_dict.keys())
-    concepts_info = session.exec(
-        select(ConceptInfo).where(ConceptInfo.code.in_(concept_codes))
-    ).all() or []
-    concept_map = {c.code: c.name for c in concepts_info}
+    # Resolve display names once (fall back to the code when the concept has no info)
+    concept_map = {
+        concept_code: concept_name or concept_code
+        for concept_code, concept_name, _, _ in ranked_concepts
+    }
     
-    # Sort concepts by number of hotspot stocks (descending) and take top_n
-    sorted_concepts = sorted(
-        concept_stocks_dict.items(),
-        key=lambda x: len(x[1]),
-        reverse=True
-    )[:top_n]
+    # Load hotspot stocks only for the selected concepts
+    concept_stocks_dict = defaultdict(set)
+    if concept_map:
+        for concept_code, stock_code in session.exec(
+            select(ConceptStock.concept_code, ConceptStock.stock_code).where(
+                ConceptStock.concept_code.in_(list(concept_map)),
+                ConceptStock.stock_code.in_(codes)
+            )
+        ):
+            concept_stocks_dict[concept_code].add(stock_code)
+    sorted_concepts = [(concept_code, concept_stocks_dict[concept_code]) for concept_code in concept_map]
     
     if on_progress:
         on_progress(f"选择前 {len(sorted_concepts)} 个热点股票最多的板块进行深度分析")
     
-    # Analyze selected concepts
-    result = {}
+    # Total stocks per selected concept (not just hotspot stocks), in one grouped query
+    selected_codes = [code for code, _ in sorted_concepts]
+    total_stocks_map = dict(session.exec(
+        select(ConceptStock.concept_code, func.count(ConceptStock.stock_code))
+        .where(ConceptStock.concept_code.in_(selected_codes))
+        .group_by(ConceptStock.concept_code)
+    ).all()) if selected_codes else {}
     
+    # Analyze selected concepts concurrently; the DB session stays on this thread
+    futures = []
+    evaluations = _SharedEvaluations()
     for sector_code, stock_codes in sorted_concepts:
         # Check if cancellation was requested
         if stop_event and stop_event.is_set():
             if on_progress:
                 on_progress("分析已被取消")
             break
-            
-        try:
-            sector_name = concept_map.get(sector_code, sector_code)
-            
-            # Get total stocks in this concept (not just hotspot stocks)
-            total_stocks_query = select(func.count(ConceptStock.stock_code)).where(
-                ConceptStock.concept_code == sector_code
+        
+        sector_name = concept_map[sector_code]
+        total_stocks_in_sector = total_stocks_map.get(sector_code, 0)
+        hotspot_count = len(stock_codes)
+        
+        if on_progress:
+            on_progress(f"分析板块 {sector_name}（{sector_code}）… 共 {total_stocks_in_sector} 只，热点股票 {hotspot_count} 只")
+        
+        if batch_evaluation:
+            # Deepsearch only; all texts are scored together once every search has finished
+            future = _DEEPSEARCH_EXECUTOR.submit(
+                _deepsearch_concept, sector_code, sector_name, on_progress=on_progress, stop_event=stop_event
             )
-            total_stocks_in_sector = session.exec(total_stocks_query).first() or 0
-            
-            hotspot_count = len(stock_codes)
-            
-            if on_progress:
-                on_progress(f"分析板块 {sector_name}（{sector_code}）… 共 {total_stocks_in_sector} 只，热点股票 {hotspot_count} 只")
-            
-            # Get deepsearch analysis and LLM evaluation in one atomic operation
-            analysis_result = get_concept_analysis_with_deepsearch(sector_code, sector_name, on_progress=on_progress, stop_event=stop_event)
-            
-            # Extract analysis and evaluation from the combined result
-            concept_analysis = analysis_result.get('concept_analysis') if analysis_result else None
-            llm_evaluation = analysis_result.get('llm_evaluation') if analysis_result else None
-            
-            result[sector_code] = {
-                "sector_code": sector_code,
-                "sector_name": sector_name,
-                "total_stocks": total_stocks_in_sector,
-                "hotspot_count": hotspot_count,
-                "hotspot_ratio": round(hotspot_count / total_stocks_in_sector * 100, 2) if total_stocks_in_sector > 0 else 0,
-                "stocks": list(stock_codes),
-                "concept_analysis": concept_analysis,
-                "llm_evaluation": llm_evaluation,
-                "error": None
-            }
-        except Exception as e:
-            error_msg = f"分析板块 {sector_code} 时出错: {str(e)}"
-            logger.error(error_msg, exc_info=True)
+        else:
+            # Deepsearch on its own pool; the LLM evaluation is chained onto the evaluation pool
+            future = _DEEPSEARCH_EXECUTOR.submit(
+                _start_concept_analysis, sector_code, sector_name,
+                on_progress=on_progress, stop_event=stop_event, evaluations=evaluations
+            )
+        futures.append((sector_code, sector_name, stock_codes, total_stocks_in_sector, future))
+    
+    if batch_evaluation:
+        analysis_results = _evaluate_sectors_in_batch(futures, on_progress=on_progress, stop_event=stop_event)
+    else:
+        analysis_results = {}
+        for sector_code, _, _, _, future in futures:
+            try:
+                evaluation_future = future.result()
+                analysis_results[sector_code] = evaluation_future.result() if evaluation_future else None
+            except Exception as e:
+                error_msg = f"分析板块 {sector_code} 时出错: {str(e)}"
+                logger.error(error_msg, exc_info=True)
+    
+    # Build in submission order so the result keeps the hotspot ranking
+    result = {}
+    for sector_code, sector_name, stock_codes, total_stocks_in_sector, _ in futures:
+        if sector_code not in analysis_results:
             continue
+        analysis_result = analysis_results[sector_code]
+        
+        # Extract analysis and evaluation from the combined result
+        concept_analysis = analysis_result.get('concept_analysis') if analysis_result else None
+        llm_evaluation = analysis_result.get('llm_evaluation') if analysis_result else None
+        
+        hotspot_count = len(stock_codes)
+        result[sector_code] = {
+            "sector_code": sector_code,
+            "sector_name": sector_name,
+            "total_stocks": total_stocks_in_sector,
+            "hotspot_count": hotspot_count,
+            "hotspot_ratio": round(hotspot_count / total_stocks_in_sector * 100, 2) if total_stocks_in_sector > 0 else 0,
+            "stocks": list(stock_codes),
+            "concept_analysis": concept_analysis,
+            "llm_evaluation": llm_evaluation,
+            "error": None
+        }
         
     return result
         
 
 
 
-def run_standalone_extended_analysis(on_progress: Optional[Callable[[str], None]] = None, output_file: str = "extended_analysis_results.json", stop_event: Optional[object] = None) -> dict:
+def run_standalone_extended_analysis(on_progress: Optional[Callable[[str], None]] = None, output_file: str = "extended_analysis_results.json", stop_event: Optional[object] = None, batch_evaluation: bool = False) -> dict:
     """Run standalone extended analysis using real-time hotspot stocks
     
     Args:
         on_progress: Optional callback for progress updates
         output_file: Output file path for results (default: extended_analysis_results.json)
         stop_event: Optional threading.Event to signal cancellation
+        batch_evaluation: Score sectors through the OpenAI Batch API (see get_sector_analysis_with_hotspot_stocks)
     
     Returns:
         Dict with analysis results
@@ -242,18 +445,23 @@ def run_standalone_extended_analysis(on_progress: Optional[Callable[[str], None]
             # Get sector analysis using hotspot stocks
             if on_progress:
                 on_progress("开始基于实时热点股票进行板块分析")
-            sector_analysis = get_sector_analysis_with_hotspot_stocks(session, top_n=20, on_progress=on_progress, stop_event=stop_event)
-            
-            # Sort sectors by LLM evaluation overall_score (descending)
-            sorted_sectors = sorted(
-                sector_analysis.values(),
-                key=lambda x: x.get("llm_evaluation", {}).get("overall_score", 0) if x.get("llm_evaluation") else 0,
-                reverse=True
+            sector_analysis = get_sector_analysis_with_hotspot_stocks(
+                session, top_n=20, on_progress=on_progress, stop_event=stop_event, batch_evaluation=batch_evaluation
             )
             
-            # Count sectors with successful analysis
-            sectors_with_analysis = sum(1 for sector in sorted_sectors if sector.get("concept_analysis"))
-            sectors_with_llm_evaluation = sum(1 for sector in sorted_sectors if sector.get("llm_evaluation"))
+            # Extract each sector's score once and count successful analyses in the same pass
+            scored_sectors = []
+            sectors_with_analysis = 0
+            sectors_with_llm_evaluation = 0
+            for sector in sector_analysis.values():
+                llm_evaluation = sector.get("llm_evaluation")
+                scored_sectors.append((llm_evaluation.get("overall_score", 0) if llm_evaluation else 0, sector))
+                sectors_with_analysis += bool(sector.get("concept_analysis"))
+                sectors_with_llm_evaluation += bool(llm_evaluation)
+            
+            # Sort sectors by LLM evaluation overall_score (descending)
+            scored_sectors.sort(key=itemgetter(0), reverse=True)
+            sorted_sectors = [sector for _, sector in scored_sectors]
             
             result = {
                 "analysis_date": current_date.isoformat(),
@@ -291,8 +499,12 @@ def run_standalone_extended_analysis(on_progress: Optional[Callable[[str], None]
                 if on_progress:
                     on_progress(f"写入分析结果到文件: {output_file}")
                 
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, ensure_ascii=False, indent=2)
+                # Serialize with orjson when available (same indented, non-ASCII output as json.dump);
+                # write to a temp file and swap it in, so readers never see a half-written file
+                tmp_path = f"{output_file}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(json_dumps(result, indent=True))
+                os.replace(tmp_path, output_file)
                 
                 logger.info(f"Extended analysis results written to {output_file}")
                 if on_progress:
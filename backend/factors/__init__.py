@@ -4,12 +4,81 @@ from __future__ import annotations
 
 import importlib
 import pkgutil
+from functools import cached_property, lru_cache
 from typing import List, Dict, Optional
+import numpy as np
 import pandas as pd
 
 from models import Factor
 
-__all__ = ["list_factors", "compute_all_factors", "compute_selected_factors"]
+__all__ = ["list_factors", "compute_all_factors", "compute_selected_factors", "stack_history", "StackedHistory"]
+
+
+class StackedHistory(dict):
+    """History dict that builds its stacked, sorted frame once and shares it with every factor."""
+
+    @cached_property
+    def stacked(self) -> pd.DataFrame:
+        return _stack(self)
+
+    @classmethod
+    def from_stacked(cls, stacked: pd.DataFrame) -> "StackedHistory":
+        """Build from a frame already sorted by ('代码', '日期'), reusing it as the cached stack."""
+        history = cls(
+            (code, sub.drop(columns="代码").reset_index(drop=True))
+            for code, sub in stacked.groupby("代码", sort=False)
+        )
+        history.__dict__["stacked"] = stacked
+        return history
+
+    def subset(self, codes) -> "StackedHistory":
+        """Restrict to the given codes; filtering keeps the sort order, so no re-stacking is needed."""
+        codes = set(codes)
+        subset = StackedHistory((code, df) for code, df in self.items() if code in codes)
+        if "stacked" in self.__dict__:
+            stacked = self.stacked
+            subset.__dict__["stacked"] = stacked.loc[stacked["代码"].isin(codes)].reset_index(drop=True)
+        return subset
+
+
+def stack_history(history: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate per-code history into one frame with a '代码' column, sorted by ('代码', '日期').
+
+    Lets factor modules compute across all stocks with groupby instead of per-code Python loops.
+    A StackedHistory returns its cached frame, so the concat/sort runs once per analysis.
+    """
+    if isinstance(history, StackedHistory):
+        return history.stacked
+    return _stack(history)
+
+
+def _stack(history: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    frames = [df.assign(代码=code) for code, df in history.items() if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=["代码", "日期"])
+    stacked = pd.concat(frames, ignore_index=True)
+    if not pd.api.types.is_datetime64_any_dtype(stacked["日期"]):
+        stacked["日期"] = pd.to_datetime(stacked["日期"])
+    if _is_sorted_by_code_date(stacked):
+        return stacked
+    return stacked.sort_values(["代码", "日期"], kind="stable", ignore_index=True)
+
+
+def _is_sorted_by_code_date(stacked: pd.DataFrame) -> bool:
+    """O(n) check for input already ordered by ('代码', '日期'), which lets _stack skip the sort."""
+    if not stacked["代码"].is_monotonic_increasing:
+        return False
+    codes = stacked["代码"].to_numpy()
+    dates = stacked["日期"].to_numpy()
+    same_code = codes[1:] == codes[:-1]
+    return bool(np.all((dates[1:] >= dates[:-1]) | ~same_code))
+
+
+def _as_stacked_history(history: Dict[str, pd.DataFrame]) -> "StackedHistory":
+    """Wrap a plain history dict so every factor in one run shares a single stack/sort."""
+    if isinstance(history, StackedHistory):
+        return history
+    return StackedHistory(history)
 
 
 def _iter_factor_modules() -> List[str]:
@@ -23,7 +92,15 @@ def _iter_factor_modules() -> List[str]:
 
 
 def list_factors() -> List[Factor]:
-    """Dynamically import all factor modules and collect Factor instances from MODULE_FACTORS list."""
+    """Dynamically import all factor modules and collect Factor instances from MODULE_FACTORS list.
+
+    Discovery runs once per process; later calls (each analysis run and /factors request) reuse it.
+    """
+    return list(_discover_factors())
+
+
+@lru_cache(maxsize=1)
+def _discover_factors() -> tuple:
     factors: List[Factor] = []
     for mod_name in _iter_factor_modules():
         try:
@@ -36,11 +113,12 @@ def list_factors() -> List[Factor]:
         except Exception as e:
             import logging
             logging.getLogger(__name__).warning(f"Failed to import factor module {mod_name}: {e}")
-    return factors
+    return tuple(factors)
 
 
 def compute_all_factors(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """Compute all registered factor DataFrames and outer-join them by '代码'."""
+    history = _as_stacked_history(history)
     dfs: List[pd.DataFrame] = []
     for factor in list_factors():
         try:
@@ -65,6 +143,7 @@ def compute_selected_factors(history: Dict[str, pd.DataFrame], top_spot: Optiona
     if selected_factor_ids is None:
         return compute_all_factors(history, top_spot)
     
+    history = _as_stacked_history(history)
     dfs: List[pd.DataFrame] = []
     all_factors = list_factors()
     selected_factors = [f for f in all_factors if f.id in selected_factor_ids]
@@ -13,28 +13,18 @@ def calculate_momentum_simple(df: pd.DataFrame) -> float:
     if len(df) < 1:
         return 0.0
     
-    # Convert date column to datetime for proper sorting if needed
-    df_copy = df.copy()
-    if not pd.api.types.is_datetime64_any_dtype(df_copy['日期']):
-        df_copy['日期'] = pd.to_datetime(df_copy['日期'])
-    
-    # Sort by date (oldest first) and take last 10 days
-    df_sorted = df_copy.sort_values("日期", ascending=True)
-    df_sorted = df_sorted.reset_index(drop=True)
+    # Order by date (oldest first) without copying the frame; convert only if needed
+    dates = df['日期']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    order = np.argsort(dates.to_numpy(), kind="stable")
     
     # Take last 10 trading days
-    df_last_10 = df_sorted.tail(10)
+    df_last_10 = df.iloc[order[-10:]]
     
     # Calculate body for each candle: close - open
-    # Positive for bullish (阳线), negative for bearish (阴线)
-    bodies = df_last_10["收盘"] - df_last_10["开盘"]
-    
-    # Check for invalid data
-    if bodies.isna().any():
-        # Sum only valid values
-        total_body = bodies.dropna().sum()
-    else:
-        total_body = bodies.sum()
+    # Positive for bullish (阳线), negative for bearish (阴线); invalid values are skipped by sum
+    total_body = (df_last_10["收盘"] - df_last_10["开盘"]).sum()
     
     # Convert to float
     if pd.isna(total_body):
@@ -50,24 +40,20 @@ def compute_momentum(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.Dat
         history: Historical price data
         top_spot: Optional spot data (unused)
     """
-    rows: List[dict] = []
-    
-    for code, df in history.items():
-        if df is None or df.empty or len(df) < 1:
-            continue
-        
-        momentum = calculate_momentum_simple(df)
-        rows.append({
-            "代码": code, 
-            "动量因子": momentum
-        })
-    
+    from factors import stack_history
+
+    stacked = stack_history(history)
+    if stacked.empty:
+        return pd.DataFrame()
+
+    # Take last 10 trading days per stock, body = close - open (NaN bodies are skipped by sum)
+    last_10 = stacked.groupby("代码", sort=False).tail(10)
+    bodies = last_10["收盘"] - last_10["开盘"]
+    momentum = bodies.groupby(last_10["代码"], sort=False).sum()
+
     # Sort by momentum factor from high to low
-    df_result = pd.DataFrame(rows)
-    if not df_result.empty:
-        df_result = df_result.sort_values("动量因子", ascending=False)
-    
-    return df_result
+    df_result = momentum.astype(float).rename("动量因子").rename_axis("代码").reset_index()
+    return df_result.sort_values("动量因子", ascending=False)
 
 
 MOMENTUM_FACTOR = Factor(
@@ -35,6 +35,30 @@ def calculate_macd(close_prices: pd.Series, fast_period: int = 12, slow_period:
     return macd
 
 
+def _ewm_mean(matrix: np.ndarray, span: int) -> np.ndarray:
+    """按列计算EMA，与 ``DataFrame.ewm(span=span, adjust=False).mean()`` 结果一致（含NaN处理）
+
+    逐交易日递推、每步对所有股票做向量运算，循环次数只取决于交易日数而非股票数量
+    """
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    result = np.empty_like(matrix)
+    weighted = matrix[0].copy()
+    old_wt = np.ones(matrix.shape[1])
+    result[0] = weighted
+    for t in range(1, matrix.shape[0]):
+        current = matrix[t]
+        has_prev = ~np.isnan(weighted)
+        is_obs = ~np.isnan(current)
+        old_wt = np.where(has_prev, old_wt * decay, old_wt)
+        update = has_prev & is_obs
+        weighted = np.where(update, (old_wt * weighted + alpha * current) / (old_wt + alpha), weighted)
+        old_wt = np.where(update, 1.0, old_wt)
+        weighted = np.where(~has_prev & is_obs, current, weighted)
+        result[t] = weighted
+    return result
+
+
 def compute_support(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.DataFrame] = None, macd_window: int = 10) -> pd.DataFrame:
     """Calculate support factor using MACD absolute value sum
     
@@ -45,46 +69,43 @@ def compute_support(history: Dict[str, pd.DataFrame], top_spot: Optional[pd.Data
         top_spot: Optional spot data (unused)
         macd_window: Number of recent MACD values to sum (default: 10)
     """
-    rows: List[dict] = []
-    
-    for code, df in history.items():
-        # 需要至少26+9+macd_window天的数据来计算MACD
-        min_required_days = 26 + 9 + macd_window
-        if df is None or df.empty or len(df) < min_required_days:
-            continue
-            
-        # Convert date column to datetime for proper sorting if needed
-        df_copy = df.copy()
-        if not pd.api.types.is_datetime64_any_dtype(df_copy['日期']):
-            df_copy['日期'] = pd.to_datetime(df_copy['日期'])
-        
-        df_sorted = df_copy.sort_values("日期", ascending=True)
-        
-        # 计算MACD
-        close_prices = df_sorted['收盘']
-        macd_values = calculate_macd(close_prices)
-        
-        # 获取最近macd_window个MACD值
-        recent_macd = macd_values.iloc[-macd_window:]
-        
-        # 计算MACD绝对值总和
-        macd_abs_sum = recent_macd.abs().sum()
-        
-        # 支撑因子：MACD绝对值总和的倒数（值越小越好，所以取倒数让值越大越好）
-        # 为了避免除以0，添加一个小常数
-        support_factor = 1.0 / (macd_abs_sum + 0.0001)
-        
-        # 获取最新的MACD值
-        latest_macd = macd_values.iloc[-1]
-        
-        rows.append({
-            "代码": code, 
-            "支撑因子": support_factor,
-            f"MACD绝对值和_{macd_window}日": macd_abs_sum,
-            "最新MACD": latest_macd,
-        })
-    
-    return pd.DataFrame(rows)
+    from factors import stack_history
+
+    stacked = stack_history(history)
+    # 需要至少26+9+macd_window天的数据来计算MACD
+    min_required_days = 26 + 9 + macd_window
+    if not stacked.empty:
+        counts = stacked.groupby("代码", sort=False)["日期"].transform("size")
+        stacked = stacked[counts >= min_required_days]
+    if stacked.empty:
+        return pd.DataFrame()
+
+    # 按股票右对齐成 (交易日 × 股票) 矩阵：每列为一只股票的收盘价，较短历史在顶部补NaN。
+    # 列间EMA相互独立且前导NaN不影响adjust=False的递推，因此可对所有股票同时递推
+    code_idx, code_labels = pd.factorize(stacked["代码"], sort=False)
+    pos_from_end = stacked.groupby("代码", sort=False).cumcount(ascending=False).to_numpy()
+    n_days = int(pos_from_end.max()) + 1
+    close_matrix = np.full((n_days, len(code_labels)), np.nan)
+    close_matrix[n_days - 1 - pos_from_end, code_idx] = stacked["收盘"].to_numpy(dtype=float)
+
+    ema_fast = _ewm_mean(close_matrix, 12)
+    ema_slow = _ewm_mean(close_matrix, 26)
+    dif = ema_fast - ema_slow
+    dea = _ewm_mean(dif, 9)
+    macd = dif - dea
+
+    # 获取最近macd_window个MACD值并计算绝对值总和
+    macd_abs_sum = pd.Series(np.nansum(np.abs(macd[-macd_window:]), axis=0), index=code_labels)
+    latest_macd = pd.Series(macd[-1], index=code_labels)
+
+    # 支撑因子：MACD绝对值总和的倒数（值越小越好，所以取倒数让值越大越好）
+    # 为了避免除以0，添加一个小常数
+    return pd.DataFrame({
+        "代码": macd_abs_sum.index,
+        "支撑因子": 1.0 / (macd_abs_sum.values + 0.0001),
+        f"MACD绝对值和_{macd_window}日": macd_abs_sum.values,
+        "最新MACD": latest_macd.values,
+    })
 
 
 # Configuration
@@ -1,10 +1,11 @@
 from __future__ import annotations
 import logging
 import warnings
+from contextlib import asynccontextmanager
 from typing import List, Dict
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Suppress verbose SQLAlchemy logging IMMEDIATELY
@@ -14,6 +15,7 @@ logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
 
 from config import load_config_json, set_system_config
 import os
+import sys
 
 # Load environment variables at startup
 try:
@@ -93,32 +95,11 @@ from models import (
     AuthResponse,
     create_db_and_tables,
 )
-from api import (
-    run_analysis,
-    get_task_status,
-    get_latest_results,
-    list_all_tasks,
-    collect_concepts,
-    get_concept_task_status,
-    get_latest_concept_results,
-    list_all_concept_tasks,
-    get_concepts_list,
-    stop_analysis,
-    get_kline_amplitude_dashboard,
-    run_extended_analysis,
-    stop_extended_analysis,
-    login_user,
-    get_zai_config,
-    update_zai_config,
-    get_extended_analysis_task_status,
-    get_running_extended_analysis_status,
-    get_system_health,
-    get_random_stocks_dashboard,
-    get_market_analysis_dashboard,
-    generate_market_analysis_dashboard,
-)
 from factors import list_factors
 
+# Route handlers import from `api` on first call: it pulls in the concept crawler,
+# LLM clients and analysis pipeline, which the server does not need to start listening.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -129,12 +110,39 @@ from scheduler import start_daily_scheduler
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
-app = FastAPI(title="Quant Dashboard")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """On shutdown, stop analyses and cancel queued work so shutdown and --reload don't wait on pool threads"""
+    yield
+    # Only modules that were actually loaded can have running work
+    services = sys.modules.get("data_management.services")
+    if services is not None:
+        services.shutdown_analysis_executor()
+    extended_analysis = sys.modules.get("extended_analysis")
+    if extended_analysis is not None:
+        extended_analysis.shutdown_executors()
+
+
+# Set DISABLE_DOCS=1 in production to skip the OpenAPI schema and the /docs, /redoc pages
+_docs_disabled = os.getenv("DISABLE_DOCS", "").lower() in ("1", "true", "yes")
+app = FastAPI(
+    title="Quant Dashboard",
+    openapi_url=None if _docs_disabled else "/openapi.json",
+    docs_url=None if _docs_disabled else "/docs",
+    redoc_url=None if _docs_disabled else "/redoc",
+    # orjson is a declared dependency; it serializes the large analysis payloads faster
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # 初始化数据库
 create_db_and_tables()
 logger.info("Database initialized successfully")
 
+# Warm the factor registry so the first analysis/factors request skips module discovery
+logger.info(f"Loaded {len(list_factors())} factor(s)")
+
 # Admin user will be automatically created as the first user to register
 logger.info("Admin user will be automatically assigned to the first user who registers")
 
@@ -220,6 +228,7 @@ check_system_configuration()
 # Start daily scheduler for automated analysis
 start_daily_scheduler()
 
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "https://a.subx.fun"],
@@ -278,37 +287,51 @@ async def root_index():
 @app.get("/health")
 def health_check():
     """System health check endpoint"""
+    from api import get_system_health
+
     return get_system_health()
 
 
 @app.get("/status")
 def status_check():
     """Simple status endpoint (alias for health check)"""
+    from api import get_system_health
+
     return get_system_health()
 
 
 @app.post("/run", response_model=RunResponse)
 def run(request: RunRequest) -> RunResponse:
+    from api import run_analysis
+
     return run_analysis(request)
 
 
 @app.get("/task/{task_id}", response_model=TaskResult)
 def get_task(task_id: str) -> TaskResult:
+    from api import get_task_status
+
     return get_task_status(task_id)
 
 
 @app.post("/task/{task_id}/stop", response_model=TaskResult)
 def stop_task(task_id: str) -> TaskResult:
+    from api import stop_analysis
+
     return stop_analysis(task_id)
 
 
 @app.get("/results", response_model=TaskResult | Message)
 def get_results():
+    from api import get_latest_results
+
     return get_latest_results()
 
 
 @app.get("/tasks", response_model=List[TaskResult])
 def list_tasks() -> List[TaskResult]:
+    from api import list_all_tasks
+
     return list_all_tasks()
 
 
@@ -340,30 +363,40 @@ def collect_concept_data(clear_db: bool = False) -> RunResponse:
     Args:
         clear_db: If True, clear existing concept data before collecting (testing only)
     """
+    from api import collect_concepts
+
     return collect_concepts(clear_db=clear_db)
 
 
 @app.get("/concepts/task/{task_id}", response_model=ConceptTaskResult)
 def get_concept_task(task_id: str) -> ConceptTaskResult:
     """Get concept task status"""
+    from api import get_concept_task_status
+
     return get_concept_task_status(task_id)
 
 
 @app.get("/concepts/results", response_model=ConceptTaskResult | Message)
 def get_concept_results():
     """Get latest concept collection results"""
+    from api import get_latest_concept_results
+
     return get_latest_concept_results()
 
 
 @app.get("/concepts/tasks", response_model=List[ConceptTaskResult])
 def list_concept_tasks() -> List[ConceptTaskResult]:
     """List all concept tasks"""
+    from api import list_all_concept_tasks
+
     return list_all_concept_tasks()
 
 
 @app.get("/concepts")
 def get_concepts():
     """Get list of all concepts"""
+    from api import get_concepts_list
+
     return get_concepts_list()
 
 
@@ -373,24 +406,32 @@ def get_concepts():
 @app.get("/dashboard/kline-amplitude")
 def get_dashboard_kline_amplitude(n_days: int = 30):
     """Get K-line amplitude analysis for dashboard"""
+    from api import get_kline_amplitude_dashboard
+
     return get_kline_amplitude_dashboard(n_days)
 
 
 @app.get("/dashboard/random-stocks")
 def get_dashboard_random_stocks(n_days: int = 30):
     """Get random 5 stocks for dashboard chart"""
+    from api import get_random_stocks_dashboard
+
     return get_random_stocks_dashboard(n_days)
 
 
 @app.get("/dashboard/market-analysis")
 def get_dashboard_market_analysis():
     """Get market cycle analysis for dashboard"""
+    from api import get_market_analysis_dashboard
+
     return get_market_analysis_dashboard()
 
 
 @app.post("/dashboard/market-analysis/generate")
 def generate_dashboard_market_analysis():
     """Manually trigger market cycle analysis generation"""
+    from api import generate_market_analysis_dashboard
+
     return generate_market_analysis_dashboard()
 
 
@@ -408,6 +449,8 @@ def get_extended_analysis_results_endpoint():
 @app.post("/extended-analysis/run")
 def run_extended_analysis_endpoint():
     """Run standalone extended analysis focusing on sector analysis"""
+    from api import run_extended_analysis
+
     return run_extended_analysis()
 
 
@@ -431,18 +474,24 @@ def clear_extended_analysis_cache_endpoint():
 @app.post("/extended-analysis/{task_id}/stop")
 def stop_extended_analysis_endpoint(task_id: str):
     """Stop a running extended analysis task"""
+    from api import stop_extended_analysis
+
     return stop_extended_analysis(task_id)
 
 
 @app.get("/extended-analysis/{task_id}/status")
 def get_extended_analysis_task_status_endpoint(task_id: str):
     """Get status of a specific extended analysis task"""
+    from api import get_extended_analysis_task_status
+
     return get_extended_analysis_task_status(task_id)
 
 
 @app.get("/extended-analysis/status")
 def get_running_extended_analysis_status_endpoint():
     """Get status of currently running extended analysis task"""
+    from api import get_running_extended_analysis_status
+
     return get_running_extended_analysis_status()
 
 
@@ -452,6 +501,8 @@ def get_running_extended_analysis_status_endpoint():
 @app.post("/api/auth/login", response_model=AuthResponse)
 def login(request: AuthRequest) -> AuthResponse:
     """User login/register with username and email"""
+    from api import login_user
+
     return login_user(request)
 
 
@@ -461,12 +512,16 @@ def login(request: AuthRequest) -> AuthResponse:
 @app.get("/config/zai")
 def get_config():
     """Get masked configuration and configured flag"""
+    from api import get_zai_config
+
     return get_zai_config()
 
 
 @app.post("/config/zai")
 def post_config(payload: dict):
     """Save configuration (ZAI + OpenAI) to backend/config.json"""
+    from api import update_zai_config
+
     print("\n" + "=" * 60)
     print("POST /config/zai ENDPOINT HIT")
     print(f"Payload received: {payload}")
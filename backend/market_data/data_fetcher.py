@@ -1,7 +1,8 @@
 from __future__ import annotations
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
@@ -19,118 +20,143 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# History requests are blocking HTTP calls; overlap them, but stay gentle with the data sources
+HISTORY_FETCH_WORKERS = 16
 
-def fetch_history(codes: List[str], end_date: str, days: int = 60, task_id: Optional[str] = None) -> Dict[str, pd.DataFrame]:
-    """Fetch historical data for multiple stocks"""
-    history: Dict[str, pd.DataFrame] = {}
-    start_date = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d")
+
+def _to_symbol(c: str) -> str:
+    c = c.strip()
+    if len(c) == 6 and c.isdigit():
+        if c.startswith("6"):
+            return f"sh{c}"
+        if c.startswith(("0", "3")):
+            return f"sz{c}"
+        if c.startswith("8"):
+            return f"bj{c}"
+    return c
+
+
+def _to_clean_code(c: str) -> str:
+    c = c.strip()
+    if len(c) > 6 and c[:2] in ["sh", "sz", "bj"]:
+        return c[2:]
+    return c
+
+
+def _fetch_one_history(code: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    """Fetch and normalize historical data for a single stock, None if every source fails"""
+    # Prefer akshare, fallback to Tencent if akshare fails or returns empty
+    df = pd.DataFrame()
+    # 1) Try akshare's general interface first (has more complete data including 成交额)
+    if HAS_AKSHARE:
+        try:
+            ak_code = _to_clean_code(code)
+            df = ak.stock_zh_a_hist(symbol=ak_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
+        except Exception as e:
+            logger.warning(f"akshare通用接口获取异常，尝试akshare腾讯接口: {code}, 错误: {e}")
+            df = pd.DataFrame()
+
+    # 2) Fallback to akshare's Tencent API (less data but more stable)
+    if (df is None or df.empty) and HAS_AKSHARE:
+        try:
+            api_symbol = _to_symbol(code)
+            df = ak.stock_zh_a_hist_tx(symbol=api_symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+        except Exception as e:
+            logger.warning(f"akshare腾讯接口也获取异常，将尝试本地腾讯实现: {code}, 错误: {e}")
+            df = pd.DataFrame()
+
+    # 3) Final fallback to local Tencent implementation
+    if df is None or df.empty:
+        try:
+            api_symbol = _to_symbol(code)
+            df = stock_zh_a_hist_tx_period(symbol=api_symbol, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
+        except Exception as e:
+            logger.warning(f"本地腾讯实现也失败: {code}, 错误: {e}")
+            df = pd.DataFrame()
+
+    if df is None or df.empty:
+        logger.warning(f"三种方式均未获取到数据: {code}")
+        return None
     
-    logger.info(f"Fetching historical data for {len(codes)} stocks from {start_date} to {end_date}")
+    # Standardize column names
+    df = df.reset_index(drop=True)
     
-    for i, code in enumerate(codes):
-        # Update progress
-        if task_id:
-            progress = 0.2 + (0.5 * i / len(codes))  # 20%-70% of total progress
-            update_task_progress(task_id, progress, f"获取历史数据 {i+1}/{len(codes)}: {code}")
-        
-        # Prefer akshare, fallback to Tencent if akshare fails or returns empty
-        def to_symbol(c: str) -> str:
-            c = c.strip()
-            if len(c) == 6 and c.isdigit():
-                if c.startswith("6"):
-                    return f"sh{c}"
-                if c.startswith(("0", "3")):
-                    return f"sz{c}"
-                if c.startswith("8"):
-                    return f"bj{c}"
-            return c
-
-        def to_clean_code(c: str) -> str:
-            c = c.strip()
-            if len(c) > 6 and c[:2] in ["sh", "sz", "bj"]:
-                return c[2:]
-            return c
-
-        df = pd.DataFrame()
-        # 1) Try akshare's general interface first (has more complete data including 成交额)
-        if HAS_AKSHARE:
-            try:
-                ak_code = to_clean_code(code)
-                df = ak.stock_zh_a_hist(symbol=ak_code, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
-            except Exception as e:
-                logger.warning(f"akshare通用接口获取异常，尝试akshare腾讯接口: {code}, 错误: {e}")
-                df = pd.DataFrame()
+    # Handle different API formats
+    # Tencent API returns: date, open, close, high, low, amount (成交量 only)
+    # General API returns: 日期, 股票代码, 开盘, 收盘, 最高, 最低, 成交量, 成交额, etc.
+    rename_map = {
+        "date": "日期",
+        "open": "开盘",
+        "close": "收盘",
+        "high": "最高",
+        "low": "最低",
+        "amount": "成交量",  # Tencent API's amount is volume, not turnover
+        "股票代码": "代码",
+    }
+    existing_columns = {k: v for k, v in rename_map.items() if k in df.columns}
+    df = df.rename(columns=existing_columns)
+    
+    # Ensure date column is datetime
+    if "日期" in df.columns:
+        df["日期"] = pd.to_datetime(df["日期"])
+    
+    # Convert numeric columns
+    numeric_columns = ["开盘", "收盘", "最高", "最低", "成交量", "成交额", "振幅", "涨跌幅", "涨跌额", "换手率"]
+    numeric_cols = [col for col in numeric_columns if col in df.columns]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
 
-        # 2) Fallback to akshare's Tencent API (less data but more stable)
-        if (df is None or df.empty) and HAS_AKSHARE:
-            try:
-                api_symbol = to_symbol(code)
-                df = ak.stock_zh_a_hist_tx(symbol=api_symbol, start_date=start_date, end_date=end_date, adjust="qfq")
-            except Exception as e:
-                logger.warning(f"akshare腾讯接口也获取异常，将尝试本地腾讯实现: {code}, 错误: {e}")
-                df = pd.DataFrame()
+    # Compute missing percentage change if not provided
+    if "涨跌幅" not in df.columns and "收盘" in df.columns:
+        df["涨跌幅"] = df["收盘"].pct_change() * 100
+    
+    # Set stock code
+    if "代码" not in df.columns:
+        df["代码"] = code
+    
+    return df
+
+
+def fetch_history(codes: List[str], end_date: str, days: int = 60, task_id: Optional[str] = None,
+                  on_progress: Optional[Callable[[int, str], None]] = None) -> Dict[str, pd.DataFrame]:
+    """Fetch historical data for multiple stocks (network-bound, fetched concurrently)
 
-        # 3) Final fallback to local Tencent implementation
-        if df is None or df.empty:
+    on_progress, if given, is called as on_progress(completed_count, code) after each stock finishes.
+    """
+    fetched: Dict[str, pd.DataFrame] = {}
+    start_date = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=days)).strftime("%Y%m%d")
+    
+    logger.info(f"Fetching historical data for {len(codes)} stocks from {start_date} to {end_date}")
+    
+    with ThreadPoolExecutor(max_workers=HISTORY_FETCH_WORKERS, thread_name_prefix="history") as pool:
+        futures = {pool.submit(_fetch_one_history, code, start_date, end_date): code for code in codes}
+        for i, future in enumerate(as_completed(futures)):
+            code = futures[future]
+            # Update progress
+            if task_id:
+                progress = 0.2 + (0.5 * i / len(codes))  # 20%-70% of total progress
+                update_task_progress(task_id, progress, f"获取历史数据 {i+1}/{len(codes)}: {code}")
+            if on_progress:
+                on_progress(i + 1, code)
+            
             try:
-                api_symbol = to_symbol(code)
-                df = stock_zh_a_hist_tx_period(symbol=api_symbol, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
+                df = future.result()
             except Exception as e:
-                logger.warning(f"本地腾讯实现也失败: {code}, 错误: {e}")
-                df = pd.DataFrame()
-
-        if df is None or df.empty:
-            logger.warning(f"三种方式均未获取到数据: {code}")
-            continue
-        
-        if not df.empty:
-            # Standardize column names
-            df = df.reset_index(drop=True)
-            
-            # Handle different API formats
-            # Tencent API returns: date, open, close, high, low, amount (成交量 only)
-            # General API returns: 日期, 股票代码, 开盘, 收盘, 最高, 最低, 成交量, 成交额, etc.
-            rename_map = {
-                "date": "日期",
-                "open": "开盘",
-                "close": "收盘",
-                "high": "最高",
-                "low": "最低",
-                "amount": "成交量",  # Tencent API's amount is volume, not turnover
-                "股票代码": "代码",
-            }
-            existing_columns = {k: v for k, v in rename_map.items() if k in df.columns}
-            df = df.rename(columns=existing_columns)
-            
-            # Ensure date column is datetime
-            if "日期" in df.columns:
-                df["日期"] = pd.to_datetime(df["日期"])
-            
-            # Convert numeric columns
-            numeric_columns = ["开盘", "收盘", "最高", "最低", "成交量", "成交额", "振幅", "涨跌幅", "涨跌额", "换手率"]
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Compute missing percentage change if not provided
-            if "涨跌幅" not in df.columns and "收盘" in df.columns:
-                df["涨跌幅"] = df["收盘"].pct_change() * 100
-            
-            # Set stock code
-            if "代码" not in df.columns:
-                df["代码"] = code
-            
-            history[code] = df
+                logger.warning(f"获取历史数据异常: {code}, 错误: {e}")
+                df = None
+            if df is not None:
+                fetched[code] = df
             
             if (i + 1) % 50 == 0:
                 logger.info(f"Processed {i + 1}/{len(codes)} stocks")
     
+    # Keep the caller's code order regardless of completion order
+    history: Dict[str, pd.DataFrame] = {code: fetched[code] for code in codes if code in fetched}
     logger.info(f"Successfully fetched historical data for {len(history)} stocks")
     return history
 
 def compute_factors(top_spot: pd.DataFrame, history: Dict[str, pd.DataFrame], task_id: Optional[str] = None, selected_factors: Optional[List[str]] = None) -> pd.DataFrame:
     """Compute comprehensive factors for stock analysis via pluggable factor modules"""
-    from factors import compute_all_factors, compute_selected_factors
+    from factors import compute_all_factors, compute_selected_factors, StackedHistory
 
     logger.info("Computing factors using modular plugins...")
 
@@ -140,7 +166,12 @@ def compute_factors(top_spot: pd.DataFrame, history: Dict[str, pd.DataFrame], ta
     # Filter history to only include top stocks
     logger.info(f"开始因子计算：输入history包含 {len(history)} 个股票")
     logger.info(f"top_spot包含 {len(top_spot)} 个股票")
-    filtered_history = {code: df for code, df in history.items() if code in top_spot["代码"].values}
+    top_codes = set(top_spot["代码"])
+    # Concatenated and sorted once, then shared by every factor and the aggregations below
+    if isinstance(history, StackedHistory):
+        filtered_history = history.subset(top_codes)
+    else:
+        filtered_history = StackedHistory((code, df) for code, df in history.items() if code in top_codes)
     logger.info(f"过滤后的history包含 {len(filtered_history)} 个股票")
     logger.info(f"过滤后的股票代码：{list(filtered_history.keys())[:10]}{'...' if len(filtered_history) > 10 else ''}")
 
@@ -159,17 +190,16 @@ def compute_factors(top_spot: pd.DataFrame, history: Dict[str, pd.DataFrame], ta
     else:
         logger.info(f"因子计算完成，返回 {len(factors_df)} 个股票的因子数据")
 
-    # Calculate count of '换手板' occurrences within the analysis window
-    hs_counts = []
-    for code, df in filtered_history.items():
-        count = 0
-        if df is not None and not df.empty and "limit_up_text" in df.columns:
-            try:
-                count = int((df["limit_up_text"].fillna("") == "换手板").sum())
-            except Exception:
-                count = 0
-        hs_counts.append({"代码": code, "换手板": count})
-    hs_counts_df = pd.DataFrame(hs_counts)
+    stacked = filtered_history.stacked
+    last_rows = stacked.groupby("代码", sort=False).tail(1).set_index("代码")
+
+    # Calculate count of '换手板' occurrences within the analysis window (one vectorized pass)
+    hs_counts_df = pd.DataFrame({"代码": list(filtered_history.keys())})
+    if "limit_up_text" in stacked.columns:
+        hs_counts = stacked.loc[stacked["limit_up_text"] == "换手板"].groupby("代码").size()
+        hs_counts_df["换手板"] = hs_counts_df["代码"].map(hs_counts).fillna(0).astype(int)
+    else:
+        hs_counts_df["换手板"] = 0
 
     result = factors_df
 
@@ -177,40 +207,39 @@ def compute_factors(top_spot: pd.DataFrame, history: Dict[str, pd.DataFrame], ta
     if not hs_counts_df.empty:
         result = result.merge(hs_counts_df, on="代码", how="left")
 
-    # Add current price, stock name and other basic info
-    current_data = []
-    for code in result["代码"].tolist():
-        df = filtered_history.get(code)
-        if df is not None and not df.empty:
-            df_sorted = df.sort_values("日期")
-            # Get stock name from top_spot data
-            stock_name = top_spot[top_spot["代码"] == code]["名称"].iloc[0] if "名称" in top_spot.columns and len(top_spot[top_spot["代码"] == code]) > 0 else code
-            current_data.append({
-                "代码": code,
-                "名称": stock_name,
-                "当前价格": float(df_sorted["收盘"].iloc[-1]),
-                "涨跌幅": float(df_sorted["涨跌幅"].iloc[-1]) if "涨跌幅" in df_sorted.columns else 0
-            })
-
-    current_df = pd.DataFrame(current_data)
+    # Add current price, stock name and other basic info from each stock's latest bar
+    current_df = last_rows.loc[last_rows.index.isin(result["代码"])]
+    if "名称" in top_spot.columns:
+        names = top_spot.drop_duplicates("代码").set_index("代码")["名称"]
+        stock_names = current_df.index.to_series().map(names).fillna(current_df.index.to_series())
+    else:
+        stock_names = current_df.index.to_series()
+    if "收盘" in current_df.columns:
+        current_df = pd.DataFrame({
+            "代码": current_df.index,
+            "名称": stock_names.values,
+            "当前价格": current_df["收盘"].astype(float).values,
+            "涨跌幅": current_df["涨跌幅"].astype(float).values if "涨跌幅" in current_df.columns else 0.0,
+        })
+    else:
+        current_df = pd.DataFrame()
     if not current_df.empty:
         result = result.merge(current_df, on="代码", how="left")
 
-    # Generic score computation: for any column ending with '因子', compute a percentile rank score with suffix '评分'
-    score_columns = []
-    for col in list(result.columns):
-        if isinstance(col, str) and col.endswith("因子"):
-            score_col = col.replace("因子", "评分")
-            try:
-                result[score_col] = result[col].rank(ascending=True, pct=True)
-                score_columns.append(score_col)
-            except Exception:
-                # ignore non-numeric
-                pass
-
-    # Composite score: average of all available score columns if any
-    if score_columns:
-        result["综合评分"] = result[score_columns].mean(axis=1)
+    # Generic score computation: for any numeric column ending with '因子', compute a percentile rank score
+    # with suffix '评分'. All factor columns are ranked together in a single 2D pass.
+    factor_columns = [
+        col for col in result.columns
+        if isinstance(col, str) and col.endswith("因子") and pd.api.types.is_numeric_dtype(result[col])
+    ]
+    score_columns = [col.replace("因子", "评分") for col in factor_columns]
+    if factor_columns:
+        scores = result[factor_columns].rank(ascending=True, pct=True)
+        scores.columns = score_columns
+        result[score_columns] = scores
+
+        # Composite score: average of all available score columns
+        result["综合评分"] = scores.mean(axis=1)
         result = result.sort_values("综合评分", ascending=False)
 
     if task_id:
@@ -362,10 +391,8 @@ def fetch_dragon_tiger_data(page_number: int = 1, page_size: int = 50, statistic
         '机构买入净额', '机构买入总额', '机构卖出总额'
     ]
     
-    for col in money_columns:
-        if col in temp_df.columns:
-            temp_df[col] = pd.to_numeric(temp_df[col], errors='coerce') / 10000
-            temp_df[col] = temp_df[col].round(2)
+    money_cols = [col for col in money_columns if col in temp_df.columns]
+    temp_df[money_cols] = (temp_df[money_cols].apply(pd.to_numeric, errors='coerce') / 10000).round(2)
     
     # 数值型列处理
     numeric_columns = [
@@ -373,11 +400,10 @@ def fetch_dragon_tiger_data(page_number: int = 1, page_size: int = 50, statistic
         '近1个月涨跌幅', '近3个月涨跌幅', '近6个月涨跌幅', '近1年涨跌幅'
     ] + money_columns
     
-    for col in numeric_columns:
-        if col in temp_df.columns:
-            if col not in money_columns:  # 金额列已经处理过了
-                temp_df[col] = pd.to_numeric(temp_df[col], errors='coerce')
-            if col in ['涨跌幅', '近1个月涨跌幅', '近3个月涨跌幅', '近6个月涨跌幅', '近1年涨跌幅']:
-                temp_df[col] = temp_df[col].round(2)
+    # 金额列已经处理过了
+    other_cols = [col for col in numeric_columns if col in temp_df.columns and col not in money_columns]
+    temp_df[other_cols] = temp_df[other_cols].apply(pd.to_numeric, errors='coerce')
+    pct_cols = [col for col in ['涨跌幅', '近1个月涨跌幅', '近3个月涨跌幅', '近6个月涨跌幅', '近1年涨跌幅'] if col in temp_df.columns]
+    temp_df[pct_cols] = temp_df[pct_cols].round(2)
     
     return temp_df
\ No newline at end of file
@@ -12,6 +12,11 @@ from utils.quotation import stock_zh_a_hist_tx_period
 
 logger = logging.getLogger(__name__)
 
+# 周K/月K查询结果的列名，与日K数据保持一致
+_KLINE_COLUMNS = ["代码", "日期", "开盘", "最高", "最低", "收盘", "成交量", "成交额", "涨跌幅"]
+# 从日K重采样周K/月K时使用的列名
+_OHLCV_COLUMNS = ["date", "open", "high", "low", "close", "volume", "amount"]
+
 
 def calculate_and_save_weekly_data(stock_codes: List[str], task_id: str = None):
     """获取并保存周K数据，优先使用API获取，失败时从日K数据计算"""
@@ -53,42 +58,45 @@ def _save_weekly_data_from_df(code: str, weekly_df: pd.DataFrame) -> int:
     """从DataFrame保存周K数据到数据库"""
     total_saved = 0
 
+    # 循环外绑定float并预先判断列是否存在，减少逐行的查找开销
+    _float = float
+    has_amount = 'amount' in weekly_df.columns
+
     with Session(engine) as session:
-        for _, row in weekly_df.iterrows():
-            week_date = row['date']
+        # 一次查出该股票已有的日期，代替逐行查询是否已存在
+        existing_dates = set(session.exec(
+            select(WeeklyMarketData.date).where(WeeklyMarketData.code == code)
+        ).all())
+
+        # itertuples 产出轻量的命名元组，避免 iterrows 为每行构建 Series
+        for row in weekly_df.itertuples(index=False):
+            week_date = row.date
             # Ensure date is a Python date object
             if isinstance(week_date, str):
                 week_date = pd.to_datetime(week_date).date()
 
-            # 检查是否已存在
-            existing = session.exec(
-                select(WeeklyMarketData).where(
-                    WeeklyMarketData.code == code,
-                    WeeklyMarketData.date == week_date
-                )
-            ).first()
-
-            if existing is None:
+            if week_date not in existing_dates:
+                existing_dates.add(week_date)
                 # 计算涨跌幅
                 change_pct = 0
-                if row['open'] > 0:
-                    change_pct = (row['close'] - row['open']) / row['open'] * 100
+                if row.open > 0:
+                    change_pct = (row.close - row.open) / row.open * 100
 
                 # 腾讯API返回的周K/月K数据：
                 # - amount字段实际是成交量（单位：手）
                 # - 没有返回成交额数据
                 # 映射关系：API的amount -> 数据库的volume
-                volume = float(row['amount']) if 'amount' in row and pd.notna(row['amount']) else 0.0
+                volume = _float(row.amount) if has_amount and pd.notna(row.amount) else 0.0
                 # 成交额数据不可用，设为0
                 amount = 0.0
 
                 weekly_data = WeeklyMarketData(
                     code=code,
                     date=week_date,
-                    open_price=float(row['open']),
-                    high_price=float(row['high']),
-                    low_price=float(row['low']),
-                    close_price=float(row['close']),
+                    open_price=_float(row.open),
+                    high_price=_float(row.high),
+                    low_price=_float(row.low),
+                    close_price=_float(row.close),
                     volume=volume,
                     amount=amount,
                     change_pct=change_pct
@@ -106,8 +114,16 @@ def _calculate_weekly_from_daily(code: str) -> int:
     total_saved = 0
 
     with Session(engine) as session:
-        # 获取该股票的所有日K数据
-        stmt = select(DailyMarketData).where(
+        # 获取该股票的所有日K数据，只查询计算所需的列，不构建ORM对象
+        stmt = select(
+            DailyMarketData.date,
+            DailyMarketData.open_price,
+            DailyMarketData.high_price,
+            DailyMarketData.low_price,
+            DailyMarketData.close_price,
+            DailyMarketData.volume,
+            DailyMarketData.amount,
+        ).where(
             DailyMarketData.code == code
         ).order_by(DailyMarketData.date)
 
@@ -116,15 +132,7 @@ def _calculate_weekly_from_daily(code: str) -> int:
             return 0
 
         # 转换为DataFrame进行周K计算
-        df = pd.DataFrame([{
-            "date": record.date,
-            "open": record.open_price,
-            "high": record.high_price,
-            "low": record.low_price,
-            "close": record.close_price,
-            "volume": record.volume,
-            "amount": record.amount
-        } for record in daily_records])
+        df = pd.DataFrame.from_records(daily_records, columns=_OHLCV_COLUMNS)
 
         df["date"] = pd.to_datetime(df["date"])
         df.set_index("date", inplace=True)
@@ -139,38 +147,32 @@ def _calculate_weekly_from_daily(code: str) -> int:
             'amount': 'sum'
         }).dropna()
 
-        for week_end, row in weekly.iterrows():
-            week_date = week_end.date()
+        # 周涨跌幅 = (收盘 - 周开盘) / 周开盘，周开盘即重采样得到的open，整列一次算出，
+        # 无需在循环中为每周重新扫描日K数据
+        weekly['change_pct'] = (
+            (weekly['close'] - weekly['open']) / weekly['open'] * 100
+        ).round(2).where(weekly['open'] > 0, 0.0)
 
-            # 检查是否已存在
-            existing = session.exec(
-                select(WeeklyMarketData).where(
-                    WeeklyMarketData.code == code,
-                    WeeklyMarketData.date == week_date
-                )
-            ).first()
-
-            if existing is None:
-                # 获取本周第一天的收盘价来计算周涨跌幅
-                week_start = week_end - pd.Timedelta(days=6)  # 一周前
-                week_start_data = df[df.index >= week_start].iloc[0] if len(df[df.index >= week_start]) > 0 else None
+        # 一次查出该股票已有的日期，代替逐条查询是否已存在
+        existing_dates = set(session.exec(
+            select(WeeklyMarketData.date).where(WeeklyMarketData.code == code)
+        ).all())
 
-                change_pct = 0
-                if week_start_data is not None:
-                    week_start_close = week_start_data['open']  # 周开盘价
-                    if week_start_close > 0:
-                        change_pct = round((row['close'] - week_start_close) / week_start_close * 100, 2)
+        _float = float
+        for row in weekly.itertuples():
+            week_date = row.Index.date()
 
+            if week_date not in existing_dates:
                 weekly_data = WeeklyMarketData(
                     code=code,
                     date=week_date,
-                    open_price=float(row['open']),
-                    high_price=float(row['high']),
-                    low_price=float(row['low']),
-                    close_price=float(row['close']),
-                    volume=float(row['volume']),
-                    amount=float(row['amount']),
-                    change_pct=change_pct
+                    open_price=_float(row.open),
+                    high_price=_float(row.high),
+                    low_price=_float(row.low),
+                    close_price=_float(row.close),
+                    volume=_float(row.volume),
+                    amount=_float(row.amount),
+                    change_pct=_float(row.change_pct)
                 )
                 session.add(weekly_data)
                 total_saved += 1
@@ -220,42 +222,45 @@ def _save_monthly_data_from_df(code: str, monthly_df: pd.DataFrame) -> int:
     """从DataFrame保存月K数据到数据库"""
     total_saved = 0
 
+    # 循环外绑定float并预先判断列是否存在，减少逐行的查找开销
+    _float = float
+    has_amount = 'amount' in monthly_df.columns
+
     with Session(engine) as session:
-        for _, row in monthly_df.iterrows():
-            month_date = row['date']
+        # 一次查出该股票已有的日期，代替逐行查询是否已存在
+        existing_dates = set(session.exec(
+            select(MonthlyMarketData.date).where(MonthlyMarketData.code == code)
+        ).all())
+
+        # itertuples 产出轻量的命名元组，避免 iterrows 为每行构建 Series
+        for row in monthly_df.itertuples(index=False):
+            month_date = row.date
             # Ensure date is a Python date object
             if isinstance(month_date, str):
                 month_date = pd.to_datetime(month_date).date()
 
-            # 检查是否已存在
-            existing = session.exec(
-                select(MonthlyMarketData).where(
-                    MonthlyMarketData.code == code,
-                    MonthlyMarketData.date == month_date
-                )
-            ).first()
-
-            if existing is None:
+            if month_date not in existing_dates:
+                existing_dates.add(month_date)
                 # 计算涨跌幅
                 change_pct = 0
-                if row['open'] > 0:
-                    change_pct = (row['close'] - row['open']) / row['open'] * 100
+                if row.open > 0:
+                    change_pct = (row.close - row.open) / row.open * 100
 
                 # 腾讯API返回的周K/月K数据：
                 # - amount字段实际是成交量（单位：手）
                 # - 没有返回成交额数据
                 # 映射关系：API的amount -> 数据库的volume
-                volume = float(row['amount']) if 'amount' in row and pd.notna(row['amount']) else 0.0
+                volume = _float(row.amount) if has_amount and pd.notna(row.amount) else 0.0
                 # 成交额数据不可用，设为0
                 amount = 0.0
 
                 monthly_data = MonthlyMarketData(
                     code=code,
                     date=month_date,
-                    open_price=float(row['open']),
-                    high_price=float(row['high']),
-                    low_price=float(row['low']),
-                    close_price=float(row['close']),
+                    open_price=_float(row.open),
+                    high_price=_float(row.high),
+                    low_price=_float(row.low),
+                    close_price=_float(row.close),
                     volume=volume,
                     amount=amount,
                     change_pct=change_pct
@@ -273,8 +278,16 @@ def _calculate_monthly_from_daily(code: str) -> int:
     total_saved = 0
 
     with Session(engine) as session:
-        # 获取该股票的所有日K数据
-        stmt = select(DailyMarketData).where(
+        # 获取该股票的所有日K数据，只查询计算所需的列，不构建ORM对象
+        stmt = select(
+            DailyMarketData.date,
+            DailyMarketData.open_price,
+            DailyMarketData.high_price,
+            DailyMarketData.low_price,
+            DailyMarketData.close_price,
+            DailyMarketData.volume,
+            DailyMarketData.amount,
+        ).where(
             DailyMarketData.code == code
         ).order_by(DailyMarketData.date)
 
@@ -283,15 +296,7 @@ def _calculate_monthly_from_daily(code: str) -> int:
             return 0
 
         # 转换为DataFrame进行月K计算
-        df = pd.DataFrame([{
-            "date": record.date,
-            "open": record.open_price,
-            "high": record.high_price,
-            "low": record.low_price,
-            "close": record.close_price,
-            "volume": record.volume,
-            "amount": record.amount
-        } for record in daily_records])
+        df = pd.DataFrame.from_records(daily_records, columns=_OHLCV_COLUMNS)
 
         df["date"] = pd.to_datetime(df["date"])
         df.set_index("date", inplace=True)
@@ -306,38 +311,32 @@ def _calculate_monthly_from_daily(code: str) -> int:
             'amount': 'sum'
         }).dropna()
 
-        for month_end, row in monthly.iterrows():
-            month_date = month_end.date()
-
-            # 检查是否已存在
-            existing = session.exec(
-                select(MonthlyMarketData).where(
-                    MonthlyMarketData.code == code,
-                    MonthlyMarketData.date == month_date
-                )
-            ).first()
+        # 月涨跌幅 = (收盘 - 月开盘) / 月开盘，月开盘即重采样得到的open，整列一次算出，
+        # 无需在循环中为每月重新扫描日K数据
+        monthly['change_pct'] = (
+            (monthly['close'] - monthly['open']) / monthly['open'] * 100
+        ).round(2).where(monthly['open'] > 0, 0.0)
 
-            if existing is None:
-                # 获取本月第一天的收盘价来计算月涨跌幅
-                month_start = month_end.replace(day=1)  # 月初
-                month_start_data = df[df.index >= month_start].iloc[0] if len(df[df.index >= month_start]) > 0 else None
+        # 一次查出该股票已有的日期，代替逐条查询是否已存在
+        existing_dates = set(session.exec(
+            select(MonthlyMarketData.date).where(MonthlyMarketData.code == code)
+        ).all())
 
-                change_pct = 0
-                if month_start_data is not None:
-                    month_start_close = month_start_data['open']  # 月开盘价
-                    if month_start_close > 0:
-                        change_pct = round((row['close'] - month_start_close) / month_start_close * 100, 2)
+        _float = float
+        for row in monthly.itertuples():
+            month_date = row.Index.date()
 
+            if month_date not in existing_dates:
                 monthly_data = MonthlyMarketData(
                     code=code,
                     date=month_date,
-                    open_price=float(row['open']),
-                    high_price=float(row['high']),
-                    low_price=float(row['low']),
-                    close_price=float(row['close']),
-                    volume=float(row['volume']),
-                    amount=float(row['amount']),
-                    change_pct=change_pct
+                    open_price=_float(row.open),
+                    high_price=_float(row.high),
+                    low_price=_float(row.low),
+                    close_price=_float(row.close),
+                    volume=_float(row.volume),
+                    amount=_float(row.amount),
+                    change_pct=_float(row.change_pct)
                 )
                 session.add(monthly_data)
                 total_saved += 1
@@ -349,59 +348,57 @@ def _calculate_monthly_from_daily(code: str) -> int:
 
 def get_weekly_data(stock_codes: List[str], limit: int = None) -> pd.DataFrame:
     """获取周K线数据"""
+    # 只查询需要的列，结果直接以元组形式收集，避免逐行构建ORM对象和字典
     weekly_data = []
 
     with Session(engine) as session:
         for code in stock_codes:
-            stmt = select(WeeklyMarketData).where(
+            stmt = select(
+                WeeklyMarketData.code,
+                WeeklyMarketData.date,
+                WeeklyMarketData.open_price,
+                WeeklyMarketData.high_price,
+                WeeklyMarketData.low_price,
+                WeeklyMarketData.close_price,
+                WeeklyMarketData.volume,
+                WeeklyMarketData.amount,
+                WeeklyMarketData.change_pct,
+            ).where(
                 WeeklyMarketData.code == code
             ).order_by(WeeklyMarketData.date.desc())
 
             if limit:
                 stmt = stmt.limit(limit)
 
-            records = session.exec(stmt).all()
-            for record in records:
-                weekly_data.append({
-                    "代码": record.code,
-                    "日期": record.date,
-                    "开盘": record.open_price,
-                    "最高": record.high_price,
-                    "最低": record.low_price,
-                    "收盘": record.close_price,
-                    "成交量": record.volume,
-                    "成交额": record.amount,
-                    "涨跌幅": record.change_pct
-                })
+            weekly_data.extend(session.exec(stmt).all())
 
-    return pd.DataFrame(weekly_data)
+    return pd.DataFrame.from_records(weekly_data, columns=_KLINE_COLUMNS)
 
 
 def get_monthly_data(stock_codes: List[str], limit: int = None) -> pd.DataFrame:
     """获取月K线数据"""
+    # 只查询需要的列，结果直接以元组形式收集，避免逐行构建ORM对象和字典
     monthly_data = []
 
     with Session(engine) as session:
         for code in stock_codes:
-            stmt = select(MonthlyMarketData).where(
+            stmt = select(
+                MonthlyMarketData.code,
+                MonthlyMarketData.date,
+                MonthlyMarketData.open_price,
+                MonthlyMarketData.high_price,
+                MonthlyMarketData.low_price,
+                MonthlyMarketData.close_price,
+                MonthlyMarketData.volume,
+                MonthlyMarketData.amount,
+                MonthlyMarketData.change_pct,
+            ).where(
                 MonthlyMarketData.code == code
             ).order_by(MonthlyMarketData.date.desc())
 
             if limit:
                 stmt = stmt.limit(limit)
 
-            records = session.exec(stmt).all()
-            for record in records:
-                monthly_data.append({
-                    "代码": record.code,
-                    "日期": record.date,
-                    "开盘": record.open_price,
-                    "最高": record.high_price,
-                    "最低": record.low_price,
-                    "收盘": record.close_price,
-                    "成交量": record.volume,
-                    "成交额": record.amount,
-                    "涨跌幅": record.change_pct
-                })
-
-    return pd.DataFrame(monthly_data)
\ No newline at end of file
+            monthly_data.extend(session.exec(stmt).all())
+
+    return pd.DataFrame.from_records(monthly_data, columns=_KLINE_COLUMNS)
@@ -4,6 +4,7 @@ from datetime import date as dt_date, datetime as dt_datetime, timezone
 from enum import Enum
 from typing import Any, Dict, List, Optional, Callable
 from pydantic import BaseModel
+from sqlalchemy import Index, event
 from sqlmodel import SQLModel, Field, create_engine, Session
 import pandas as pd
 import secrets
@@ -121,6 +122,12 @@ class DailyMarketData(SQLModel, table=True):
     """日行情表"""
 
     __tablename__ = "daily_market_data"
+    __table_args__ = (
+        # 按代码取最近 N 条 / (代码, 日期) 存在性检查
+        Index("ix_dmd_code_date", "code", "date"),
+        # 按日期范围统计涨停文本（回填）
+        Index("ix_dmd_date_limit", "date", "limit_up_text"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     code: str = Field(foreign_key="stock_basic_info.code", description="股票代码")
@@ -142,6 +149,10 @@ class WeeklyMarketData(SQLModel, table=True):
     """周行情表"""
 
     __tablename__ = "weekly_market_data"
+    __table_args__ = (
+        # 按代码取最近 N 条收盘价（涨跌幅计算、周K查询）/ 保存前取已有日期
+        Index("ix_wmd_code_date", "code", "date"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     code: str = Field(foreign_key="stock_basic_info.code", description="股票代码")
@@ -159,6 +170,10 @@ class MonthlyMarketData(SQLModel, table=True):
     """月行情表"""
 
     __tablename__ = "monthly_market_data"
+    __table_args__ = (
+        # 按代码取最近 N 条收盘价（涨跌幅计算、月K查询）/ 保存前取已有日期
+        Index("ix_mmd_code_date", "code", "date"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     code: str = Field(foreign_key="stock_basic_info.code", description="股票代码")
@@ -195,8 +210,8 @@ class ConceptStock(SQLModel, table=True):
     __tablename__ = "concept_stock"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    concept_code: str = Field(foreign_key="concept_info.code", description="板块代码")
-    stock_code: str = Field(foreign_key="stock_basic_info.code", description="股票代码")
+    concept_code: str = Field(foreign_key="concept_info.code", description="板块代码", index=True)
+    stock_code: str = Field(foreign_key="stock_basic_info.code", description="股票代码", index=True)
     created_at: dt_datetime = Field(
         default_factory=dt_datetime.now, description="创建时间"
     )
@@ -223,6 +238,32 @@ class DailyHotSector(SQLModel, table=True):
     )
 
 
+class LLMEvaluationCache(SQLModel, table=True):
+    """LLM评估结果缓存表，按 sha256(模型+系统提示+内容) 去重"""
+
+    __tablename__ = "llm_evaluation_cache"
+
+    content_hash: str = Field(primary_key=True, description="内容哈希")
+    model: str = Field(description="模型名称")
+    result_json: str = Field(description="评估结果JSON")
+    created_at: dt_datetime = Field(
+        default_factory=dt_datetime.now, description="创建时间"
+    )
+
+
+class DeepsearchCache(SQLModel, table=True):
+    """深度搜索结果缓存表，按 sha256(模型+概念代码+搜索语句+日期) 去重，同一概念当天只搜索一次"""
+
+    __tablename__ = "deepsearch_cache"
+
+    cache_key: str = Field(primary_key=True, description="缓存键")
+    concept_code: str = Field(index=True, description="概念代码")
+    analysis_text: str = Field(description="深度搜索结果文本")
+    created_at: dt_datetime = Field(
+        default_factory=dt_datetime.now, description="创建时间"
+    )
+
+
 class ConceptTask(BaseModel):
     task_id: str
     status: TaskStatus
@@ -255,7 +296,24 @@ DATABASE_PATH = os.getenv(
 # 确保数据库目录存在
 Path(DATABASE_PATH).parent.mkdir(parents=True, exist_ok=True)
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
-engine = create_engine(DATABASE_URL, echo=False)
+# 分析任务、扩展分析与回填线程会并发读写，放大连接池避免等待连接
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_size=10,
+    max_overflow=20,
+    pool_use_lifo=True,
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL 模式允许读写并发；NORMAL 同步级别减少批量写入时的 fsync；忙等待避免并发写入直接报 locked"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
 
 
 def create_db_and_tables():
@@ -280,6 +338,16 @@ def create_db_and_tables():
 
         logging.getLogger(__name__).warning(f"Schema migration check failed: {e}")
 
+    # 轻量迁移：create_all 不会为已存在的表补建索引，这里单独补建
+    try:
+        for model in (DailyMarketData, WeeklyMarketData, MonthlyMarketData, ConceptStock):
+            for index in model.__table__.indexes:
+                index.create(engine, checkfirst=True)
+    except Exception as e:
+        import logging
+
+        logging.getLogger(__name__).warning(f"Index migration failed: {e}")
+
     # 轻量迁移：为 stock_basic_info 增加 circulating_market_cap 和 pe_ratio 列，并迁移数据
     try:
         with engine.connect() as conn:
@@ -1,8 +1,7 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from api import run_analysis, run_extended_analysis
 from models import RunRequest, StockBasicInfo, DailyMarketData, WeeklyMarketData, MonthlyMarketData, get_session
-from sqlmodel import or_
+from sqlmodel import or_, select, func
 import time
 import pytz
 import logging
@@ -19,40 +18,41 @@ def clean_st_and_delisted_stocks():
     
     with get_session() as session:
         try:
-            # 查找符合条件的股票代码
-            st_stocks = session.query(StockBasicInfo).filter(
-                or_(
-                    StockBasicInfo.name.like('*ST%'),
-                    StockBasicInfo.name.like('退市%'),
-                    StockBasicInfo.name.like('%退')
-                )
-            ).all()
+            # 符合条件的股票代码作为子查询，由数据库直接完成过滤，无需把代码列表取回Python
+            st_condition = or_(
+                StockBasicInfo.name.like('*ST%'),
+                StockBasicInfo.name.like('退市%'),
+                StockBasicInfo.name.like('%退')
+            )
+            st_codes = select(StockBasicInfo.code).where(st_condition)
             
-            if not st_stocks:
+            st_count = session.query(func.count(StockBasicInfo.code)).filter(st_condition).scalar()
+            
+            if not st_count:
                 logger.info("No ST or delisted stocks found to clean.")
                 return
                 
-            stock_codes = [stock.code for stock in st_stocks]
-            logger.info(f"Found {len(stock_codes)} ST or delisted stocks to clean: {', '.join(stock_codes[:5])}{'...' if len(stock_codes) > 5 else ''}")
+            sample_codes = [code for (code,) in session.query(StockBasicInfo.code).filter(st_condition).limit(5)]
+            logger.info(f"Found {st_count} ST or delisted stocks to clean: {', '.join(sample_codes)}{'...' if st_count > 5 else ''}")
             
             # 删除日线数据
             daily_deleted = session.query(DailyMarketData).filter(
-                DailyMarketData.code.in_(stock_codes)
+                DailyMarketData.code.in_(st_codes)
             ).delete(synchronize_session=False)
             
             # 删除周线数据
             weekly_deleted = session.query(WeeklyMarketData).filter(
-                WeeklyMarketData.code.in_(stock_codes)
+                WeeklyMarketData.code.in_(st_codes)
             ).delete(synchronize_session=False)
             
             # 删除月线数据
             monthly_deleted = session.query(MonthlyMarketData).filter(
-                MonthlyMarketData.code.in_(stock_codes)
+                MonthlyMarketData.code.in_(st_codes)
             ).delete(synchronize_session=False)
             
-            # 删除股票基本信息
+            # 删除股票基本信息（放在最后，前面的子查询依赖该表）
             stocks_deleted = session.query(StockBasicInfo).filter(
-                StockBasicInfo.code.in_(stock_codes)
+                st_condition
             ).delete(synchronize_session=False)
             
             session.commit()
@@ -69,6 +69,9 @@ def clean_st_and_delisted_stocks():
 
 def daily_scheduled_analysis():
     """Scheduled task to run analysis and extended analysis daily at 00:00 Beijing time"""
+    # 延迟导入：api 依赖链较重，仅在定时任务实际执行时加载
+    from api import run_analysis, run_extended_analysis
+
     try:
         logger.info("Starting scheduled daily analysis...")
         
@@ -83,7 +86,8 @@ def daily_scheduled_analysis():
         
         # Run extended analysis
         logger.info("Starting scheduled extended analysis...")
-        run_extended_analysis()
+        from config import is_openai_batch_evaluation_enabled
+        run_extended_analysis(batch_evaluation=is_openai_batch_evaluation_enabled())
         
         # Wait a bit before generating market cycle analysis
         time.sleep(5)
@@ -10,7 +10,7 @@ from __future__ import annotations
 
 import logging
 import sys
-from sqlmodel import Session, select, delete
+from sqlmodel import Session, select, delete, func
 
 # 需要从项目根目录运行，所以需要添加路径
 sys.path.insert(0, ".")
@@ -47,11 +47,10 @@ def clean_ths_concepts():
             logger.info(f"\n正在清理concept_stock表中concept_code在这些code中的行...")
             
             # 先统计要删除的行数
-            count_query = select(ConceptStock).where(
+            count_query = select(func.count()).select_from(ConceptStock).where(
                 ConceptStock.concept_code.in_(concept_codes)
             )
-            rows_to_delete = session.exec(count_query).all()
-            rows_count = len(rows_to_delete)
+            rows_count = session.exec(count_query).one()
             
             if rows_count == 0:
                 logger.info("concept_stock表中没有需要清理的数据")
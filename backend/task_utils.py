@@ -1,6 +1,7 @@
 from __future__ import annotations
 import logging
 import threading
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Dict, Optional
 from models import Task, TaskStatus, ConceptTask
@@ -19,8 +20,8 @@ logger = logging.getLogger(__name__)
 TASKS: Dict[str, Task] = {}
 LAST_COMPLETED_TASK: Optional[Task] = None
 
-# Thread and cancellation management for analysis tasks
-TASK_THREADS: Dict[str, _threading.Thread] = {}
+# Future and cancellation management for analysis tasks (run on a shared executor)
+TASK_FUTURES: Dict[str, Future] = {}
 TASK_STOP_EVENTS: Dict[str, _threading.Event] = {}
 
 # Thread and cancellation management for extended analysis tasks
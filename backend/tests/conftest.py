@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Backend modules import each other as top-level packages (config, models, ...)
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# Keep the test run away from the real SQLite database; models reads this on import
+os.environ["DATABASE_PATH"] = str(Path(tempfile.mkdtemp(prefix="kfilter-tests-")) / "stock_data.db")
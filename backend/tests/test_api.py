@@ -0,0 +1,54 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import api
+from data_management import services
+from models import TaskStatus
+from task_utils import TASK_FUTURES, TASK_STOP_EVENTS
+
+
+def test_extended_analysis_json_fallback_includes_cached_at(tmp_path, monkeypatch):
+    services.clear_extended_analysis_cache()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "extended_analysis_results.json").write_text(
+        json.dumps({"sectors": [{"name": "半导体"}]}), encoding="utf-8"
+    )
+
+    result = api.get_extended_analysis_results()
+
+    assert result["from_cache"] is True
+    assert result["sectors"] == [{"name": "半导体"}]
+    assert datetime.fromisoformat(result["cached_at"])
+    services.clear_extended_analysis_cache()
+
+
+def test_stop_analysis_cancels_a_queued_task(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    started = []
+
+    def fake_run_analysis_task(task_id, top_n, selected_factors, collect_latest_data, stop_event=None):
+        started.append(task_id)
+        release.wait(5)
+
+    monkeypatch.setattr(services, "_EXECUTOR", executor)
+    monkeypatch.setattr(services, "run_analysis_task", fake_run_analysis_task)
+    try:
+        running_id = services.create_analysis_task(top_n=10)
+        queued_id = services.create_analysis_task(top_n=10)
+        queued_future = TASK_FUTURES[queued_id]
+
+        result = api.stop_analysis(queued_id)
+
+        assert result.status == TaskStatus.CANCELLED
+        assert result.completed_at is not None
+        assert queued_future.cancelled()
+        assert queued_id not in TASK_FUTURES
+        assert queued_id not in TASK_STOP_EVENTS
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+    # The cancelled task never reached the worker
+    assert started == [running_id]
@@ -0,0 +1,75 @@
+import pandas as pd
+
+from factors import StackedHistory, compute_all_factors, compute_selected_factors, stack_history
+from factors.momentum import calculate_momentum_simple
+from test_support import _make_history, _per_stock_support
+
+
+def _by_code(df):
+    return df.sort_values("代码").reset_index(drop=True)
+
+
+def test_stack_history_is_sorted_by_code_and_date():
+    stacked = stack_history(_make_history())
+
+    assert stacked["代码"].is_monotonic_increasing
+    assert stacked.groupby("代码")["日期"].apply(lambda s: s.is_monotonic_increasing).all()
+
+
+def test_stacked_history_builds_its_frame_once():
+    history = StackedHistory(_make_history())
+
+    assert stack_history(history) is stack_history(history)
+
+
+def test_from_stacked_round_trips_per_code_frames():
+    history = _make_history()
+    stacked = stack_history(history)
+
+    rebuilt = StackedHistory.from_stacked(stacked)
+
+    assert stack_history(rebuilt) is stacked
+    for code, df in history.items():
+        expected = df.assign(日期=pd.to_datetime(df["日期"])).sort_values("日期", ignore_index=True)
+        pd.testing.assert_frame_equal(rebuilt[code], expected)
+
+
+def test_subset_keeps_the_cached_stack_consistent():
+    history = StackedHistory(_make_history())
+    stack_history(history)
+    codes = list(history)[::2]
+
+    subset = history.subset(codes)
+
+    assert set(subset) == set(codes)
+    pd.testing.assert_frame_equal(subset.stacked, stack_history(dict(subset)))
+
+
+def test_compute_all_factors_matches_per_stock_results():
+    history = _make_history()
+
+    result = _by_code(compute_all_factors(history))
+
+    momentum = {code: calculate_momentum_simple(df) for code, df in history.items()}
+    assert result["动量因子"].tolist() == [momentum[code] for code in result["代码"]]
+
+    support = _per_stock_support(history).rename(columns={"MACD绝对值和_10日": "MACD绝对值和"})
+    merged = result.merge(support, on="代码", suffixes=("", "_expected"))
+    assert len(merged) == len(support)
+    for column in ("支撑因子", "MACD绝对值和", "最新MACD"):
+        pd.testing.assert_series_equal(
+            merged[column], merged[f"{column}_expected"], check_names=False, check_exact=False, rtol=1e-9
+        )
+
+
+def test_stacked_input_gives_the_same_factors_as_a_plain_dict():
+    history = _make_history()
+    stacked_history = StackedHistory.from_stacked(stack_history(history))
+
+    pd.testing.assert_frame_equal(
+        _by_code(compute_all_factors(stacked_history)), _by_code(compute_all_factors(history))
+    )
+    pd.testing.assert_frame_equal(
+        _by_code(compute_selected_factors(stacked_history, selected_factor_ids=["support"])),
+        _by_code(compute_selected_factors(history, selected_factor_ids=["support"])),
+    )
@@ -0,0 +1,275 @@
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from data_management import llm_client
+
+
+class FakeClient:
+    """Stands in for openai.Client; answers each user message from a fixed table."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.queries = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, **kwargs):
+        query = kwargs["messages"][-1]["content"]
+        self.queries.append(query)
+        content = next(v for k, v in self.responses.items() if query.startswith(k))
+        message = SimpleNamespace(content=json.dumps(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Patch the client, cache and config lookups used by evaluate_batch."""
+    cache = {}
+    state = SimpleNamespace(cache=cache, client=None)
+
+    def install(responses):
+        state.client = FakeClient(responses)
+        return state
+
+    monkeypatch.setattr(llm_client, "get_llm_client", lambda scheme="openai": state.client)
+    monkeypatch.setattr(llm_client, "_get_cached_evaluation", lambda content_hash: cache.get(content_hash))
+    monkeypatch.setattr(
+        llm_client, "_save_cached_evaluation",
+        lambda content_hash, model, evaluation: cache.__setitem__(content_hash, evaluation),
+    )
+    monkeypatch.setattr(llm_client, "_get_llm_min_content_length", lambda: 5)
+    monkeypatch.setattr(llm_client, "_is_prefix_cache_enabled", lambda: False)
+    monkeypatch.setattr(llm_client, "_get_rate_limiter", lambda: llm_client._RateLimiter(rpm=0, tpm=0))
+    return install
+
+
+def _cache_key(content, model="test-model"):
+    system_prompt, query = llm_client._evaluation_prompts(content)
+    return llm_client._evaluation_cache_key(model, system_prompt, query)
+
+
+def test_evaluate_batch_pads_uneven_criteria_with_nan(fake_llm):
+    state = fake_llm({
+        "many criteria": {
+            "category": "科技",
+            "产业趋势": {"score": 5, "reason": "a"},
+            "政策支持": {"score": 3, "reason": "b"},
+            "资金关注": {"score": 4, "reason": "c"},
+        },
+        "one criterion": {"政策支持": {"score": 2, "reason": "d"}},
+    })
+
+    results = llm_client.evaluate_batch(["many criteria", "one criterion"], model="test-model")
+
+    assert len(state.client.queries) == 2
+    assert results[0]["overall_score"] == 80.0
+    assert results[0]["top_scoring_criterion"] == "产业趋势"
+    assert results[0]["top_score"] == 100.0
+    # The shorter row must not pick up NaN padding in its mean or argmax
+    assert results[1]["overall_score"] == 40.0
+    assert results[1]["top_scoring_criterion"] == "政策支持"
+    assert results[1]["top_score"] == 40.0
+
+
+def test_evaluate_batch_without_valid_scores_returns_empty_evaluation(fake_llm):
+    state = fake_llm({
+        "no scores": {"category": "科技"},
+        "out of range": {"产业趋势": {"score": 9, "reason": "x"}},
+    })
+
+    results = llm_client.evaluate_batch(["no scores", "out of range", ""], model="test-model")
+
+    for result in results:
+        assert result["overall_score"] == 0
+        assert result["top_scoring_criterion"] == "无"
+        assert result["top_score"] == 0
+    assert results[0]["criteria_result"] == {"category": "科技"}
+    assert results[2]["criteria_result"] == {}
+    # Empty content is skipped without a request, and empty evaluations are not cached
+    assert len(state.client.queries) == 2
+    assert state.cache == {}
+
+
+def test_evaluate_batch_mixes_cache_hits_and_misses(fake_llm):
+    state = fake_llm({
+        "fresh text": {"产业趋势": {"score": 4, "reason": "e"}},
+    })
+    cached = {"overall_score": 60.0, "top_scoring_criterion": "政策支持", "top_score": 60.0}
+    state.cache[_cache_key("cached text")] = cached
+
+    results = llm_client.evaluate_batch(
+        ["cached text", "fresh text", "cached text", "fresh text"], model="test-model"
+    )
+
+    # Only the miss reaches the LLM, once despite appearing twice
+    assert len(state.client.queries) == 1
+    assert state.client.queries[0].startswith("fresh text")
+    assert results[0] == cached
+    assert results[2] == cached
+    assert results[1]["overall_score"] == 80.0
+    assert results[3] == results[1]
+    assert state.cache[_cache_key("fresh text")] == results[1]
+
+
+class FakeClock:
+    """Replaces llm_client.time so limiter waits advance a virtual clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_client, "time", fake)
+    return fake
+
+
+def test_rate_limiter_waits_for_request_budget(clock):
+    limiter = llm_client._RateLimiter(rpm=2, tpm=0)
+
+    for _ in range(3):
+        limiter.acquire(100)
+
+    # Two requests fit the bucket; the third waits for one request to refill at 2/min
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_rate_limiter_waits_for_token_budget(clock):
+    limiter = llm_client._RateLimiter(rpm=0, tpm=1000)
+
+    limiter.acquire(800)
+    limiter.acquire(400)
+
+    # 200 tokens left, 200 more needed at 1000 tokens/min
+    assert clock.sleeps == [pytest.approx(12.0)]
+
+
+def test_rate_limiter_caps_oversized_requests_at_bucket_size(clock):
+    limiter = llm_client._RateLimiter(rpm=0, tpm=1000)
+
+    limiter.acquire(5000)
+
+    assert clock.sleeps == []
+
+
+def test_rate_limiter_reconcile_returns_unused_tokens(clock):
+    limiter = llm_client._RateLimiter(rpm=0, tpm=1000)
+
+    limiter.acquire(800)
+    limiter.reconcile(estimated_tokens=800, actual_tokens=300)
+    limiter.acquire(600)
+
+    assert clock.sleeps == []
+
+
+def test_refresh_llm_config_rebuilds_rate_limiter(monkeypatch):
+    import config
+
+    monkeypatch.setattr(llm_client, "_rate_limiter", None)
+    monkeypatch.setattr(config, "get_openai_rate_limits", lambda: (10, 1000))
+    first = llm_client._get_rate_limiter()
+    assert (first.rpm, first.tpm) == (10, 1000)
+
+    monkeypatch.setattr(config, "get_openai_rate_limits", lambda: (20, 2000))
+    llm_client.refresh_llm_config()
+    second = llm_client._get_rate_limiter()
+
+    assert second is not first
+    assert (second.rpm, second.tpm) == (20, 2000)
+
+
+def test_count_tokens_fallback_counts_cjk_per_character(monkeypatch):
+    monkeypatch.setattr(llm_client, "HAS_TIKTOKEN", False)
+    llm_client._get_encoding.cache_clear()
+    llm_client._count_tokens.cache_clear()
+    try:
+        cjk = llm_client._count_tokens("半导体行业景气度回升" * 10, "glm-4")
+        ascii_text = llm_client._count_tokens("a" * 400, "glm-4")
+    finally:
+        llm_client._get_encoding.cache_clear()
+        llm_client._count_tokens.cache_clear()
+
+    assert cjk >= 100
+    assert ascii_text == 101
+
+
+class FlakyClient:
+    """Raises the queued errors in order, then returns a fixed response."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(choices=[], usage=None)
+
+
+def _rate_limit_error(headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.fixture
+def unlimited(monkeypatch, clock):
+    monkeypatch.setattr(llm_client, "_get_rate_limiter", lambda: llm_client._RateLimiter(rpm=0, tpm=0))
+    monkeypatch.setattr(llm_client, "random", SimpleNamespace(uniform=lambda a, b: 0.0))
+    return clock
+
+
+def test_create_with_retry_honors_retry_after(unlimited):
+    client = FlakyClient([_rate_limit_error({"retry-after": "7"})])
+
+    llm_client.create_with_retry(client, model="test-model", messages=[])
+
+    assert client.calls == 2
+    assert unlimited.sleeps == [7.0]
+
+
+def test_create_with_retry_prefers_retry_after_ms(unlimited):
+    client = FlakyClient([_rate_limit_error({"retry-after-ms": "1500", "retry-after": "9"})])
+
+    llm_client.create_with_retry(client, model="test-model", messages=[])
+
+    assert unlimited.sleeps == [1.5]
+
+
+def test_create_with_retry_backs_off_exponentially_without_header(unlimited):
+    client = FlakyClient([_rate_limit_error(), _rate_limit_error(), _rate_limit_error()])
+
+    llm_client.create_with_retry(client, initial_wait=1, max_wait=3, model="test-model", messages=[])
+
+    # 1s, 2s, then capped at max_wait
+    assert unlimited.sleeps == [1.0, 2.0, 3.0]
+
+
+def test_create_with_retry_raises_once_attempts_are_exhausted(unlimited):
+    client = FlakyClient([_rate_limit_error({"retry-after": "1"}) for _ in range(3)])
+
+    with pytest.raises(openai.RateLimitError):
+        llm_client.create_with_retry(client, max_attempts=3, model="test-model", messages=[])
+
+    assert client.calls == 3
+    assert unlimited.sleeps == [1.0, 1.0]
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from data_management import services
+from task_utils import TASK_FUTURES, TASK_STOP_EVENTS
+
+
+@pytest.fixture(autouse=True)
+def _clean_extended_cache():
+    services.clear_extended_analysis_cache()
+    yield
+    services.clear_extended_analysis_cache()
+
+
+def test_cache_extended_analysis_stamps_the_returned_result():
+    result = {"sectors": []}
+
+    services.cache_extended_analysis(result)
+
+    # A fresh run returns this dict directly, so it must carry the ISO timestamp too
+    assert datetime.fromisoformat(result["cached_at"])
+    assert isinstance(result["cached_at_ns"], int)
+    cached = services.get_cached_extended_analysis()
+    assert cached["cached_at"] == result["cached_at"]
+    assert cached["cached_at_ns"] == result["cached_at_ns"]
+
+
+def test_get_cached_extended_analysis_returns_a_copy():
+    services.cache_extended_analysis({"sectors": []})
+
+    cached = services.get_cached_extended_analysis()
+    cached["from_cache"] = True
+
+    assert "from_cache" not in services.get_cached_extended_analysis()
+
+
+@pytest.fixture
+def single_worker(monkeypatch):
+    """One-thread pool with a fake task body that blocks until released."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    started = []
+
+    def fake_run_analysis_task(task_id, top_n, selected_factors, collect_latest_data, stop_event=None):
+        started.append(task_id)
+        release.wait(5)
+
+    monkeypatch.setattr(services, "_EXECUTOR", executor)
+    monkeypatch.setattr(services, "run_analysis_task", fake_run_analysis_task)
+    yield SimpleNamespace(release=release, started=started)
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_finished_task_drops_its_registry_entries(single_worker):
+    single_worker.release.set()
+
+    task_id = services.create_analysis_task(top_n=10)
+
+    # The done callback runs right after the result is set, not before result() returns
+    assert _wait_until(lambda: task_id not in TASK_FUTURES)
+    assert task_id not in TASK_STOP_EVENTS
+    assert single_worker.started == [task_id]
+
+
+def test_shutdown_signals_running_and_cancels_queued_tasks(single_worker):
+    running_id = services.create_analysis_task(top_n=10)
+    assert _wait_until(lambda: single_worker.started == [running_id])
+    running_stop = TASK_STOP_EVENTS[running_id]
+    queued_id = services.create_analysis_task(top_n=10)
+    queued_future = TASK_FUTURES[queued_id]
+
+    services.shutdown_analysis_executor()
+
+    assert running_stop.is_set()
+    assert queued_future.cancelled()
+    assert queued_id not in TASK_FUTURES
+    single_worker.release.set()
+    assert _wait_until(lambda: running_id not in TASK_FUTURES)
+    assert single_worker.started == [running_id]
@@ -0,0 +1,257 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlmodel import Session, delete, select
+
+import models
+from data_management import stock_data_manager as sdm
+from models import DailyMarketData, StockBasicInfo
+
+
+@pytest.fixture(autouse=True)
+def db():
+    models.create_db_and_tables()
+    with Session(models.engine) as session:
+        session.exec(delete(DailyMarketData))
+        session.exec(delete(StockBasicInfo))
+        session.commit()
+    yield
+
+
+def _reset():
+    with Session(models.engine) as session:
+        session.exec(delete(DailyMarketData))
+        session.exec(delete(StockBasicInfo))
+        session.commit()
+
+
+def _daily_rows():
+    with Session(models.engine) as session:
+        rows = session.exec(select(DailyMarketData).order_by(DailyMarketData.code, DailyMarketData.date)).all()
+        return [
+            (r.code, r.date, r.open_price, r.high_price, r.low_price, r.close_price,
+             r.volume, r.amount, r.change_pct, r.limit_status, r.limit_up_text)
+            for r in rows
+        ]
+
+
+def _limit_rows(trade_date=None):
+    with Session(models.engine) as session:
+        query = select(DailyMarketData.code, DailyMarketData.date, DailyMarketData.limit_status, DailyMarketData.limit_up_text)
+        if trade_date is not None:
+            query = query.where(DailyMarketData.date == trade_date)
+        return sorted(session.exec(query).all())
+
+
+def _bar(code, day, limit_status=0, limit_up_text=None, close=10.0):
+    return DailyMarketData(
+        code=code, date=day, open_price=close, high_price=close, low_price=close, close_price=close,
+        volume=1.0, amount=1.0, change_pct=0.0, limit_status=limit_status, limit_up_text=limit_up_text,
+    )
+
+
+def _seed(bars):
+    with Session(models.engine) as session:
+        session.add_all(bars)
+        session.commit()
+
+
+# Reference implementations: the per-row loops these bulk paths replaced
+
+def _per_row_limit_update(trade_date, limit_map):
+    with Session(models.engine) as session:
+        for record in session.exec(select(DailyMarketData).where(DailyMarketData.date == trade_date)).all():
+            if record.code in limit_map:
+                record.limit_status = 1
+                record.limit_up_text = limit_map[record.code]
+            elif record.limit_status != 0:
+                record.limit_status = 0
+                record.limit_up_text = None
+        session.commit()
+
+
+def _per_row_save_daily_data(history_data):
+    def safe_float(value, default=0.0):
+        return default if pd.isna(value) else float(value)
+
+    with Session(models.engine) as session:
+        for code, df in history_data.items():
+            for _, row in df.iterrows():
+                record_date = pd.to_datetime(row["日期"]).date()
+                existing = session.exec(
+                    select(DailyMarketData).where(DailyMarketData.code == code, DailyMarketData.date == record_date)
+                ).first()
+                if existing is None:
+                    session.add(DailyMarketData(
+                        code=code,
+                        date=record_date,
+                        open_price=safe_float(row["开盘"] if "开盘" in row else 0),
+                        high_price=safe_float(row["最高"] if "最高" in row else 0),
+                        low_price=safe_float(row["最低"] if "最低" in row else 0),
+                        close_price=safe_float(row["收盘"] if "收盘" in row else 0),
+                        volume=safe_float(row["成交量"] if "成交量" in row else 0),
+                        amount=safe_float(row["成交额"] if "成交额" in row and pd.notna(row["成交额"]) else None),
+                        change_pct=round(safe_float(row["涨跌幅"] if "涨跌幅" in row else 0), 2),
+                        limit_status=0,
+                        limit_up_text=None,
+                    ))
+                    session.flush()
+        session.commit()
+
+
+def _per_row_save_spot(spot_data, limit_map):
+    with Session(models.engine) as session:
+        for _, row in spot_data.iterrows():
+            code = row["代码"]
+            trade_date = pd.to_datetime(row["日期"]).date()
+            existing = session.exec(
+                select(DailyMarketData).where(DailyMarketData.code == code, DailyMarketData.date == trade_date)
+            ).first()
+            if existing is not None:
+                continue
+            session.add(DailyMarketData(
+                code=code,
+                date=trade_date,
+                open_price=float(row["今开"]),
+                high_price=float(row["最高"]),
+                low_price=float(row["最低"]),
+                close_price=float(row["最新价"]),
+                volume=float(row["成交量"]),
+                amount=float(row["成交额"]),
+                change_pct=round(float(row["涨跌幅"]), 2),
+                limit_status=1 if code in limit_map else 0,
+                limit_up_text=limit_map.get(code),
+            ))
+            session.flush()
+        session.commit()
+
+
+def _seed_limit_day():
+    day, other_day = date(2024, 1, 5), date(2024, 1, 4)
+    _seed([
+        _bar("000001", day),
+        _bar("000002", day, limit_status=1, limit_up_text="首板"),  # no longer limit-up
+        _bar("000003", day, limit_status=1, limit_up_text="首板"),  # text changes
+        _bar("000004", day),
+        _bar("000005", day),
+        _bar("000002", other_day, limit_status=1, limit_up_text="首板"),  # other days untouched
+    ])
+    return day
+
+
+def test_apply_limit_map_matches_per_row_update(monkeypatch):
+    # Small chunks so the CASE update runs over several batches
+    monkeypatch.setattr(sdm, "_LIMIT_UPDATE_CHUNK_SIZE", 2)
+    limit_map = {"000001": "首板", "000003": "2连板", "000005": "3连板", "999999": "首板"}
+
+    day = _seed_limit_day()
+    _per_row_limit_update(day, limit_map)
+    expected = _limit_rows()
+
+    _reset()
+    day = _seed_limit_day()
+    with Session(models.engine) as session:
+        marked = sdm._apply_limit_map(session, day, limit_map)
+        session.commit()
+
+    assert _limit_rows() == expected
+    # Codes missing from the table are not counted
+    assert marked == 3
+
+
+def test_apply_limit_map_clears_stale_text_without_status():
+    day = date(2024, 1, 5)
+    _seed([_bar("000001", day, limit_status=0, limit_up_text="首板"), _bar("000002", day)])
+
+    with Session(models.engine) as session:
+        sdm._apply_limit_map(session, day, {"000002": "首板"})
+        session.commit()
+
+    assert _limit_rows(day) == [("000001", day, 0, None), ("000002", day, 1, "首板")]
+
+
+def _history():
+    dates = pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04"])
+    return {
+        "000001": pd.DataFrame({
+            "日期": dates,
+            "开盘": [10.0, 10.5, np.nan],
+            "最高": [11.0, 11.5, 12.0],
+            "最低": [9.5, 10.0, 10.5],
+            "收盘": [10.8, 11.2, 11.9],
+            "成交量": [1000, 1100, 1200],
+            "成交额": [10800.0, np.nan, 14280.0],
+            "涨跌幅": [1.234, -0.456, 6.251],
+        }),
+        # Missing columns fall back to 0
+        "000002": pd.DataFrame({"日期": dates[:2], "收盘": [5.0, 5.1]}),
+        "000003": pd.DataFrame(),
+    }
+
+
+def test_save_daily_data_matches_per_row_insert():
+    existing = _bar("000001", date(2024, 1, 3), close=99.0)
+
+    _seed([existing])
+    _per_row_save_daily_data(_history())
+    expected = _daily_rows()
+
+    _reset()
+    _seed([_bar("000001", date(2024, 1, 3), close=99.0)])
+    saved = sdm.save_daily_data(_history())
+
+    assert _daily_rows() == expected
+    # The already stored (code, date) is skipped, not overwritten
+    assert saved == 4
+    assert sdm.save_daily_data(_history()) == 0
+
+
+def test_save_spot_as_daily_data_matches_per_row_insert(monkeypatch):
+    limit_map = {"000002": "首板"}
+    monkeypatch.setattr(sdm, "uplimit10jqka", lambda ds: None)
+    monkeypatch.setattr(sdm, "build_limit_up_map", lambda df: limit_map)
+    spot = pd.DataFrame({
+        "代码": ["000001", "000002", "000003"],
+        "名称": ["平安银行", "万科A", "国华网安"],
+        "日期": ["2024-01-05"] * 3,
+        "最新价": [10.5, 8.8, 20.1],
+        "涨跌幅": [1.234, 10.0, -2.345],
+        "最高": [10.6, 8.8, 20.5],
+        "最低": [10.1, 8.0, 19.8],
+        "今开": [10.2, 8.1, 20.3],
+        "成交量": [1000.0, 2000.0, 3000.0],
+        "成交额": [10500.0, 17600.0, 60300.0],
+    })
+    already_saved = date(2024, 1, 5)
+
+    _seed([_bar("000003", already_saved)])
+    _per_row_save_spot(spot, limit_map)
+    expected = _daily_rows()
+
+    _reset()
+    _seed([_bar("000003", already_saved)])
+    saved = sdm.save_spot_as_daily_data(spot)
+
+    assert _daily_rows() == expected
+    assert saved == 2
+
+
+def test_save_stock_basic_info_inserts_new_and_renames_changed(monkeypatch):
+    monkeypatch.setattr(sdm, "clear_stock_name_cache", lambda: None)
+    with Session(models.engine) as session:
+        session.add(StockBasicInfo(code="000001", name="平安银行"))
+        session.add(StockBasicInfo(code="000002", name="万科A"))
+        session.commit()
+
+    saved = sdm.save_stock_basic_info(pd.DataFrame({
+        "代码": ["000001", "000002", "000003", None],
+        "名称": ["平安银行", "万  科A", "国华网安", "无代码"],
+    }))
+
+    with Session(models.engine) as session:
+        names = dict(session.exec(select(StockBasicInfo.code, StockBasicInfo.name)).all())
+    # Like the per-row version, only new codes count as saved; renames update in place
+    assert saved == 1
+    assert names == {"000001": "平安银行", "000002": "万  科A", "000003": "国华网安"}
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from factors.support import _ewm_mean, calculate_macd, compute_support
+
+
+def _make_history(seed=0, n_codes=12):
+    """Per-code daily bars of uneven length; some frames arrive in shuffled date order."""
+    rng = np.random.default_rng(seed)
+    history = {}
+    for i in range(n_codes):
+        code = f"{600000 + i:06d}"
+        n = int(rng.integers(20, 80))
+        dates = pd.bdate_range("2024-01-01", periods=n).date
+        close = 10 + np.cumsum(rng.normal(0, 0.3, n))
+        df = pd.DataFrame({"日期": dates, "开盘": close + rng.normal(0, 0.1, n), "收盘": close})
+        if i % 3 == 0:
+            df = df.sample(frac=1, random_state=i).reset_index(drop=True)
+        history[code] = df
+    return history
+
+
+def _per_stock_support(history, macd_window=10):
+    """Reference: the original per-code loop over calculate_macd."""
+    rows = []
+    for code, df in history.items():
+        if len(df) < 26 + 9 + macd_window:
+            continue
+        df_sorted = df.assign(日期=pd.to_datetime(df["日期"])).sort_values("日期")
+        macd = calculate_macd(df_sorted["收盘"])
+        macd_abs_sum = macd.iloc[-macd_window:].abs().sum()
+        rows.append({
+            "代码": code,
+            "支撑因子": 1.0 / (macd_abs_sum + 0.0001),
+            f"MACD绝对值和_{macd_window}日": macd_abs_sum,
+            "最新MACD": macd.iloc[-1],
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("span", [9, 12, 26])
+def test_ewm_mean_matches_pandas_with_missing_values(span):
+    rng = np.random.default_rng(span)
+    matrix = rng.normal(10, 1, (60, 5))
+    matrix[:15, 1] = np.nan        # shorter history, right-aligned
+    matrix[:59, 2] = np.nan        # single observation
+    matrix[[20, 21, 40], 3] = np.nan  # gaps inside the series
+    matrix[:, 4] = np.nan          # no data at all
+
+    expected = pd.DataFrame(matrix).ewm(span=span, adjust=False).mean().to_numpy()
+
+    np.testing.assert_allclose(_ewm_mean(matrix, span), expected, equal_nan=True)
+
+
+def test_compute_support_matches_per_stock_macd():
+    history = _make_history()
+
+    result = compute_support(history).sort_values("代码").reset_index(drop=True)
+    expected = _per_stock_support(history).sort_values("代码").reset_index(drop=True)
+
+    assert list(result["代码"]) == list(expected["代码"])
+    assert 0 < len(result) < len(history)  # codes below 45 days are dropped
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+
+
+def test_compute_support_without_enough_history_is_empty():
+    history = _make_history()
+    short = {code: df.head(30) for code, df in history.items()}
+
+    assert compute_support(short).empty
@@ -33,7 +33,7 @@ from task_utils import (
     handle_concept_task_error,
     add_concept_task,
     set_last_completed_concept_task,
-    TASK_THREADS,
+    TASK_FUTURES,
     TASK_STOP_EVENTS,
 )
 
@@ -63,6 +63,6 @@ __all__ = [
     'handle_concept_task_error',
     'add_concept_task',
     'set_last_completed_concept_task',
-    'TASK_THREADS',
+    'TASK_FUTURES',
     'TASK_STOP_EVENTS',
 ]
@@ -86,7 +86,7 @@ def verify_database_ops():
     print("=" * 60)
     
     from models import engine, create_db_and_tables, ConceptInfo, ConceptStock
-    from sqlmodel import Session, select
+    from sqlmodel import Session, select, func
     from data_management.concept_service import clear_concept_tables_for_testing
     
     print("\n1. Initializing database...")
@@ -107,7 +107,7 @@ def verify_database_ops():
         
         # Check it exists
         with Session(engine) as session:
-            concepts_before = len(session.exec(select(ConceptInfo)).all())
+            concepts_before = session.exec(select(func.count()).select_from(ConceptInfo)).one()
             print(f"   Before clear: {concepts_before} concepts")
             if concepts_before == 0:
                 print("   ⚠ No test data found, adding...")
@@ -121,8 +121,8 @@ def verify_database_ops():
         
         # Verify it's gone
         with Session(engine) as session:
-            concepts_after = len(session.exec(select(ConceptInfo)).all())
-            stocks_after = len(session.exec(select(ConceptStock)).all())
+            concepts_after = session.exec(select(func.count()).select_from(ConceptInfo)).one()
+            stocks_after = session.exec(select(func.count()).select_from(ConceptStock)).one()
             print(f"   After clear: {concepts_after} concepts, {stocks_after} stocks")
             if concepts_after == 0 and stocks_after == 0:
                 print("   ✓ Tables successfully cleared")